@@ -52,6 +52,7 @@ const SeriesViewer = memo(({ series }: { series: string }) => {
   };
   const goto = (newIndex: number) => setIndex(newIndex == length - 1 ? -1 : newIndex);
   const imgSrc = img ? `${API_BASEURL}/project/${projectId}/image/${img.id}` : null;
+  const previewSrc = imgSrc ? `${imgSrc}?size=512` : null; // thumbnail is enough for the 450x300 preview
   return (
     <Card bodyStyle={{ position: "relative" }}>
       <Space vertical>
@@ -70,7 +71,7 @@ const SeriesViewer = memo(({ series }: { series: string }) => {
           <a href={imgSrc!} target="_blank" style={{ display: "block", position: "relative" }}>
             <img
               style={{ display: "block", objectFit: "contain", width: "450px", height: "300px" }}
-              src={imgSrc!}
+              src={previewSrc!}
             />
           </a>
         ) : data && !data.length ? (
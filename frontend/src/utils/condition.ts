@@ -7,6 +7,8 @@ export interface Condition {
   order?: Record<string, "ASC" | "DESC">;
   limit?: number;
   runId?: string;
+  maxPoints?: number;
+  downsample?: "lttb" | "minmax";
 }
 
 export function createCondition(condition: Condition) {
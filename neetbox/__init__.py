@@ -11,6 +11,7 @@ from .client import (
     set_run_name,
     add_image,
     add_scalar,
+    flush_images,
     listen,
     watch,
     progress,
@@ -21,6 +22,7 @@ from ._protocol import VERSION as __version__
 __all__ = [
     "add_image",
     "add_figure",
+    "flush_images",
     "add_scalar",
     "add_hyperparams",
     "set_run_name",
@@ -5,13 +5,19 @@
 # Date:   20231201
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime as dt
 from enum import Enum
 from importlib.metadata import version
-from typing import Any, Union
+from typing import Any, List, Union
 from threading import Timer, Thread
 
+# msgpack is a dependency, the import is guarded anyway: without it codecs negotiate json frames
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 VERSION = version("neetbox")
 
 def _refresh_version_every(sec: int = 60):
@@ -67,6 +73,40 @@ RESULT_KEY = "result"
 ERROR_KEY = "error"
 REASON_KEY = "reason"
 
+# ===================== codec things =====================
+
+CODEC_KEY = "codec"  # codec chosen by server in handshake reply
+CODECS_KEY = "codecs"  # codecs offered by client in handshake, preferred first
+CODEC_JSON = "json"  # text frames, one message per frame
+CODEC_MSGPACK = "msgpack"  # binary frames, see EventMsg.dumpb
+# short tags of message fields in binary frames, { tag : EventMsg field }
+SHORT_TAGS = {
+    "p": "project_id",
+    "r": "run_id",
+    "e": "event_type",
+    "i": "event_id",
+    "w": "identity_type",
+    "s": "series",
+    "t": "timestamp",
+    "h": "history_len",
+    "n": "id",
+}
+
+
+def supported_codecs() -> List[str]:
+    """codecs available in this environment, preferred first. json is always kept, so that peers
+    without msgpack can still be talked to"""
+    return [CODEC_MSGPACK, CODEC_JSON] if msgpack else [CODEC_JSON]
+
+
+def negotiate_codec(offered) -> str:
+    """first codec offered by the other side which is also supported here, json if none"""
+    supported = supported_codecs()
+    for codec in offered if isinstance(offered, list) else []:
+        if codec in supported:
+            return codec
+    return CODEC_JSON
+
 
 @dataclass
 class EventMsg:
@@ -80,6 +120,8 @@ class EventMsg:
     timestamp: str = get_timestamp()
     history_len: int = -1
     id: int = None  # id in database
+    # payload bytes as received in a binary frame, forwarded as they are instead of packed again
+    raw_payload: bytes = field(default=None, repr=False, compare=False)
 
     @property
     def json(self):
@@ -99,6 +141,49 @@ class EventMsg:
     def dumps(self):
         return json.dumps(self.json, default=str)
 
+    def dumpb(self) -> bytes:
+        """binary frame of message: packed header with short tags, followed by packed payload. a
+        batch is framed as its messages one after another, so there is no batch in binary frames
+        """
+        if self.event_type == EVENT_TYPE_NAME_BATCH:
+            return b"".join(EventMsg.loads(message).dumpb() for message in self.payload or [])
+        header = {}
+        for tag, name in SHORT_TAGS.items():
+            value = getattr(self, name)
+            if value is not None:
+                header[tag] = value
+        payload = self.raw_payload
+        if payload is None:
+            payload = msgpack.packb(self.payload, default=str)
+        return msgpack.packb(header, default=str) + payload
+
+    @classmethod
+    def loadb(cls, frame: bytes) -> List["EventMsg"]:
+        """messages in a binary frame, each keeping its payload bytes as raw_payload"""
+        unpacker = msgpack.Unpacker(
+            raw=False, strict_map_key=False, max_buffer_size=max(len(frame), 1)
+        )
+        unpacker.feed(frame)
+        messages = []
+        while unpacker.tell() < len(frame):
+            header = unpacker.unpack()
+            if not isinstance(header, dict):
+                raise ValueError(f"message header should be a map, got {header}")
+            payload_begin = unpacker.tell()
+            try:
+                payload = unpacker.unpack()
+            except msgpack.OutOfData:
+                raise ValueError(f"frame ended before payload of message {header}")
+            fields = {name: header[tag] for tag, name in SHORT_TAGS.items() if tag in header}
+            fields.setdefault("timestamp", get_timestamp())
+            raw_payload = frame[payload_begin : unpacker.tell()]
+            messages.append(EventMsg(**fields, payload=payload, raw_payload=raw_payload))
+        return messages
+
+    def encode(self, codec: str = CODEC_JSON) -> Union[str, bytes]:
+        """serialize message as a frame of codec"""
+        return self.dumpb() if codec == CODEC_MSGPACK else self.dumps()
+
     @classmethod
     def loads(cls, src):
         if isinstance(src, str):
@@ -140,11 +225,19 @@ EVENT_TYPE_NAME_HPARAMS = "hyperparameters"
 EVENT_TYPE_NAME_STATUS = "status"
 EVENT_TYPE_NAME_HARDWARE = "hardware"
 EVENT_TYPE_NAME_PROGRESS = "progress"
+EVENT_TYPE_NAME_BATCH = "batch"  # payload is a list of event messages
+EVENT_TYPE_NAME_SUBSCRIBE = "subscribe"  # payload is a filter or a list of filters
+# payload is a filter, a list of filters or None for all
+EVENT_TYPE_NAME_UNSUBSCRIBE = "unsubscribe"
+SUBSCRIPTIONS_KEY = "subscriptions"
+EVENT_TYPE_NAME_THROTTLE = "throttle"  # server tells a client its events are being throttled
 
 # ===================== HTTP things =====================
 
 API_ROOT = "/api"
 WS_ROOT = "/ws"
+ROWS_KEY = "rows"
+CURSOR_KEY = "cursor"
 
 # ===================== DB things =====================
 
@@ -155,6 +248,10 @@ NAME_COLUMN_NAME = SERIES_COLUMN_NAME = SERIES_KEY
 RUN_ID_COLUMN_NAME = RUN_ID_KEY
 JSON_COLUMN_NAME = METADATA_COLUMN_NAME = METADATA_KEY
 BLOB_COLUMN_NAME = "data"
+HASH_COLUMN_NAME = "hash"
+SERIES_ID_COLUMN_NAME = "seriesId"
+X_COLUMN_NAME = "x"
+Y_COLUMN_NAME = "y"
 
 # === TABLE NAMES ===
 PROJECT_ID_TABLE_NAME = PROJECT_ID_KEY
@@ -163,5 +260,10 @@ RUN_IDS_TABLE_NAME = RUN_ID_KEY
 STATUS_TABLE_NAME = EVENT_TYPE_NAME_STATUS
 LOG_TABLE_NAME = "log"
 IMAGE_TABLE_NAME = "image"
+SCALAR_TABLE_NAME = EVENT_TYPE_NAME_SCALAR
+SCALAR_SERIES_TABLE_NAME = "scalarSeries"
+SCALAR_ROLLUP_TABLE_NAME = "scalarRollup"
+BLOB_STORE_TABLE_NAME = "blobStore"
+THUMBNAIL_TABLE_NAME = "thumbnail"
 
 NEETBOX_VERSION = version("neetbox")
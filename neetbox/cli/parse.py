@@ -193,5 +193,82 @@ def configs(kvs, force):
     logger.info(f"from config file folder: {get_create_neetbox_config_directory()}")
 
 
+def _project_dbs_of(project_ids):
+    """open history dbs of given project ids, or of all projects in vault if none is given"""
+    from neetbox.server.db.project import ProjectDB
+
+    known_project_ids = ProjectDB.get_project_ids()
+    for project_id in project_ids or known_project_ids:
+        if project_id not in known_project_ids:
+            logger.warn(f"no history db found for project id {project_id}, skipping.")
+            continue
+        yield ProjectDB.of_project_id(project_id)
+
+
+def _format_timings(timings: dict):
+    return ", ".join(f"{step} {seconds:.3f}s" for step, seconds in timings.items())
+
+
+@main.command(name="compact")
+@click.argument("project_ids", nargs=-1)
+@click.option(
+    "--full",
+    is_flag=True,
+    help="rebuild whole db files instead of releasing free pages",
+    default=False,
+)
+def compact(project_ids, full):
+    """compact history dbs of given project ids, or of all projects if none is given"""
+    table = Table(title="compacted history dbs")
+    table.add_column("project id", style="green", no_wrap=True)
+    table.add_column("size before")
+    table.add_column("size after")
+    table.add_column("reclaimed")
+    table.add_column("timings")
+    total_reclaimed = 0
+    for db in _project_dbs_of(project_ids):
+        try:
+            report = db.compact(full=full)
+        except Exception as e:
+            logger.err(f"failed to compact history db of project id {db.project_id}: {e}")
+            continue
+        total_reclaimed += report["reclaimed"]
+        table.add_row(
+            db.project_id,
+            str(report["sizeBefore"]),
+            str(report["sizeAfter"]),
+            str(report["reclaimed"]),
+            _format_timings(report["timings"]),
+        )
+    console.print(table)
+    logger.info(f"reclaimed {total_reclaimed} bytes in total")
+
+
+@main.command(name="analyze")
+@click.argument("project_ids", nargs=-1)
+def analyze(project_ids):
+    """refresh query planner statistics and show page usage of history dbs"""
+    table = Table(title="analyzed history dbs")
+    table.add_column("project id", style="green", no_wrap=True)
+    table.add_column("size")
+    table.add_column("pages")
+    table.add_column("free pages")
+    table.add_column("timings")
+    for db in _project_dbs_of(project_ids):
+        try:
+            report = db.analyze()
+        except Exception as e:
+            logger.err(f"failed to analyze history db of project id {db.project_id}: {e}")
+            continue
+        table.add_row(
+            db.project_id,
+            str(report["size"]),
+            str(report["page_count"]),
+            str(report["freelist_count"]),
+            _format_timings(report["timings"]),
+        )
+    console.print(table)
+
+
 if __name__ == "__main__":
     main()
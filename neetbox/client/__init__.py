@@ -11,6 +11,7 @@ from .apis import (
     add_figure,
     add_image,
     add_hyperparams,
+    flush_images,
     add_scalar,
     set_run_name,
     progress,
@@ -23,6 +24,7 @@ __all__ = [
     "add_image",
     "add_scalar",
     "add_figure",
+    "flush_images",
     "add_hyperparams",
     "set_run_name",
     "ws_subscribe",
@@ -4,10 +4,11 @@
 # Github: github.com/visualDust
 # Date:   20231022
 
+import atexit
 import logging
 import time
-from collections import defaultdict
-from threading import Lock
+from collections import defaultdict, deque
+from threading import Event, Lock, Thread
 from typing import Callable
 
 from vdtoys.mvc import Singleton
@@ -15,6 +16,7 @@ from vdtoys.registry import Registry
 
 from neetbox._protocol import *
 from neetbox.config import get_module_level_config, get_project_id, get_run_id
+from neetbox.config.user import get as get_global_config
 from neetbox.logging import Logger, RawLog
 from neetbox.utils.connection import WebsocketClient, httpxClient
 from neetbox.utils.massive import is_loopback
@@ -42,6 +44,13 @@ class NeetboxClient(metaclass=Singleton):  # singleton
         self._is_ws_connected: bool = False
         self._thread_safe_lock = Lock()
         self.subscribers = defaultdict(list)  # default to no subscribers
+        # batching mode
+        self.batch_config: dict = None
+        self._batch_buffer = deque()  # events waiting to be sent
+        self._latest_progress = {}  # { series : latest progress event }, if coalescing
+        self._batch_ready = Event()
+        self._batch_flush_lock = Lock()
+        self._batch_sender: Thread = None
 
     def wait_should_online(self):
         with self._thread_safe_lock:
@@ -181,6 +190,7 @@ class NeetboxClient(metaclass=Singleton):  # singleton
 
         server_host = config["host"]
         server_port = config["port"]
+        self.batch_config = config.get("batch")
         if not self.check_server_connectivity():  # if daemon not online
             if not (
                 is_loopback(server_host) or server_host in ["127.0.0.1"]
@@ -227,13 +237,20 @@ class NeetboxClient(metaclass=Singleton):  # singleton
         self.online_mode = True  # enable online mode
         self.ws_server_url = f"ws://{server_host}:{server_port}{WS_ROOT}/project/"  # ws server url
         logger.info(f"websocket connecting to {self.ws_server_url}")
+        offline_buffer_config = config.get("offlineBuffer", {})
         self.websocket = WebsocketClient(
             url=self.ws_server_url,
             on_open=self.on_ws_open,
             on_message=self.on_ws_message,
             on_error=self.on_ws_err,
             on_close=self.on_ws_close,
-            offline_message_buffer_size=100,
+            offline_message_buffer_size=offline_buffer_config.get("size", 100),
+            spill_path=(
+                f"{get_global_config('vault')}/client/spill/{get_project_id()}.{get_run_id()}.jsonl"
+                if offline_buffer_config.get("spill")
+                else None
+            ),
+            max_spill_bytes=offline_buffer_config.get("maxSpillBytes", 64 * 1024 * 1024),
         )
         self.websocket.connect()
         self._is_initialized = True
@@ -243,12 +260,14 @@ class NeetboxClient(metaclass=Singleton):  # singleton
         logger.ok(
             f"client websocket connected. sending handshake as '{project_id}'..."
         )
+        self.websocket.codec = CODEC_JSON  # until server agrees on another one
         handshake_msg = EventMsg(  # handshake request message
             project_id=project_id,
             run_id=get_run_id(),
             event_type=EVENT_TYPE_NAME_HANDSHAKE,
             identity_type=IdentityType.CLI,
             event_id=0,
+            payload={CODECS_KEY: supported_codecs()},
         ).dumps()
         ws.send(handshake_msg)
 
@@ -263,11 +282,22 @@ class NeetboxClient(metaclass=Singleton):  # singleton
         self._is_initialized = False
         self._is_ws_connected = False
 
-    def on_ws_message(self, ws: WebsocketClient, message):
-        message = EventMsg.loads(message)  # message should be json
+    def on_ws_message(self, ws: WebsocketClient, frame):
+        if isinstance(frame, bytes):  # binary frame, may carry many messages
+            messages = EventMsg.loadb(frame)
+        else:
+            messages = [EventMsg.loads(frame)]  # message should be json
+        for message in messages:
+            self.on_event_msg(ws, message)
+
+    def on_event_msg(self, ws: WebsocketClient, message: EventMsg):
         if message.event_type == EVENT_TYPE_NAME_HANDSHAKE:
             assert message.payload["result"] == 200
-            logger.ok(f"neetbox handshake succeed.")
+            self.websocket.codec = message.payload.get(CODEC_KEY, CODEC_JSON)
+            logger.ok(f"neetbox handshake succeed, using {self.websocket.codec} frames.")
+            offline_stats = self.websocket.stats
+            if offline_stats["buffered"] or offline_stats["spilled"] or offline_stats["dropped"]:
+                logger.info(f"replaying messages buffered while offline: {offline_stats}")
             ws.send(  # send immediately without querying
                 EventMsg(
                     project_id=get_project_id(),
@@ -279,6 +309,7 @@ class NeetboxClient(metaclass=Singleton):  # singleton
                 ).dumps()
             )
             self._is_ws_connected = True
+            self.websocket.replay_offline()  # in background, new events wait behind them
             # return # DO NOT return!
         if message.event_type not in self.subscribers:
             logger.warn(
@@ -315,12 +346,76 @@ class NeetboxClient(metaclass=Singleton):  # singleton
                 timestamp=timestamp or get_timestamp(),
                 history_len=_history_len,
             )
+            if self.batch_config and self.batch_config["enable"]:
+                self._put_batched(message)
+            else:
+                self.websocket.send(message)
+
+    def _put_batched(self, message: EventMsg):
+        if self._batch_sender is None:
+            with self._thread_safe_lock:
+                if self._batch_sender is None:
+                    self._batch_sender = Thread(target=self._send_batches_forever, daemon=True)
+                    self._batch_sender.start()
+        if (
+            self.batch_config["coalesceProgress"]
+            and message.event_type == EVENT_TYPE_NAME_PROGRESS
+        ):
+            self._latest_progress[message.series] = message  # latest value wins
+        else:
+            self._batch_buffer.append(message)
+        if len(self._batch_buffer) >= self.batch_config["size"]:
+            self._batch_ready.set()  # wake up sender
+
+    def _send_batches_forever(self):
+        while True:
+            self._batch_ready.wait(timeout=self.batch_config["interval"])
+            self._batch_ready.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.err(f"failed to send batched events cause {e}")
 
-            self.websocket.send(message)
+    def flush(self):
+        """send all buffered events now, if batching mode is enabled"""
+        if not self.batch_config:
+            return
+        with self._batch_flush_lock:
+            messages = []
+            while self._batch_buffer:
+                messages.append(self._batch_buffer.popleft())
+            for series in list(self._latest_progress.keys()):
+                messages.append(self._latest_progress.pop(series))
+            batch_size = max(self.batch_config["size"], 1)
+            for i in range(0, len(messages), batch_size):
+                batch = messages[i : i + batch_size]
+                if len(batch) == 1:
+                    self.websocket.send(batch[0])
+                    continue
+                self.websocket.send(
+                    EventMsg(
+                        project_id=get_project_id(),
+                        run_id=get_run_id(),
+                        event_type=EVENT_TYPE_NAME_BATCH,
+                        identity_type=IdentityType.CLI,
+                        payload=[message.json for message in batch],
+                    )
+                )
 
 
 # singleton
 connection = NeetboxClient()
+# send buffered events before websocket closed on exit
+atexit.register(connection.flush)
+
+
+@connection.ws_subscribe(event_type_name=EVENT_TYPE_NAME_THROTTLE)
+def on_event_type_throttle(message: EventMsg):
+    report = message.payload
+    logger.warn(
+        f"daemon is throttling events of {report[SERIES_KEY]} which come too often: "
+        f"{report['sampled']} of {report['throttled']} kept as samples, {report['dropped']} dropped."
+    )
 
 
 # assign this connection to websocket log writer
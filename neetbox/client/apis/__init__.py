@@ -1,5 +1,5 @@
 from ._action import actionManager
-from ._image import add_figure, add_image
+from ._image import add_figure, add_image, flush_images
 from ._progress import Progress as progress
 from ._scalar import add_scalar
 from ._metadata import add_hyperparams, set_run_name
\ No newline at end of file
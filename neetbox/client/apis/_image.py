@@ -4,13 +4,17 @@
 # Github: github.com/visualDust
 # Date:   20231211
 
+import atexit
 import io
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock, Thread
 from typing import Optional
 
 import numpy as np
 
 from neetbox._protocol import *
-from neetbox.config import get_project_id, get_run_id
+from neetbox.config import get_module_level_config, get_project_id, get_run_id
 from neetbox.logging import logger
 from neetbox.utils.x2numpy import *
 
@@ -118,57 +122,157 @@ def convert_to_HWC(tensor, input_format):  # tensor: numpy array
         return tensor_CHW.transpose(1, 2, 0)
 
 
-def add_image(name: str, image, dataformats: str = None):
-    """send an image to frontend display
+def _encode_png(image) -> bytes:
+    from PIL import Image
+
+    if isinstance(image, Image.Image):  # is PIL Image
+        with io.BytesIO() as image_bytes_stream:
+            # convert PIL Image to bytes
+            image.save(image_bytes_stream, format="PNG")
+            return image_bytes_stream.getvalue()
+    import cv2
+
+    _, im_buf_arr = cv2.imencode(".png", image)
+    return im_buf_arr.tobytes()
+
+
+class ImageUploader:
+    """Encode images in a worker pool and upload them from a background thread, several images per
+    request. Images are uploaded in the order they are added. Once max_pending images are waiting,
+    add_image blocks until some of them are uploaded.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._encoders: ThreadPoolExecutor = None
+        self._queue = queue.Queue()  # (encoding future, message, result future)
+        self._pending: BoundedSemaphore = None
+        self._batch_size = 1
+
+    def _lazy_start(self):
+        with self._lock:
+            if self._encoders is not None:
+                return
+            config = get_module_level_config().get("imageUpload", {})
+            self._batch_size = max(config.get("batchSize", 8), 1)
+            self._pending = BoundedSemaphore(max(config.get("maxPending", 32), 1))
+            self._encoders = ThreadPoolExecutor(
+                max_workers=config.get("workers", 2), thread_name_prefix="neetbox-image-encoder"
+            )
+            Thread(target=self._upload_forever, daemon=True).start()
+
+    def submit(self, image, message: EventMsg) -> Future:
+        """encode and upload an image
+
+        Args:
+            image (Union[np.ndarray, Image.Image]): HWC uint8 array or PIL image. should not be modified after submitted
+            message (EventMsg): metadata of the image
+
+        Returns:
+            Future: resolves to the id of uploaded image
+        """
+        self._lazy_start()
+        self._pending.acquire()
+        result = Future()
+        self._queue.put((self._encoders.submit(_encode_png, image), message, result))
+        return result
+
+    def _upload_forever(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._upload(batch)
+            finally:
+                for _ in batch:
+                    self._pending.release()
+                    self._queue.task_done()
+
+    def _upload(self, batch):
+        files, metadata, results = [], [], []
+        for encoding, message, result in batch:
+            try:
+                files.append(("images", (f"{len(files)}.png", encoding.result(), "image/png")))
+                metadata.append(message.dumps())
+                results.append(result)
+            except Exception as e:
+                logger.warn(f"unable to encode image: {e}")
+                result.set_exception(e)
+        if not files:
+            return
+        try:
+            project_id = get_project_id()
+            response = connection.post_check_online(
+                api=f"{API_ROOT}/project/{project_id}/images",
+                data={METADATA_KEY: metadata},
+                files=files,
+            )
+            if response is None:  # offline mode, nowhere to upload
+                raise ConnectionError("neetbox client is offline")
+            response_dict = response.json()
+            assert (
+                RESULT_KEY in response_dict and response_dict[RESULT_KEY] == "ok"
+            ), "server response not ok"
+            for result, image_id in zip(results, response_dict[ID_KEY]):
+                result.set_result(image_id)
+        except Exception as e:
+            logger.warn(f"unable to upload {len(files)} image(s): {e}")
+            for result in results:
+                result.set_exception(e)
+
+    def flush(self):
+        """wait until all added images are uploaded"""
+        if self._encoders is not None:
+            self._queue.join()
+
+
+image_uploader = ImageUploader()
+# upload pending images before exit
+atexit.register(image_uploader.flush)
+
+
+def add_image(name: str, image, dataformats: str = None) -> Future:
+    """send an image to frontend display. the image is encoded and uploaded in background, this function returns without waiting for it.
 
     Args:
         image (Union[np.array, Image.Image, Tensor]): image from cv2 and PIL.Image as well as tensors are supported
         name (str): name of the image, used in frontend display
         dataformats (str): if you are passing a tensor as image, please indicate how to understand the tensor. For example, dataformats="NCWH" means the first axis of the tensor is Number of batches, the second axis is Channel, and the third axis is Width, and the fourth axis is Height.
 
+    Returns:
+        Future: resolves to the id of the image once uploaded. call `flush_images()` to wait for all images.
     """
     from PIL import Image
 
     if isinstance(image, Image.Image):  # is PIL Image
-        with io.BytesIO() as image_bytes_stream:
-            # convert PIL Image to bytes
-            image.save(image_bytes_stream, format="PNG")
-            image_bytes = image_bytes_stream.getvalue()
+        image = image.copy()
     else:  # try convert numpy
         dataformats = dataformats or "CHW"
         image = make_np(image)
         image = convert_to_HWC(image, dataformats)
         if image.dtype != np.uint8:
             image = (image * 255.0).astype(np.uint8)
+        else:  # copy, the caller may modify the tensor while it is being encoded
+            image = np.array(image)
+
+    message = EventMsg(
+        project_id=get_project_id(),
+        run_id=get_run_id(),
+        identity_type=IdentityType.CLI,
+        series=name,
+        event_type=EVENT_TYPE_NAME_IMAGE,
+        timestamp=get_timestamp(),
+    )
+    return image_uploader.submit(image, message)
 
-        if isinstance(image, np.ndarray):  # convert ndarray to bytes
-            import cv2
-
-            _, im_buf_arr = cv2.imencode(".png", image)
-            image_bytes = im_buf_arr.tobytes()
 
-    # send bytes
-    project_id = get_project_id()
-    run_id = get_run_id()
-    try:
-        message = EventMsg(
-            project_id=project_id,
-            run_id=run_id,
-            identity_type=IdentityType.CLI,
-            series=name,
-            event_type=EVENT_TYPE_NAME_IMAGE,
-        )
-        result = connection.post_check_online(
-            api=f"{API_ROOT}/project/{project_id}/image",
-            data={METADATA_KEY: message.dumps()},
-            files={"image": image_bytes},
-        )
-        response_dict = result.json()
-        assert (
-            RESULT_KEY in response_dict and response_dict[RESULT_KEY] == "ok"
-        ), "server response not ok"
-    except Exception as e:
-        logger.warn(f"unable to upload image: {e}")
+def flush_images():
+    """wait until all images added by `add_image` are uploaded"""
+    image_uploader.flush()
 
 
 # ===================== MATPLOTLIB things ===================== #
@@ -186,6 +290,6 @@ def add_figure(name: str, figure, close: Optional[bool] = True):
         walltime: Override default walltime (time.time()) of event
     """
     if isinstance(figure, list):
-        add_image(name=name, image=figure_to_image(figure, close), dataformats="NCHW")
+        return add_image(name=name, image=figure_to_image(figure, close), dataformats="NCHW")
     else:
-        add_image(name=name, image=figure_to_image(figure, close), dataformats="CHW")
+        return add_image(name=name, image=figure_to_image(figure, close), dataformats="CHW")
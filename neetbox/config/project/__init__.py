@@ -41,6 +41,12 @@ _DEFAULT_WORKSPACE_CONFIG = {
         "mode": "detached",
         "uploadInterval": 1,
         "shell": {"enable": True, "daemon": True},
+        # send events in batches from a background thread instead of one frame per event
+        "batch": {"enable": False, "interval": 0.05, "size": 64, "coalesceProgress": True},
+        # messages kept while daemon is unreachable, overflowed ones are spilled to a file in vault
+        "offlineBuffer": {"size": 100, "spill": True, "maxSpillBytes": 64 * 1024 * 1024},
+        # images are encoded by a worker pool and uploaded in batches from a background thread
+        "imageUpload": {"workers": 2, "maxPending": 32, "batchSize": 8},
     },
 }
 
@@ -20,6 +20,31 @@ _GLOBAL_CONFIG = {
     MACHINE_ID_KEY: str(uuid4()),
     "vault": get_create_initial_neetbox_data_directory(),
     "bypass-db-version-check": True,
+    # history dbs kept open by server, least recently used ones are closed first
+    "project-db": {
+        "max-open": 64,
+        "idle-timeout": 300,
+        "checkpoint-interval": 300,  # seconds between truncating wal files and optimizing open dbs
+        "compact-interval": 3600,  # seconds between looking for idle dbs with many free pages
+        # sqlite performance profile, page-size only applies to new db files
+        "sqlite": {
+            "synchronous": "NORMAL",
+            "mmap-size": 256 * 1024 * 1024,
+            "cache-size": -8192,  # negative for KiB
+            "temp-store": "MEMORY",
+            "wal-autocheckpoint": 1000,
+            "page-size": 4096,
+        },
+    },
+    # events per second a client run may send, excess ones are sampled. rates <= 0 to disable
+    "ingest-limit": {
+        "run-rate": 5000,
+        "run-burst": 20000,
+        "series-rate": 1000,
+        "series-burst": 5000,
+        "samples": 64,  # excess events of a series kept every window, chosen uniformly
+        "window": 1.0,  # seconds between handling kept samples and reporting to clients
+    },
 }
 
 _GLOBAL_CONFIG_FILE_NAME = f"neetbox.global.toml"
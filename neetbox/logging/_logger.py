@@ -7,14 +7,14 @@
 import functools
 import os
 import warnings
-from datetime import date
+from datetime import date, datetime
 from enum import Enum
 from typing import Callable, Optional, Union
 
-from vdtoys.framing import get_caller_info_traceback
 from vdtoys.registry import Registry
 
 from ._formatting import LogStyle, RawLog
+from ._pipeline import LOG_PIPELINE_MAX_PENDING, LogPipeline, capture_caller, traceback_info_of
 from .writers import FileLogWriter
 
 LogWriters = Registry("LOG_WRITERS")
@@ -49,6 +49,7 @@ class LogLevel(Enum):
 class Logger:
     # global static
     _IDENTITY2LOGGER = {}
+    _PIPELINE: LogPipeline = None  # writes logs in background if async mode is on
 
     def __init__(
         self,
@@ -122,6 +123,31 @@ class Logger:
         for logger in cls._IDENTITY2LOGGER.values():
             logger.log_level = level
 
+    @classmethod
+    def set_async(
+        cls, enabled=True, max_pending: int = LOG_PIPELINE_MAX_PENDING, drop_when_full=False
+    ):
+        """turn on/off async mode of all loggers. in async mode, logging only captures the message,
+        caller frame and time, and writers run on a background thread. logs pending are written on
+        exit, or when turning async mode off
+
+        Args:
+            enabled (bool, optional): whether to write logs in background. Defaults to True.
+            max_pending (int, optional): max logs waiting to be written. Defaults to LOG_PIPELINE_MAX_PENDING.
+            drop_when_full (bool, optional): drop logs instead of waiting when max_pending logs are waiting. Defaults to False.
+        """
+        if cls._PIPELINE is not None:
+            cls._PIPELINE.close()
+            cls._PIPELINE = None
+        if enabled:
+            cls._PIPELINE = LogPipeline(max_pending=max_pending, drop_when_full=drop_when_full)
+
+    @classmethod
+    def flush(cls):
+        """wait until pending logs are written, if in async mode"""
+        if cls._PIPELINE is not None:
+            cls._PIPELINE.flush()
+
     def writer(self, name: str):
         def _add_private_writer(name, writer_func: Callable):
             if name in self.private_writers:
@@ -146,12 +172,33 @@ class Logger:
         for msg in content:
             message += str(msg) + " "
 
+        caller = capture_caller(stack_offset=stack_offset - 1)
+        timestamp = datetime.now()
+        pipeline = Logger._PIPELINE
+        if pipeline is not None and not pipeline.is_writer_thread:
+            pipeline.put(
+                functools.partial(
+                    self._write,
+                    message,
+                    caller,
+                    timestamp,
+                    series,
+                    self._default_style,
+                    skip_writers_names,
+                )
+            )
+            return self
+        self._write(message, caller, timestamp, series, self._default_style, skip_writers_names)
+        return self
+
+    def _write(self, message, caller, timestamp, series, style, skip_writers_names):
         log = RawLog(
             message=message,
-            caller_info=get_caller_info_traceback(stack_offset=stack_offset),
+            caller_info=traceback_info_of(caller),
             caller_name_alias=self.name_alias,
+            timestamp=timestamp,
             series=series,
-            style=self._default_style,
+            style=style,
         )
 
         writers = []
@@ -174,7 +221,6 @@ class Logger:
                 writer_func(log)
             except Exception as e:
                 warnings.warn(f"log writer {writer_name} fialed: {e}")
-        return self
 
     def ok(
         self,
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260208
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import warnings
+from typing import Callable, Tuple
+
+from vdtoys.framing import TracebackInfo
+
+LOG_PIPELINE_MAX_PENDING = 10000  # logs waiting to be written before loggers block or drop
+LOG_PIPELINE_EXIT_TIMEOUT = 5  # seconds to wait for pending logs on exit
+
+
+def capture_caller(stack_offset: int = 1) -> Tuple[str, int, str, str, str]:
+    """(filename, line, function, class of self, module) of the caller stack_offset levels above the
+    function calling this, without building the whole inspect.stack(). the outermost frame if stack
+    is not that deep. the frame itself is not kept, so its locals are not kept alive by pending logs
+    """
+    frame = sys._getframe(1)
+    for _ in range(stack_offset):
+        if frame.f_back is None:
+            break
+        frame = frame.f_back
+    code = frame.f_code
+    class_name = None
+    if "self" in code.co_varnames[: code.co_argcount]:
+        self_obj = frame.f_locals.get("self")
+        class_name = None if self_obj is None else self_obj.__class__.__name__
+    return (
+        code.co_filename,
+        frame.f_lineno,  # line should be taken now, it moves as frame runs
+        code.co_name,
+        class_name,
+        frame.f_globals.get("__name__"),
+    )
+
+
+def traceback_info_of(caller: Tuple[str, int, str, str, str]) -> TracebackInfo:
+    """TracebackInfo of a caller captured by capture_caller"""
+    filename, lineno, func_name, class_name, module_name = caller
+    info = TracebackInfo()
+    info.lineno = lineno
+    info.func_name = func_name if func_name != "<module>" else None
+    info.class_name = class_name
+    info.module_name = module_name
+    info.filepath = os.path.abspath(filename)
+    info.filename = os.path.basename(filename)
+    return info
+
+
+class LogPipeline:
+    """Runs log writers on a background thread. Loggers only put a record into a bounded queue, so
+    formatting, rendering and i/o of writers never happen on the logging thread. When the queue is
+    full, loggers wait for room, or drop the log if drop_when_full. Pending logs are written on exit.
+    """
+
+    def __init__(self, max_pending: int = LOG_PIPELINE_MAX_PENDING, drop_when_full=False) -> None:
+        self.drop_when_full = drop_when_full
+        self.num_dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._write_forever, daemon=True, name="neetbox-log-writer"
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def put(self, record: Callable[[], None]) -> bool:
+        """queue a record, which writes the log when called
+
+        Returns:
+            bool: False if log is dropped
+        """
+        if self._closed:
+            record()  # nobody is going to write it, write it here
+            return True
+        if not self.drop_when_full:
+            self._queue.put(record)
+            return True
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.num_dropped += 1
+            return False
+
+    def _write_forever(self):
+        num_reported_dropped = 0
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:  # closing
+                    return
+                if self.num_dropped != num_reported_dropped:
+                    warnings.warn(
+                        f"log pipeline is full, dropped {self.num_dropped - num_reported_dropped} logs"
+                    )
+                    num_reported_dropped = self.num_dropped
+                record()
+            except Exception as e:
+                warnings.warn(f"log pipeline failed to write a log: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """wait until logs put so far are written"""
+        if not self._closed and not self.is_writer_thread:
+            self._queue.join()
+
+    def close(self, timeout: float = LOG_PIPELINE_EXIT_TIMEOUT):
+        """write pending logs and stop the writer thread. logs put afterwards are written in place"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
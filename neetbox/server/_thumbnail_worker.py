@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260120
+
+# thumbnails are encoded in spawned worker processes, which import this module to unpickle the
+# task. keep it away from the server app and bridges, importing them would load history dbs there
+import io
+
+try:  # thumbnails are generated only if pillow is installed
+    from PIL import Image, features
+
+    THUMBNAIL_FORMAT, THUMBNAIL_MEDIA_TYPE = (
+        ("WEBP", "image/webp") if features.check("webp") else ("JPEG", "image/jpeg")
+    )
+except ImportError:
+    Image = THUMBNAIL_FORMAT = THUMBNAIL_MEDIA_TYPE = None
+
+
+def make_thumbnails(image_bytes: bytes, sizes):
+    """downscale an image, runs in worker process
+
+    Returns:
+        dict: { size : encoded thumbnail }, None for sizes not smaller than the image
+    """
+    thumbnails = {}
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        if THUMBNAIL_FORMAT == "JPEG" and image.mode == "RGBA":
+            image = image.convert("RGB")
+        for size in sizes:
+            if max(image.size) <= size:
+                thumbnails[size] = None  # serve the original image instead
+                continue
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+            with io.BytesIO() as stream:
+                thumbnail.save(stream, format=THUMBNAIL_FORMAT, quality=80)
+                thumbnails[size] = stream.getvalue()
+    return thumbnails
@@ -4,6 +4,6 @@
 # Github: github.com/visualDust
 # Date:   20231201
 
-from .abc import FetchType, SortType
+from .abc import DownsampleType, FetchType, SortType
 
-__all__ = ["FetchType", "SortType"]
+__all__ = ["DownsampleType", "FetchType", "SortType"]
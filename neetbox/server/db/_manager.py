@@ -34,14 +34,15 @@ class DBConnectionManager(metaclass=Singleton):
         self.logger = Logger("DB Conn Manager", skip_writers_names=["ws"])
 
         def clear_dbc_on_exit():
-            for module_name, conn_dict in self._POOL.items():
+            for module_name, conn_dict in list(self._POOL.items()):
                 self.logger.info(
                     f"Closing db connection for module {module_name}:"
                 )
                 dbc: ManageableDB
-                for _, dbc in conn_dict.items():
+                for _, dbc in list(conn_dict.items()):  # dbs may be evicted meanwhile
                     self.logger.info(f"=> Closing {dbc}")
                     try:
+                        dbc.flush()  # write pending rows before closing
                         dbc.close()
                     except Exception as e:
                         self.logger.err(
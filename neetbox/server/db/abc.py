@@ -21,12 +21,21 @@ class SortType(str, Enum):
     DESC = "DESC"
 
 
+class DownsampleType(str, Enum):
+    LTTB = "lttb"  # largest-triangle-three-buckets
+    MINMAX = "minmax"  # min and max of each bucket
+
+
 class ManageableDB(ABC):
     @abstractmethod
     def size(self):
         """get local storage usage in bytes"""
         raise NotImplementedError()
 
+    def flush(self):
+        """write pending changes into storage, if any"""
+        pass
+
     @abstractmethod
     def close(self):
         raise NotImplementedError()
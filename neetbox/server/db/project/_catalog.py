@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260126
+
+import os
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+# folder changes within this window may share one mtime(timestamps are coarse), so such a scan is not trusted
+RACY_MTIME_WINDOW_NS = 1_000_000_000
+
+
+class ProjectCatalog:
+    """Index of project db files in a folder, keyed by project id(the file name without extension).
+    Files are never opened here. The folder is rescanned only when its mtime changes, which happens
+    whenever a file is created, renamed or removed in it, so lookups cost a single stat otherwise.
+    """
+
+    def __init__(self, folder: str, file_type: str) -> None:
+        self.folder = folder
+        self.suffix = f".{file_type}"
+        self._paths: Dict[str, str] = {}  # { project id : path of db file }
+        self._folder_mtime_ns: Optional[int] = None
+        # { project id : (stamp of files when loaded, summary) }, see summary_of
+        self._summaries: Dict[str, Tuple[tuple, dict]] = {}
+        self._lock = Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """rescan the folder if it changed since last scan
+
+        Args:
+            force (bool, optional): rescan even if folder mtime did not change. Defaults to False.
+
+        Returns:
+            bool: whether the folder has been rescanned
+        """
+        with self._lock:
+            try:
+                mtime_ns = os.stat(self.folder).st_mtime_ns
+            except FileNotFoundError:
+                self._paths, self._folder_mtime_ns = {}, None
+                return True
+            if not force and mtime_ns == self._folder_mtime_ns:
+                return False
+            paths = {}
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(self.suffix) and entry.is_file():
+                        paths[entry.name[: -len(self.suffix)]] = entry.path
+            if time.time_ns() - mtime_ns < RACY_MTIME_WINDOW_NS:
+                mtime_ns = None  # scan again next time
+            self._paths, self._folder_mtime_ns = paths, mtime_ns
+            return True
+
+    def add(self, project_id: str, path: str):
+        """register a db file created by this process, without waiting for a rescan"""
+        with self._lock:
+            self._paths[project_id] = path
+
+    def remove(self, project_id: str):
+        with self._lock:
+            self._paths.pop(project_id, None)
+            self._summaries.pop(project_id, None)
+
+    def summary_of(self, project_id: str, load: Callable[[str], dict]) -> Optional[dict]:
+        """summary of db file of project id, made by load(path). it is loaded again only if the db
+        file or its wal changed since, so an unchanged project costs two stats
+
+        Returns:
+            Optional[dict]: the summary, None if project id has no db file
+        """
+        path = self.path_of(project_id)
+        if path is None:
+            return None
+        stamp = tuple(_stamp_of(file_path) for file_path in (path, f"{path}-wal"))
+        cached = self._summaries.get(project_id)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        summary = load(path)
+        with self._lock:
+            self._summaries[project_id] = (stamp, summary)
+        return summary
+
+    def path_of(self, project_id: str) -> Optional[str]:
+        self.refresh()
+        return self._paths.get(project_id)
+
+    def project_ids(self) -> List[str]:
+        self.refresh()
+        return list(self._paths.keys())
+
+    def __contains__(self, project_id: str) -> bool:
+        return self.path_of(project_id) is not None
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._paths)
+
+
+def _stamp_of(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260114
+
+from collections import defaultdict
+
+import numpy as np
+
+from ..abc import DownsampleType
+
+
+def lttb(x: np.ndarray, y: np.ndarray, num_out: int) -> np.ndarray:
+    """largest-triangle-three-buckets. keeps the first and the last point, and picks the point forming the largest triangle with the previous pick and the average of the next bucket in each bucket.
+
+    Args:
+        x (np.ndarray): x of points, should be in order
+        y (np.ndarray): y of points
+        num_out (int): how many points to keep
+
+    Returns:
+        np.ndarray: indices of kept points
+    """
+    num_in = len(x)
+    if num_out >= num_in or num_out < 3:
+        return np.arange(num_in)
+    # inner points [1, num_in - 1) are split into num_out - 2 buckets
+    edges = np.linspace(1, num_in - 1, num_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[: num_in - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[: num_in - 1], edges[:-1]) / counts, y[-1])
+    selected = np.empty(num_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, num_in - 1
+    a = 0
+    for i in range(num_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, num_out: int) -> np.ndarray:
+    """keep the min and the max point of each bucket
+
+    Args:
+        x (np.ndarray): x of points, should be in order
+        y (np.ndarray): y of points
+        num_out (int): how many points to keep at most
+
+    Returns:
+        np.ndarray: indices of kept points
+    """
+    num_in = len(x)
+    num_buckets = num_out // 2
+    if num_out >= num_in or num_buckets < 1:
+        return np.arange(num_in)
+    edges = np.linspace(0, num_in, num_buckets + 1).astype(np.int64)
+    selected = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        selected.append(lo + np.argmin(y[lo:hi]))
+        selected.append(lo + np.argmax(y[lo:hi]))
+    return np.unique(selected)
+
+
+def downsample(x, y, max_points: int, method: DownsampleType = DownsampleType.LTTB):
+    """pick at most max_points points that keep the shape of the series
+
+    Returns:
+        np.ndarray: indices of kept points
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if DownsampleType(method) == DownsampleType.MINMAX:
+        return minmax(x, y, max_points)
+    return lttb(x, y, max_points)
+
+
+def downsample_rows(
+    rows: list, max_points: int, method=DownsampleType.LTTB, series_index=2, x_index=3, y_index=4
+):
+    """downsample query result rows series by series, the order of rows is kept
+
+    Args:
+        rows (list): rows of query result
+        max_points (int): max points to keep for each series
+        method (DownsampleType, optional): how to downsample. Defaults to DownsampleType.LTTB.
+        series_index, x_index, y_index (int, optional): position of series, x and y in a row.
+
+    Returns:
+        list: the kept rows
+    """
+    indices_of_series = defaultdict(list)
+    for i, row in enumerate(rows):
+        indices_of_series[row[series_index]].append(i)
+    kept = []
+    for indices in indices_of_series.values():
+        if len(indices) <= max_points:
+            kept.append(indices)
+            continue
+        indices = np.asarray(indices)
+        x = [rows[i][x_index] for i in indices]
+        y = [rows[i][y_index] for i in indices]
+        kept.append(indices[downsample(x, y, max_points=max_points, method=method)])
+    return [rows[i] for i in np.sort(np.concatenate(kept))] if kept else []
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260122
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict
+
+DB_READ_WORKERS = 4  # threads serving history queries
+
+# writes of a db go through a single thread of its own so that they are applied in the order they
+# are submitted, and a long write(migration, vacuum, checkpoint) of one db does not hold up others
+_write_executors: Dict[str, ThreadPoolExecutor] = {}  # { db key(project id) : writer }
+_num_pending_writes: Dict[str, int] = {}  # { db key : writes submitted and not done yet }
+_write_executors_lock = Lock()
+_read_executor = ThreadPoolExecutor(
+    max_workers=DB_READ_WORKERS, thread_name_prefix="neetbox-db-reader"
+)
+
+
+def _write_done(key, _future):
+    with _write_executors_lock:
+        _num_pending_writes[key] -= 1
+
+
+async def run_write(key: str, func, *args, **kwargs):
+    """run a blocking db write on the writer thread of db key without blocking the event loop"""
+    with _write_executors_lock:
+        executor = _write_executors.get(key)
+        if executor is None:
+            executor = _write_executors[key] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"neetbox-db-writer-{key}"
+            )
+            _num_pending_writes[key] = 0
+        _num_pending_writes[key] += 1
+        future = executor.submit(functools.partial(func, *args, **kwargs))
+    future.add_done_callback(functools.partial(_write_done, key))
+    return await asyncio.wrap_future(future)
+
+
+def close_writer(key: str):
+    """stop writer thread of db key if it has nothing to write, next write starts a new one"""
+    with _write_executors_lock:
+        if _num_pending_writes.get(key):
+            return  # keep it, writes of the db should stay in order
+        executor = _write_executors.pop(key, None)
+        _num_pending_writes.pop(key, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def run_read(func, *args, **kwargs):
+    """run a blocking db read on the reader pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _read_executor, functools.partial(func, *args, **kwargs)
+    )
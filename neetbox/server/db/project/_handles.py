@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260128
+
+import collections
+import time
+from threading import RLock
+from typing import Callable, Hashable, List
+
+from ._maintenance import PeriodicTask
+
+
+class HandleCache:
+    """Bookkeeping of open db handles in least recently used order. It decides which handles to
+    evict, either because more than max_open handles are open or because a handle has not been used
+    for idle_timeout seconds. Handles leased by a running operation are never evicted.
+    """
+
+    def __init__(self, max_open: int, idle_timeout: float) -> None:
+        self.max_open = max_open  # <= 0 for unlimited
+        self.idle_timeout = idle_timeout  # <= 0 to keep idle handles open
+        self.lock = RLock()
+        self._last_used = collections.OrderedDict()  # { key : last used time }, oldest first
+        self._leases = collections.Counter()  # { key : num operations using it }
+        self._sweeper = None
+
+    def touch(self, key: Hashable):
+        with self.lock:
+            self._last_used[key] = time.monotonic()
+            self._last_used.move_to_end(key)
+
+    def acquire(self, key: Hashable, touch: bool = True):
+        """lease a handle so that it is not evicted. background maintenance should pass touch=False, which does not count as a use"""
+        with self.lock:
+            self._leases[key] += 1
+            if touch:
+                self.touch(key)
+
+    def release(self, key: Hashable, touch: bool = True):
+        with self.lock:
+            self._leases[key] -= 1
+            if self._leases[key] <= 0:
+                del self._leases[key]
+            if touch and key in self._last_used:
+                self.touch(key)
+
+    def idle_for(self, key: Hashable) -> float:
+        """seconds since key was last used"""
+        with self.lock:
+            last_used = self._last_used.get(key)
+        return float("inf") if last_used is None else time.monotonic() - last_used
+
+    def discard(self, key: Hashable):
+        with self.lock:
+            self._last_used.pop(key, None)
+
+    def __len__(self):
+        return len(self._last_used)
+
+    def to_evict(self, now: float = None) -> List[Hashable]:
+        """keys of handles that should be closed, least recently used first"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            num_over = len(self._last_used) - self.max_open if self.max_open > 0 else 0
+            keys = []
+            for key, last_used in self._last_used.items():
+                if key in self._leases:
+                    continue
+                if num_over > 0:
+                    num_over -= 1
+                elif self.idle_timeout <= 0 or now - last_used < self.idle_timeout:
+                    continue
+                keys.append(key)
+            return keys
+
+    def start_sweeper(self, evict: Callable[[], None]):
+        """periodically call evict from a daemon thread, so that idle handles are closed"""
+        if self.idle_timeout <= 0:
+            return
+        with self.lock:
+            if self._sweeper is None:
+                interval = max(min(self.idle_timeout / 2, 60), 1)
+                self._sweeper = PeriodicTask("neetbox-db-sweeper", interval, evict)
+        self._sweeper.start()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260112
+
+import collections
+from threading import Condition, Lock, Thread
+
+from neetbox.logging import Logger
+
+logger = Logger("PROJECT DB", skip_writers_names=["ws"])
+
+INGEST_FLUSH_SIZE = 256  # flush as soon as this many rows are pending
+INGEST_FLUSH_INTERVAL = 0.5  # otherwise flush every this many seconds
+INGEST_MAX_PENDING = 8192  # producers wait once this many rows are pending
+
+
+class IngestQueue:
+    """Write-behind queue of a project db. Rows put into the queue are grouped by table and flushed
+    by a background thread with one executemany per table inside a single transaction, either when
+    enough rows are pending or when the flush interval is reached. Once max_pending rows are waiting,
+    producers block until the flusher catches up, so memory usage stays bounded.
+    """
+
+    def __init__(
+        self,
+        db,
+        flush_size: int = INGEST_FLUSH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        max_pending: int = INGEST_MAX_PENDING,
+    ) -> None:
+        self.db = db
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, flush_size)
+        self._pending = collections.defaultdict(list)  # { table_name : [row, ...] }
+        self._row_limits = {}  # { (table_name, run_id, series) : num_row_limit }
+        self._num_pending = 0
+        self._cond = Condition()
+        self._flush_lock = Lock()  # make sure batches are written in order
+        self._closed = False
+        self._thread = Thread(target=self._flush_forever, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self._num_pending
+
+    def put(self, table_name: str, row: tuple, run_id=None, series=None, num_row_limit=-1):
+        """queue a row for table_name. blocks if too many rows are pending
+
+        Args:
+            table_name (str): which table to write into
+            row (tuple): row values, in the order expected by the db's batch writer
+            run_id (int, optional): id of run id the row belongs to, used by row limiting. Defaults to None.
+            series (str, optional): series of the row, used by row limiting. Defaults to None.
+            num_row_limit (int, optional): max rows to keep for (run_id, series). Defaults to -1 (no limit).
+        """
+        with self._cond:
+            while self._num_pending >= self.max_pending and not self._closed:
+                self._cond.notify_all()  # wake up flusher and wait for it
+                self._cond.wait(timeout=self.flush_interval)
+            if self._closed:
+                raise RuntimeError(f"ingest queue of {self.db} has been closed")
+            self._pending[table_name].append(row)
+            if num_row_limit and num_row_limit > 0:
+                self._row_limits[(table_name, run_id, series)] = num_row_limit
+            self._num_pending += 1
+            if self._num_pending >= self.flush_size:
+                self._cond.notify_all()
+
+    def _take(self):
+        with self._cond:
+            pending, row_limits = self._pending, self._row_limits
+            self._pending = collections.defaultdict(list)
+            self._row_limits = {}
+            self._num_pending = 0
+            self._cond.notify_all()  # release blocked producers
+        return pending, row_limits
+
+    def flush(self):
+        """write all pending rows into db"""
+        with self._flush_lock:
+            pending, row_limits = self._take()
+            if not pending:
+                return
+            try:
+                self.db._write_batch(pending, row_limits)
+            except Exception as e:
+                num_rows = sum(len(rows) for rows in pending.values())
+                logger.err(f"failed to flush {num_rows} pending rows into {self.db} cause {e}")
+
+    def _flush_forever(self):
+        while True:
+            with self._cond:
+                if not self._closed and self._num_pending < self.flush_size:
+                    self._cond.wait(timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self, flush: bool = True):
+        """stop the flusher thread
+
+        Args:
+            flush (bool, optional): whether to write pending rows before closing. Defaults to True.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            if not flush:
+                self._pending = collections.defaultdict(list)
+                self._row_limits = {}
+                self._num_pending = 0
+            self._cond.notify_all()
+        self._thread.join()
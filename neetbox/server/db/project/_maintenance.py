@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260130
+
+import time
+from threading import Lock, Thread
+from typing import Callable
+
+from neetbox.logging import Logger
+
+logger = Logger("PROJECT DB", skip_writers_names=["ws"])
+
+
+class PeriodicTask:
+    """Run a task every interval seconds from a daemon thread. The thread starts on the first call
+    of start(), and exceptions raised by the task are logged instead of stopping the loop.
+    """
+
+    def __init__(self, name: str, interval: float, task: Callable[[], None]) -> None:
+        self.name = name
+        self.interval = interval  # <= 0 to disable
+        self.task = task
+        self._thread = None
+        self._lock = Lock()
+
+    def _run_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.task()
+            except Exception as e:
+                logger.err(f"periodic task {self.name} failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self.interval <= 0 or self._thread is not None:
+                return
+            self._thread = Thread(target=self._run_forever, daemon=True, name=self.name)
+            self._thread.start()
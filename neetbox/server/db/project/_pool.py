@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260124
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from typing import Sequence
+from urllib.parse import quote
+
+from ._executor import DB_READ_WORKERS
+
+DB_CACHED_STATEMENTS = 256  # prepared statements kept by each connection, keyed by sql text
+
+
+class WriterLock:
+    """Reentrant lock of the writer connection which also knows whether the current thread holds it"""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._local.depth -= 1
+        self._lock.release()
+
+    @property
+    def owned(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0
+
+
+class ConnectionPool:
+    """Connections of a project db file: one writer shared under a lock, plus up to num_readers
+    read-only connections. A reader is checked out by a thread for the duration of a query, so
+    readers never share cursors, and since the db runs in WAL mode they neither block nor are
+    blocked by the writer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        num_readers: int = DB_READ_WORKERS,
+        pragmas: Sequence[str] = (),
+        writer_pragmas: Sequence[str] = (),
+    ) -> None:
+        self.path = path
+        self.num_readers = max(num_readers, 1)
+        self.pragmas = list(pragmas)  # run on every new connection
+        self.writer = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        for pragma in list(writer_pragmas) + self.pragmas:
+            self.writer.execute(pragma)
+        self.write_lock = WriterLock()
+        self._idle_readers = LifoQueue()
+        self._num_readers_opened = 0
+        self._readers_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _connect_reader(self):
+        uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro"
+        reader = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        for pragma in self.pragmas:
+            reader.execute(pragma)
+        return reader
+
+    def _checkout(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"connection pool of {self.path} is closed")
+        try:
+            return self._check_closed(self._idle_readers.get_nowait())
+        except Empty:
+            pass
+        with self._readers_lock:
+            if self._num_readers_opened < self.num_readers:
+                self._num_readers_opened += 1
+                try:
+                    return self._connect_reader()
+                except Exception:
+                    self._num_readers_opened -= 1
+                    raise
+        return self._check_closed(self._idle_readers.get())  # all readers are busy, wait for one
+
+    def _check_closed(self, reader):
+        if reader is None:  # put by close()
+            self._idle_readers.put(None)  # wake the next one waiting as well
+            raise sqlite3.ProgrammingError(f"connection pool of {self.path} is closed")
+        return reader
+
+    def _checkin(self, reader):
+        if self._closed:
+            reader.close()
+        else:
+            self._idle_readers.put(reader)
+
+    @contextmanager
+    def reader(self):
+        """check out a read-only connection for the current thread. nested checkouts of the same thread reuse it"""
+        reader = getattr(self._local, "reader", None)
+        if reader is not None:
+            yield reader
+            return
+        reader = self._checkout()
+        self._local.reader = reader
+        try:
+            yield reader
+        finally:
+            self._local.reader = None
+            self._checkin(reader)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """close all connections. readers checked out are closed once checked in, and checking out
+        afterwards raises instead of waiting for readers which will never be checked in"""
+        self._closed = True
+        while True:
+            try:
+                reader = self._idle_readers.get_nowait()
+            except Empty:
+                break
+            if reader is not None:
+                reader.close()
+        self._idle_readers.put(None)  # wakes threads waiting for a reader
+        self.writer.close()
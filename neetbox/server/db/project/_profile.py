@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260130
+
+from typing import List, Tuple
+
+from neetbox.logging import Logger
+
+logger = Logger("PROJECT DB", skip_writers_names=["ws"])
+
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+_TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+
+def _one_of(choices):
+    def _parse(value) -> str:
+        if str(value).upper() not in choices:
+            raise ValueError(f"should be one of {choices}, got '{value}'")
+        return str(value).upper()
+
+    return _parse
+
+
+def sqlite_pragmas(profile: dict) -> Tuple[List[str], List[str]]:
+    """turn the sqlite profile in global config into pragma statements. keys missing from the profile keep sqlite defaults
+
+    Args:
+        profile (dict): something like {"synchronous": "NORMAL", "mmap-size": 268435456, "cache-size": -8192, "temp-store": "MEMORY", "wal-autocheckpoint": 1000, "page-size": 4096}
+
+    Returns:
+        Tuple[List[str], List[str]]: pragmas for every connection, and pragmas only for the writer connection
+    """
+    pragmas, writer_pragmas = [], []
+    # (config key, pragma name, parse value, whether the pragma is writer only)
+    known_pragmas = [
+        ("page-size", "page_size", int, True),  # only has effect on new db files
+        ("synchronous", "synchronous", _one_of(_SYNCHRONOUS_LEVELS), True),
+        ("wal-autocheckpoint", "wal_autocheckpoint", int, True),
+        ("mmap-size", "mmap_size", int, False),
+        ("cache-size", "cache_size", int, False),
+        ("temp-store", "temp_store", _one_of(_TEMP_STORES), False),
+    ]
+    for key, pragma_name, parse, writer_only in known_pragmas:
+        if key not in profile:
+            continue
+        try:
+            statement = f"PRAGMA {pragma_name} = {parse(profile[key])}"
+        except Exception as e:
+            logger.warn(f"ignoring sqlite setting '{key}' in global config: {e}")
+            continue
+        (writer_pragmas if writer_only else pragmas).append(statement)
+    return pragmas, writer_pragmas
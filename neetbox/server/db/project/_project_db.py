@@ -5,14 +5,17 @@
 # Date:   20231201
 
 import collections
+import hashlib
 import json
 import os
 import sqlite3
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from threading import Lock
 from typing import Union
 
-from vdtoys.localstorage import ResourceLoader, get_file_size_in_bytes
+from vdtoys.localstorage import get_file_size_in_bytes
 
 from neetbox._protocol import *
 from neetbox.config.user import get as get_global_config
@@ -20,11 +23,26 @@ from neetbox.logging import Logger
 
 from .._manager import manager
 from ..abc import FetchType, ManageableDB, SortType
+from ._catalog import ProjectCatalog
+from ._downsample import downsample_rows
+from ._executor import close_writer
+from ._handles import HandleCache
+from ._ingest import IngestQueue
+from ._maintenance import PeriodicTask
+from ._pool import ConnectionPool
+from ._profile import sqlite_pragmas
 from .condition import ProjectDbQueryCondition
 
 logger = Logger("PROJECT DB", skip_writers_names=["ws"])
 DB_PROJECT_FILE_FOLDER = f"{get_global_config('vault')}/server/db/project"
 DB_PROJECT_FILE_TYPE_NAME = "projectdb"
+DB_PROJECT_CONFIG = get_global_config("project-db")
+DB_SQLITE_PRAGMAS, DB_SQLITE_WRITER_PRAGMAS = sqlite_pragmas(DB_PROJECT_CONFIG.get("sqlite", {}))
+SCALAR_ROLLUP_TIERS = (16, 256)  # decimations kept in rollup table, 1x is the scalar table itself
+COMPACT_MIN_FREE_RATIO = 0.1  # idle dbs are compacted once this ratio of pages is free
+COMPACT_MIN_IDLE_SECONDS = 60  # dbs used more recently than this are not compacted in background
+# whether parts of a blob can be read without loading all of it, sqlite3 of python 3.11+
+BLOB_INCREMENTAL_IO = hasattr(sqlite3.Connection, "blobopen")
 
 
 def _CHECK_GET_PROJECT_FILE_FOLDER():
@@ -54,15 +72,36 @@ def _CHECK_GET_PROJECT_FILE_FOLDER():
     return DB_PROJECT_FILE_FOLDER
 
 
+def _sha256_of(data) -> str:
+    return hashlib.sha256(data).hexdigest() if data is not None else None
+
+
 class ProjectDB(ManageableDB):
     # static things
     _path2dbc = {}
+    catalog = ProjectCatalog(DB_PROJECT_FILE_FOLDER, DB_PROJECT_FILE_TYPE_NAME)  # db files in vault
+    handles = HandleCache(
+        max_open=DB_PROJECT_CONFIG["max-open"], idle_timeout=DB_PROJECT_CONFIG["idle-timeout"]
+    )  # open dbs by project id, in lru order
+    # { project id : path of db file }, so that evicted dbs are reopened from the same file
+    _id2path = {}
+    _checkpointer: PeriodicTask = None  # truncates wal files of open dbs
+    _compactor: PeriodicTask = None  # compacts idle dbs
 
     # not static. instance level vars
     project_id: str  # of which project id
     file_path: str  # where is the db file
-    connection: sqlite3.Connection  # the db connection
+    pool: ConnectionPool  # one writer and several read-only connections
+    connection: sqlite3.Connection  # the writer connection
+    ingest_queue: IngestQueue  # batched writes
     _inited_tables: collections.defaultdict
+    _table_names: set  # names of tables in db file, loaded once on connect
+    _run_id2id: dict  # { run id : id of run id }, loaded once on connect
+    _id2run_id: dict  # { id of run id : run id }
+    _next_row_ids: dict  # { table name : next row id to assign }
+    _scalar_series_ids: dict  # { series name : id in scalar series table }
+    _scalar_rollup_seqs: dict  # { (id of run id, series id) : num points rolled up }
+    _num_rows_of: dict  # { (table name, id of run id, series) : num rows }, for row limiting
 
     def __new__(
         cls, project_id: str = None, path: str = None, **kwargs
@@ -80,16 +119,30 @@ class ProjectDB(ManageableDB):
         new_dbc = super().__new__(cls, **kwargs)
         # connect to sqlite
         new_dbc.file_path = path
-        new_dbc.connection = sqlite3.connect(
-            path, check_same_thread=False, isolation_level=None
+        new_dbc.pool = ConnectionPool(
+            path, pragmas=DB_SQLITE_PRAGMAS, writer_pragmas=DB_SQLITE_WRITER_PRAGMAS
         )
+        new_dbc.connection = new_dbc.pool.writer
+        new_dbc.connection.execute(
+            "PRAGMA auto_vacuum = INCREMENTAL"
+        )  # free pages can be given back to file system, only has effect on new db files
         new_dbc.connection.execute(
             "pragma journal_mode=wal"
         )  # set journal mode WAL
         new_dbc.connection.execute(
             "PRAGMA foreign_keys = ON"
         )  # enable foreign keys features
+        new_dbc.connection.create_function(
+            "sha256", 1, _sha256_of, deterministic=True
+        )  # used when migrating blobs
+        # one statement(or transaction) on the writer connection at a time
+        new_dbc._conn_lock = new_dbc.pool.write_lock
         new_dbc._inited_tables = collections.defaultdict(lambda: False)
+        new_dbc._next_row_ids = {}
+        new_dbc._scalar_series_ids = {}
+        new_dbc._scalar_rollup_seqs = {}
+        new_dbc._num_rows_of = {}
+        new_dbc._load_schema()
         # check neetbox version
         _db_file_project_id = new_dbc.fetch_db_project_id(project_id)
         project_id = project_id or _db_file_project_id
@@ -110,9 +163,25 @@ class ProjectDB(ManageableDB):
         cls._path2dbc[path] = new_dbc
         manager.current[project_id] = new_dbc
         new_dbc.project_id = project_id
+        new_dbc.ingest_queue = IngestQueue(new_dbc)
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(DB_PROJECT_FILE_FOLDER):
+            cls.catalog.add(project_id, path)
+        cls._id2path[project_id] = path
         logger.ok(
             f"History file(version={_db_file_version}) for project id '{project_id}' loaded."
         )
+        cls.handles.touch(project_id)
+        cls.handles.start_sweeper(cls.evict)
+        cls.evict()
+        if cls._checkpointer is None:
+            cls._checkpointer = PeriodicTask(
+                "neetbox-db-checkpoint", DB_PROJECT_CONFIG["checkpoint-interval"], cls.checkpoint_all
+            )
+            cls._compactor = PeriodicTask(
+                "neetbox-db-compact", DB_PROJECT_CONFIG["compact-interval"], cls.compact_idle
+            )
+        cls._checkpointer.start()
+        cls._compactor.start()
         return new_dbc
 
     def __repr__(self):
@@ -131,12 +200,148 @@ class ProjectDB(ManageableDB):
             result = f"failed to get file size cause {e}"
         return result
 
+    def flush(self):
+        """write rows pending in the ingest queue into db. reads do not flush, rows written with batched=True become visible once flushed"""
+        self.ingest_queue.flush()
+
+    @classmethod
+    def has_pending_rows(cls, project_id: str) -> bool:
+        """whether history db of project id is open and has rows waiting in its ingest queue. never opens the db"""
+        db = manager.current.get(project_id)
+        return db is not None and len(db.ingest_queue) > 0
+
+    def checkpoint(self):
+        """copy wal into db file and truncate wal, then let sqlite refresh statistics of tables which need it
+
+        Returns:
+            tuple: (busy, num frames in wal, num frames checkpointed) as reported by sqlite. busy is 1 if readers prevented a full checkpoint
+        """
+        self.flush()
+        with self._conn_lock:
+            result = self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            self.connection.execute("PRAGMA optimize")
+        return result
+
+    @classmethod
+    def _run_on_open_dbs(cls, task, task_name: str, min_idle_seconds: float = 0):
+        """run task(db) on every open db from a background task. dbs are leased meanwhile, which does not count as a use"""
+        with cls.handles.lock:
+            dbs = [
+                (project_id, db)
+                for project_id, db in manager.current.items()
+                if cls.handles.idle_for(project_id) >= min_idle_seconds
+            ]
+            for project_id, _ in dbs:
+                cls.handles.acquire(project_id, touch=False)
+        for project_id, db in dbs:
+            try:
+                if not db.pool.closed:
+                    task(db)
+            except Exception as e:
+                logger.warn(f"failed to {task_name} history db of project id '{project_id}': {e}")
+            finally:
+                cls.handles.release(project_id, touch=False)
+
+    @classmethod
+    def checkpoint_all(cls):
+        """checkpoint every open db, so that wal files do not keep growing during long runs"""
+        cls._run_on_open_dbs(ProjectDB.checkpoint, "checkpoint")
+
+    def _disk_usage(self):
+        return sum(
+            os.path.getsize(_path)
+            for _path in [self.file_path, f"{self.file_path}-wal"]
+            if os.path.exists(_path)
+        )
+
+    def storage_stats(self):
+        """page usage of db file
+
+        Returns:
+            dict: size on disk(with wal) in bytes, page size, num pages, num free pages and auto vacuum mode(0 none, 1 full, 2 incremental)
+        """
+        stats = {"size": self._disk_usage()}
+        for pragma in ["page_size", "page_count", "freelist_count", "auto_vacuum"]:
+            (stats[pragma],), _ = self._query(f"PRAGMA {pragma}", fetch=FetchType.ONE)
+        return stats
+
+    def compact(self, full: bool = False):
+        """give free pages back to file system. a full VACUUM is run if asked, or if db file was not created with incremental auto vacuum(which is turned on by the VACUUM), otherwise pages are released by an incremental vacuum
+
+        Args:
+            full (bool, optional): rebuild the whole db file, which also defragments it. Defaults to False.
+
+        Returns:
+            dict: size in bytes before and after, reclaimed bytes, and seconds taken by each step
+        """
+        self.flush()
+        size_before, timings = self._disk_usage(), {}
+        with self._conn_lock:
+            (auto_vacuum,), _ = self._execute("PRAGMA auto_vacuum", fetch=FetchType.ONE)
+            _start = time.perf_counter()
+            if full or auto_vacuum != 2:
+                self._execute("PRAGMA auto_vacuum = INCREMENTAL", fetch=None)
+                self._execute("VACUUM", fetch=None)
+                timings["vacuum"] = time.perf_counter() - _start
+            else:
+                self._execute("PRAGMA incremental_vacuum")  # fetch all, or only one page is freed
+                timings["incrementalVacuum"] = time.perf_counter() - _start
+            _start = time.perf_counter()
+            self._execute("PRAGMA wal_checkpoint(TRUNCATE)")  # file shrinks when wal is checkpointed
+            timings["checkpoint"] = time.perf_counter() - _start
+        size_after = self._disk_usage()
+        return {
+            PROJECT_ID_KEY: self.project_id,
+            "sizeBefore": size_before,
+            "sizeAfter": size_after,
+            "reclaimed": size_before - size_after,
+            "timings": timings,
+        }
+
+    def analyze(self):
+        """refresh statistics used by query planner
+
+        Returns:
+            dict: storage stats and seconds taken
+        """
+        self.flush()
+        _start = time.perf_counter()
+        self._execute("ANALYZE", fetch=None)
+        return {
+            PROJECT_ID_KEY: self.project_id,
+            **self.storage_stats(),
+            "timings": {"analyze": time.perf_counter() - _start},
+        }
+
+    @classmethod
+    def compact_idle(cls):
+        """compact open dbs which have not been used for a while and have enough free pages"""
+
+        def _compact_if_worth(db: "ProjectDB"):
+            stats = db.storage_stats()
+            if stats["freelist_count"] < COMPACT_MIN_FREE_RATIO * stats["page_count"]:
+                return
+            report = db.compact()
+            logger.info(
+                f"compacted history db of project id '{db.project_id}', reclaimed {report['reclaimed']} bytes in {sum(report['timings'].values()):.3f}s"
+            )
+
+        cls._run_on_open_dbs(_compact_if_worth, "compact", min_idle_seconds=COMPACT_MIN_IDLE_SECONDS)
+
     def close(self):
+        if self.pool.closed:
+            return
+        self.ingest_queue.close()
         try:
             self.connection.commit()
         except:
             pass
-        self.connection.close()
+        try:  # fold wal into db file, so that no wal is left behind by a closed db
+            with self._conn_lock:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.warn(f"failed to checkpoint history db of project id {self.project_id}: {e}")
+        self.pool.close()
 
     def delete(self):
         """delete related files of db"""
@@ -148,10 +353,14 @@ class ProjectDB(ManageableDB):
             )
         del manager.current[self.project_id]
         del ProjectDB._path2dbc[self.file_path]
+        ProjectDB.catalog.remove(self.project_id)
+        ProjectDB.handles.discard(self.project_id)
+        ProjectDB._id2path.pop(self.project_id, None)
         logger.info(f"deleting history DB for project id {self.project_id}...")
+        self.ingest_queue.close(flush=False)
         if self.connection:
             try:
-                self.connection.close()
+                self.pool.close()
             except Exception as e:
                 logger.err(
                     RuntimeError(
@@ -181,14 +390,46 @@ class ProjectDB(ManageableDB):
 
     @classmethod
     def of_project_id(cls, project_id):
-        if project_id in manager.current:
-            return manager.current[project_id]
-        return ProjectDB(project_id)
+        with cls.handles.lock:
+            if project_id in manager.current:
+                cls.handles.touch(project_id)
+                return manager.current[project_id]
+            return ProjectDB(project_id, path=cls._id2path.get(project_id))
 
-    def _execute(
-        self, query, *args, fetch: FetchType = FetchType.ALL, **kwargs
+    @classmethod
+    @contextmanager
+    def lease(cls, project_id):
+        """get db of project id, which is not evicted until the context exits"""
+        with cls.handles.lock:
+            db = cls.of_project_id(project_id)
+            cls.handles.acquire(project_id)
+        try:
+            yield db
+        finally:
+            cls.handles.release(project_id)
+
+    @classmethod
+    def evict(cls, now: float = None):
+        """close least recently used dbs over the max open limit and dbs idle for too long. they are reopened by of_project_id on next use"""
+        with cls.handles.lock:
+            for project_id in cls.handles.to_evict(now=now):
+                cls.handles.discard(project_id)
+                db = manager.current.pop(project_id, None)
+                if db is None:
+                    continue
+                cls._path2dbc.pop(db.file_path, None)
+                try:
+                    db.close()
+                    close_writer(project_id)
+                    logger.info(f"closed idle history db of project id '{project_id}'")
+                except Exception as e:
+                    logger.err(f"failed to close history db of project id '{project_id}': {e}")
+
+    @staticmethod
+    def _run_on(
+        connection: sqlite3.Connection, query, args, fetch: FetchType, **kwargs
     ):
-        cur = self.connection.cursor()
+        cur = connection.cursor()
         try:
             result = cur.execute(query, args)
         except Exception as e:
@@ -204,13 +445,34 @@ class ProjectDB(ManageableDB):
                 result = result.fetchmany(kwargs["many"])
         return result, cur.lastrowid
 
+    def _execute(
+        self, query, *args, fetch: FetchType = FetchType.ALL, **kwargs
+    ):
+        with self._conn_lock:
+            return self._run_on(self.connection, query, args, fetch, **kwargs)
+
     def _query(self, query, *args, fetch: FetchType = FetchType.ALL, **kwargs):
-        return self._execute(query, *args, fetch=fetch, **kwargs)
+        if self._conn_lock.owned:
+            # inside a write, read through the writer so that uncommitted changes are visible
+            return self._execute(query, *args, fetch=fetch, **kwargs)
+        with self.pool.reader() as reader:
+            return self._run_on(reader, query, args, fetch, **kwargs)
 
-    def table_exist(self, table_name):
-        sql_query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}';"
+    def _load_schema(self):
+        """load table names and run ids once, so that they do not have to be queried on every read. the caches are kept in sync by the methods creating tables and run ids"""
+        sql_query = "SELECT name FROM sqlite_master WHERE type='table'"
         result, _ = self._query(sql_query, fetch=FetchType.ALL)
-        return result != []
+        self._table_names = set(name for name, in result)
+        self._run_id2id, self._id2run_id = {}, {}
+        if RUN_IDS_TABLE_NAME in self._table_names:
+            sql_query = f"SELECT {ID_COLUMN_NAME}, {RUN_ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME}"
+            result, _ = self._query(sql_query, fetch=FetchType.ALL)
+            for id_of_run_id, run_id in result:
+                self._run_id2id[run_id] = id_of_run_id
+                self._id2run_id[id_of_run_id] = run_id
+
+    def table_exist(self, table_name):
+        return self._inited_tables[table_name] or table_name in self._table_names
 
     def get_table_names(self):
         sql_query = "SELECT name FROM sqlite_master;"
@@ -258,12 +520,7 @@ class ProjectDB(ManageableDB):
         return _projectid[0]
 
     def get_id_of_run_id(self, run_id: str):
-        try:
-            sql_query = f"SELECT {ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {RUN_ID_COLUMN_NAME} == '{run_id}'"
-            _id, _ = self._query(sql_query, fetch=FetchType.ONE)
-            return _id[0]
-        except:
-            return None
+        return self._run_id2id.get(run_id)
 
     _run_id_fetch_lock = Lock()
 
@@ -282,6 +539,8 @@ class ProjectDB(ManageableDB):
                 )
                 sql_query = f"INSERT INTO {RUN_IDS_TABLE_NAME}({RUN_ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME})   VALUES (?, ?)"
                 _, lastrowid = self._execute(sql_query, run_id, timestamp)
+                self._run_id2id[run_id] = lastrowid
+                self._id2run_id[lastrowid] = run_id
                 return lastrowid
         return id_of_run_id
 
@@ -308,12 +567,7 @@ class ProjectDB(ManageableDB):
         return metadata
 
     def get_run_id_of_id(self, id_of_run_id):
-        try:
-            sql_query = f"SELECT {RUN_ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {ID_COLUMN_NAME} == {id_of_run_id}"
-            run_id, _ = self._query(sql_query, fetch=FetchType.ONE)
-            return run_id[0]
-        except:
-            return None
+        return self._id2run_id.get(id_of_run_id)
 
     def get_run_ids(self):
         if not self.table_exist(RUN_IDS_TABLE_NAME):
@@ -334,12 +588,28 @@ class ProjectDB(ManageableDB):
         sql_query = (
             f"DELETE FROM {RUN_IDS_TABLE_NAME} where {RUN_ID_COLUMN_NAME} = ?"
         )
-        _, _ = self._execute(sql_query, run_id)
+        with self._run_id_fetch_lock:
+            _, _ = self._execute(sql_query, run_id)
+            id_of_run_id = self._run_id2id.pop(run_id, None)
+            self._id2run_id.pop(id_of_run_id, None)
+            self._num_rows_of = {
+                key: num_rows
+                for key, num_rows in self._num_rows_of.items()
+                if key[1] != id_of_run_id
+            }
 
     def get_series_of_table(self, table_name, run_id=None):
         if not self.table_exist(table_name):
             return []
-        if run_id is not None:
+        if table_name == SCALAR_TABLE_NAME:
+            self._init_scalar_table()  # make sure legacy scalar table is migrated
+            sql_query = f"SELECT n.{SERIES_COLUMN_NAME} FROM {SCALAR_SERIES_TABLE_NAME} n WHERE EXISTS (SELECT 1 FROM {SCALAR_TABLE_NAME} s WHERE s.{SERIES_ID_COLUMN_NAME} == n.{ID_COLUMN_NAME}"
+            args = ()
+            if run_id is not None:
+                sql_query += f" AND s.{RUN_ID_COLUMN_NAME} == (SELECT {ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {RUN_ID_COLUMN_NAME} == ?)"
+                args = (run_id,)
+            sql_query += ")"
+        elif run_id is not None:
             sql_query = f"SELECT DISTINCT t.series as series FROM {RUN_IDS_TABLE_NAME} r LEFT JOIN {table_name} t ON r.{RUN_ID_COLUMN_NAME} == ? WHERE t.{RUN_ID_COLUMN_NAME} == r.{ID_COLUMN_NAME}"
             args = (run_id,)
         else:
@@ -348,28 +618,120 @@ class ProjectDB(ManageableDB):
         result, _ = self._query(sql_query, *args, fetch=FetchType.ALL)
         return [result for (result,) in result]
 
+    def _count_new_rows(self, table_name: str, keys):
+        """count rows just written for (run id, series) that are tracked by row limiting"""
+        for run_id, series in keys:
+            for key in {(table_name, run_id, series), (table_name, run_id, None)}:
+                if key in self._num_rows_of:
+                    self._num_rows_of[key] += 1
+
     def do_limit_num_row_for(
         self,
         table_name: str,
         run_id: str,
         num_row_limit: int,
         series: str = None,
+        series_column_name: str = SERIES_COLUMN_NAME,
     ):
-        if num_row_limit <= 0:  # no limit or random not triggered
+        """delete the oldest rows of (run id, series) so that at most num_row_limit rows are kept. number of rows is counted once and then tracked in memory, so the cost does not grow with the limit
+
+        Args:
+            table_name (str): which table
+            run_id (str): id of run id
+            num_row_limit (int): max rows to keep, <= 0 means no limit
+            series (str, optional): which series. Defaults to None (all series of run id).
+            series_column_name (str, optional): column of series. Defaults to SERIES_COLUMN_NAME.
+        """
+        if num_row_limit <= 0:  # no limit
             return
-        sql_query = f"SELECT count(*) from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id}"  # count rows for run id in specific table
+        cond_str = f"{RUN_ID_COLUMN_NAME} IS ?"
+        cond_vars = [run_id]
         if series is not None:
-            sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-        num_rows, _ = self._query(sql_query, fetch=FetchType.ONE)
-        if num_rows[0] > num_row_limit:  # num rows exceeded limit
-            sql_query = f"SELECT {ID_COLUMN_NAME} from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id} ORDER BY {ID_COLUMN_NAME} DESC LIMIT 1 OFFSET {num_row_limit - 1}"  # get max id to delete of row for specific run id
-            max_id_to_del, _ = self._query(sql_query, fetch=FetchType.ONE)
-            sql_query = f"DELETE FROM {table_name} WHERE {ID_COLUMN_NAME} < {max_id_to_del[0]} AND {RUN_ID_COLUMN_NAME} = {run_id}"
-            if series is not None:
-                sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-            self._query(
-                sql_query
-            )  # delete rows with smaller id and specific run id
+            cond_str += f" AND {series_column_name} = ?"
+            cond_vars.append(series)
+        key = (table_name, run_id, series)
+        with self._conn_lock:
+            num_rows = self._num_rows_of.get(key)
+            if num_rows is None:  # count once
+                sql_query = f"SELECT count(*) FROM {table_name} WHERE {cond_str}"
+                (num_rows,), _ = self._query(sql_query, *cond_vars, fetch=FetchType.ONE)
+            if num_rows > num_row_limit:  # delete the oldest rows exceeded limit
+                sql_query = f"DELETE FROM {table_name} WHERE {ID_COLUMN_NAME} IN (SELECT {ID_COLUMN_NAME} FROM {table_name} WHERE {cond_str} ORDER BY {ID_COLUMN_NAME} LIMIT ?)"
+                self._execute(sql_query, *cond_vars, num_rows - num_row_limit)
+                num_rows = num_row_limit
+            self._num_rows_of[key] = num_rows
+
+    def _init_json_table(self, table_name: str):
+        if not self._inited_tables[
+            table_name
+        ]:  # create if there is no version table
+            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {JSON_COLUMN_NAME} TEXT NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
+            self._execute(sql_query)
+            sql_query = f"CREATE INDEX IF NOT EXISTS {table_name}_series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
+            self._execute(sql_query)
+            self._inited_tables[table_name] = True
+
+    def _allocate_row_id(self, table_name: str):
+        """assign row ids in advance so that batched rows get their ids before being written"""
+        with self._conn_lock:
+            if table_name not in self._next_row_ids:
+                sql_query = f"SELECT max({ID_COLUMN_NAME}) FROM {table_name}"
+                (max_id,), _ = self._query(sql_query, fetch=FetchType.ONE)
+                sql_query = "SELECT seq FROM sqlite_sequence WHERE name = ?"
+                seq, _ = self._query(sql_query, table_name, fetch=FetchType.ONE)
+                self._next_row_ids[table_name] = (
+                    max(max_id or 0, seq[0] if seq else 0) + 1
+                )
+            row_id = self._next_row_ids[table_name]
+            self._next_row_ids[table_name] += 1
+        return row_id
+
+    def _write_batch(self, rows_of_table: dict, row_limits: dict = None):
+        """write rows into json tables(and the scalar table) inside a single transaction
+
+        Args:
+            rows_of_table (dict): { table name : [(id, timestamp, series, id of run id, json), ...] }, rows of scalar table are (id, timestamp, id of run id, series id, x, y)
+            row_limits (dict, optional): { (table name, id of run id, series) : num row limit }, series of scalar table is the series id. Defaults to None.
+        """
+        row_limits = row_limits or {}
+        with self._conn_lock:
+            for table_name in rows_of_table:
+                if table_name == SCALAR_TABLE_NAME:
+                    self._init_scalar_table()
+                else:
+                    self._init_json_table(table_name)
+            self._execute("BEGIN", fetch=None)
+            try:
+                for table_name, rows in rows_of_table.items():
+                    if table_name == SCALAR_TABLE_NAME:
+                        sql_query = f"INSERT INTO {SCALAR_TABLE_NAME}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, {X_COLUMN_NAME}, {Y_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?, ?)"
+                    else:
+                        sql_query = f"INSERT INTO {table_name}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
+                    self.connection.executemany(sql_query, rows)
+                    if table_name == SCALAR_TABLE_NAME:
+                        self._update_scalar_rollups(rows)
+                        self._count_new_rows(table_name, ((row[2], row[3]) for row in rows))
+                    else:
+                        self._count_new_rows(table_name, ((row[3], row[2]) for row in rows))
+                for (table_name, run_id, series), num_row_limit in row_limits.items():
+                    self.do_limit_num_row_for(
+                        table_name=table_name,
+                        run_id=run_id,
+                        num_row_limit=num_row_limit,
+                        series=series,
+                        series_column_name=(
+                            SERIES_ID_COLUMN_NAME
+                            if table_name == SCALAR_TABLE_NAME
+                            else SERIES_COLUMN_NAME
+                        ),
+                    )
+                self._execute("COMMIT", fetch=None)
+            except Exception as e:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                self._scalar_rollup_seqs.clear()  # reload from db next time
+                self._num_rows_of.clear()
+                raise e
 
     def write_json(
         self,
@@ -379,32 +741,54 @@ class ProjectDB(ManageableDB):
         run_id: str = None,
         timestamp: str = None,
         num_row_limit=-1,
+        batched: bool = False,
     ):
+        """write a json row into table
+
+        Args:
+            table_name (str): table to write into
+            json_data (str): json string or dict
+            series (str, optional): series name. Defaults to None.
+            run_id (str, optional): run id. Defaults to None.
+            timestamp (str, optional): timestamp. Defaults to None.
+            num_row_limit (int, optional): max rows to keep for (run id, series). Defaults to -1.
+            batched (bool, optional): queue the row and let the ingest queue write it later. Defaults to False.
+
+        Returns:
+            int: id of the row
+        """
         if not isinstance(json_data, dict):
             json_data = json.loads(json_data)
+        if table_name == SCALAR_TABLE_NAME:  # scalars have their own table
+            return self.write_scalar(
+                x=json_data.get(X_COLUMN_NAME),
+                y=json_data.get(Y_COLUMN_NAME),
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+                batched=batched,
+            )
         if run_id:
             run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
-        if not self._inited_tables[
-            table_name
-        ]:  # create if there is no version table
-            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {JSON_COLUMN_NAME} TEXT NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
-            self._execute(sql_query)
-            sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
-            self._execute(sql_query)
-            self._inited_tables[table_name] = True
-
-        sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?)"
-        if isinstance(json_data, dict):
-            json_data = json.dumps(json_data)
-        _, lastrowid = self._execute(
-            sql_query, timestamp, series, run_id, json_data
-        )
-        self.do_limit_num_row_for(
-            table_name=table_name,
-            run_id=run_id,
-            num_row_limit=num_row_limit,
-            series=series,
-        )
+        self._init_json_table(table_name)
+        lastrowid = self._allocate_row_id(table_name)
+        row = (lastrowid, timestamp, series, run_id, json.dumps(json_data))
+        if batched:
+            self.ingest_queue.put(
+                table_name,
+                row,
+                run_id=run_id,
+                series=series,
+                num_row_limit=num_row_limit,
+            )
+        else:
+            row_limits = (
+                {(table_name, run_id, series): num_row_limit}
+                if num_row_limit > 0
+                else {}
+            )
+            self._write_batch({table_name: [row]}, row_limits)
         return lastrowid
 
     def read_json(
@@ -412,11 +796,13 @@ class ProjectDB(ManageableDB):
     ):
         if not self.table_exist(table_name):
             return []
+        if table_name == SCALAR_TABLE_NAME:  # scalars have their own table
+            return self.read_scalar(condition=condition)
         if condition and isinstance(condition.run_id, str):
             condition.run_id = self.get_id_of_run_id(
                 condition.run_id
             )  # convert run id
-        cond_str, cond_vars = condition.dumpt() if condition else ""
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
         sql_query = f"SELECT {', '.join((ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME,SERIES_COLUMN_NAME, JSON_COLUMN_NAME))} FROM {table_name} {cond_str}"
         result, _ = self._query(sql_query, *cond_vars, fetch=FetchType.ALL)
         result = [
@@ -430,6 +816,293 @@ class ProjectDB(ManageableDB):
         ]
         return result
 
+    def _init_scalar_table(self):
+        if self._inited_tables[SCALAR_TABLE_NAME]:
+            return
+        with self._conn_lock:
+            sql_query = f"PRAGMA table_info({SCALAR_TABLE_NAME})"
+            columns, _ = self._query(sql_query, fetch=FetchType.ALL)
+            is_legacy = JSON_COLUMN_NAME in [column[1] for column in columns]
+            if is_legacy:  # scalars used to be stored as json
+                logger.info(
+                    f"migrating json scalars of project id '{self.project_id}' into typed scalar table..."
+                )
+                sql_query = f"ALTER TABLE {SCALAR_TABLE_NAME} RENAME TO {SCALAR_TABLE_NAME}Legacy"
+                self._execute(sql_query)
+            sql_query = f"CREATE TABLE IF NOT EXISTS {SCALAR_SERIES_TABLE_NAME} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {SERIES_COLUMN_NAME} TEXT NOT NULL UNIQUE );"
+            self._execute(sql_query)
+            self._table_names.add(SCALAR_SERIES_TABLE_NAME)
+            sql_query = f"CREATE TABLE IF NOT EXISTS {SCALAR_TABLE_NAME} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {SERIES_ID_COLUMN_NAME} INTEGER, {X_COLUMN_NAME} REAL, {Y_COLUMN_NAME} REAL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE, FOREIGN KEY({SERIES_ID_COLUMN_NAME}) REFERENCES {SCALAR_SERIES_TABLE_NAME}({ID_COLUMN_NAME}));"
+            self._execute(sql_query)
+            sql_query = f"CREATE INDEX IF NOT EXISTS scalar_runid_seriesid_x_index ON {SCALAR_TABLE_NAME} ({RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, {X_COLUMN_NAME})"
+            self._execute(sql_query)
+            if is_legacy:
+                self._execute("BEGIN", fetch=None)
+                sql_query = f"INSERT OR IGNORE INTO {SCALAR_SERIES_TABLE_NAME}({SERIES_COLUMN_NAME}) SELECT DISTINCT {SERIES_COLUMN_NAME} FROM {SCALAR_TABLE_NAME}Legacy WHERE {SERIES_COLUMN_NAME} IS NOT NULL"
+                self._execute(sql_query)
+                sql_query = f"INSERT INTO {SCALAR_TABLE_NAME}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, {X_COLUMN_NAME}, {Y_COLUMN_NAME}) SELECT l.{ID_COLUMN_NAME}, l.{TIMESTAMP_COLUMN_NAME}, l.{RUN_ID_COLUMN_NAME}, n.{ID_COLUMN_NAME}, json_extract(l.{JSON_COLUMN_NAME}, '$.{X_COLUMN_NAME}'), json_extract(l.{JSON_COLUMN_NAME}, '$.{Y_COLUMN_NAME}') FROM {SCALAR_TABLE_NAME}Legacy l LEFT JOIN {SCALAR_SERIES_TABLE_NAME} n ON l.{SERIES_COLUMN_NAME} == n.{SERIES_COLUMN_NAME}"
+                self._execute(sql_query)
+                self._execute(f"DROP TABLE {SCALAR_TABLE_NAME}Legacy")
+                self._execute("COMMIT", fetch=None)
+                self._next_row_ids.pop(SCALAR_TABLE_NAME, None)
+            self._init_scalar_rollup_table()
+            self._inited_tables[SCALAR_TABLE_NAME] = True
+
+    def _init_scalar_rollup_table(self):
+        """create rollup table of scalars. rollup rows of a tier aggregate every `tier` points of a series, they are updated as points are written. rows of existing points are built when the table is created"""
+        rollup_exists = self.table_exist(SCALAR_ROLLUP_TABLE_NAME)
+        sql_query = f"CREATE TABLE IF NOT EXISTS {SCALAR_ROLLUP_TABLE_NAME} ( {RUN_ID_COLUMN_NAME} INTEGER NOT NULL, {SERIES_ID_COLUMN_NAME} INTEGER NOT NULL, tier INTEGER NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, idLast INTEGER, {TIMESTAMP_COLUMN_NAME} TEXT, xMin REAL, xMax REAL, xLast REAL, yMin REAL, yMax REAL, ySum REAL, yLast REAL, PRIMARY KEY({RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, tier, bucket), FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
+        self._execute(sql_query)
+        self._table_names.add(SCALAR_ROLLUP_TABLE_NAME)
+        if rollup_exists:
+            return
+        self._execute("BEGIN", fetch=None)
+        for tier in SCALAR_ROLLUP_TIERS:  # build rollups of existing points
+            sql_query = f"INSERT INTO {SCALAR_ROLLUP_TABLE_NAME} SELECT {RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, ?, bucket, count(*), max({ID_COLUMN_NAME}), {TIMESTAMP_COLUMN_NAME}, min({X_COLUMN_NAME}), max({X_COLUMN_NAME}), {X_COLUMN_NAME}, min({Y_COLUMN_NAME}), max({Y_COLUMN_NAME}), sum({Y_COLUMN_NAME}), {Y_COLUMN_NAME} FROM (SELECT *, (row_number() OVER (PARTITION BY {RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME} ORDER BY {ID_COLUMN_NAME}) - 1) / ? AS bucket FROM {SCALAR_TABLE_NAME} WHERE {RUN_ID_COLUMN_NAME} IS NOT NULL AND {SERIES_ID_COLUMN_NAME} IS NOT NULL AND {X_COLUMN_NAME} IS NOT NULL AND {Y_COLUMN_NAME} IS NOT NULL) GROUP BY {RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, bucket"
+            self._execute(sql_query, tier, tier)
+        self._execute("COMMIT", fetch=None)
+
+    def _update_scalar_rollups(self, rows):
+        """aggregate written scalar rows into rollup tiers. should be called inside the write transaction"""
+        aggregates = {}  # { (id of run id, series id, tier, bucket) : [count, idLast, timestamp, xMin, xMax, xLast, yMin, yMax, ySum, yLast] }
+        for _id, timestamp, run_id, series_id, x, y in rows:
+            if run_id is None or series_id is None:
+                continue
+            try:  # numbers may come as strings, the scalar table stores them as numbers anyway
+                x, y = float(x), float(y)
+            except (TypeError, ValueError):
+                continue  # only numbers are rolled up
+            key = (run_id, series_id)
+            if key not in self._scalar_rollup_seqs:  # continue from the last rollup bucket
+                sql_query = f"SELECT bucket, count FROM {SCALAR_ROLLUP_TABLE_NAME} WHERE {RUN_ID_COLUMN_NAME} = ? AND {SERIES_ID_COLUMN_NAME} = ? AND tier = ? ORDER BY bucket DESC LIMIT 1"
+                last_bucket, _ = self._query(
+                    sql_query, run_id, series_id, SCALAR_ROLLUP_TIERS[0], fetch=FetchType.ONE
+                )
+                self._scalar_rollup_seqs[key] = (
+                    last_bucket[0] * SCALAR_ROLLUP_TIERS[0] + last_bucket[1] if last_bucket else 0
+                )
+            seq = self._scalar_rollup_seqs[key]
+            self._scalar_rollup_seqs[key] += 1
+            for tier in SCALAR_ROLLUP_TIERS:
+                agg = aggregates.get((run_id, series_id, tier, seq // tier))
+                if agg is None:
+                    aggregates[(run_id, series_id, tier, seq // tier)] = [
+                        *(1, _id, timestamp),
+                        *(x, x, x),
+                        *(y, y, y, y),
+                    ]
+                    continue
+                agg[0] += 1
+                agg[3], agg[4] = min(agg[3], x), max(agg[4], x)
+                agg[6], agg[7], agg[8] = min(agg[6], y), max(agg[7], y), agg[8] + y
+                if _id > agg[1]:
+                    agg[1], agg[2], agg[5], agg[9] = _id, timestamp, x, y
+        if not aggregates:
+            return
+        sql_query = f"INSERT INTO {SCALAR_ROLLUP_TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT({RUN_ID_COLUMN_NAME}, {SERIES_ID_COLUMN_NAME}, tier, bucket) DO UPDATE SET count = count + excluded.count, xMin = min(xMin, excluded.xMin), xMax = max(xMax, excluded.xMax), yMin = min(yMin, excluded.yMin), yMax = max(yMax, excluded.yMax), ySum = ySum + excluded.ySum, idLast = max(idLast, excluded.idLast), {TIMESTAMP_COLUMN_NAME} = CASE WHEN excluded.idLast > idLast THEN excluded.{TIMESTAMP_COLUMN_NAME} ELSE {TIMESTAMP_COLUMN_NAME} END, xLast = CASE WHEN excluded.idLast > idLast THEN excluded.xLast ELSE xLast END, yLast = CASE WHEN excluded.idLast > idLast THEN excluded.yLast ELSE yLast END"
+        self.connection.executemany(
+            sql_query, [(*key, *agg) for key, agg in aggregates.items()]
+        )
+
+    def _get_scalar_series_id(self, series: str):
+        if series is None:
+            return None
+        if series not in self._scalar_series_ids:
+            with self._conn_lock:
+                sql_query = f"INSERT OR IGNORE INTO {SCALAR_SERIES_TABLE_NAME}({SERIES_COLUMN_NAME}) VALUES (?)"
+                self._execute(sql_query, series)
+                sql_query = f"SELECT {ID_COLUMN_NAME} FROM {SCALAR_SERIES_TABLE_NAME} WHERE {SERIES_COLUMN_NAME} == ?"
+                (series_id,), _ = self._query(sql_query, series, fetch=FetchType.ONE)
+                self._scalar_series_ids[series] = series_id
+        return self._scalar_series_ids[series]
+
+    def write_scalar(
+        self,
+        x: float,
+        y: float,
+        series: str = None,
+        run_id: str = None,
+        timestamp: str = None,
+        num_row_limit=-1,
+        batched: bool = False,
+    ):
+        """write a scalar point into the scalar table
+
+        Args:
+            x (float): x
+            y (float): y
+            series (str, optional): series name. Defaults to None.
+            run_id (str, optional): run id. Defaults to None.
+            timestamp (str, optional): timestamp. Defaults to None.
+            num_row_limit (int, optional): max points to keep for (run id, series). Defaults to -1.
+            batched (bool, optional): queue the point and let the ingest queue write it later. Defaults to False.
+
+        Returns:
+            int: id of the point
+        """
+        if run_id:
+            run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
+        self._init_scalar_table()
+        series_id = self._get_scalar_series_id(series)
+        lastrowid = self._allocate_row_id(SCALAR_TABLE_NAME)
+        row = (lastrowid, timestamp, run_id, series_id, x, y)
+        if batched:
+            self.ingest_queue.put(
+                SCALAR_TABLE_NAME,
+                row,
+                run_id=run_id,
+                series=series_id,
+                num_row_limit=num_row_limit,
+            )
+        else:
+            row_limits = (
+                {(SCALAR_TABLE_NAME, run_id, series_id): num_row_limit}
+                if num_row_limit > 0
+                else {}
+            )
+            self._write_batch({SCALAR_TABLE_NAME: [row]}, row_limits)
+        return lastrowid
+
+    def read_scalar(self, condition: ProjectDbQueryCondition = None):
+        """read scalar points. the result is in the same shape as read_json, x and y are put into metadata. if condition.max_points is set, each series is downsampled to at most max_points points, reading from the coarsest rollup tier that still has enough points for that series. downsampled points also have min, max, last and count of y in metadata
+
+        Args:
+            condition (ProjectDbQueryCondition, optional): query condition. Defaults to None.
+
+        Returns:
+            list: list of points
+        """
+        if not self.table_exist(SCALAR_TABLE_NAME):
+            return []
+        self._init_scalar_table()
+        if condition and isinstance(condition.run_id, str):
+            condition.run_id = self.get_id_of_run_id(
+                condition.run_id
+            )  # convert run id
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
+        if condition and condition.max_points:
+            rollup_tiers = (
+                self._choose_scalar_rollup_tiers(
+                    condition.max_points, cond_str, cond_vars
+                )
+                if not condition.limit
+                else {}
+            )
+            return self._read_scalar_rollup(
+                rollup_tiers, condition, cond_str, cond_vars
+            )
+        sql_query = f"SELECT {', '.join((ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME, SERIES_COLUMN_NAME, X_COLUMN_NAME, Y_COLUMN_NAME))} FROM (SELECT s.{ID_COLUMN_NAME} AS {ID_COLUMN_NAME}, s.{TIMESTAMP_COLUMN_NAME} AS {TIMESTAMP_COLUMN_NAME}, n.{SERIES_COLUMN_NAME} AS {SERIES_COLUMN_NAME}, s.{RUN_ID_COLUMN_NAME} AS {RUN_ID_COLUMN_NAME}, s.{X_COLUMN_NAME} AS {X_COLUMN_NAME}, s.{Y_COLUMN_NAME} AS {Y_COLUMN_NAME} FROM {SCALAR_TABLE_NAME} s LEFT JOIN {SCALAR_SERIES_TABLE_NAME} n ON s.{SERIES_ID_COLUMN_NAME} == n.{ID_COLUMN_NAME}) {cond_str}"
+        result, _ = self._query(sql_query, *cond_vars, fetch=FetchType.ALL)
+        result = [
+            {
+                ID_COLUMN_NAME: _id,
+                TIMESTAMP_COLUMN_NAME: timestamp,
+                SERIES_COLUMN_NAME: series,
+                JSON_COLUMN_NAME: {X_COLUMN_NAME: x, Y_COLUMN_NAME: y},
+            }
+            for _id, timestamp, series, x, y in result
+        ]
+        return result
+
+    # rollup rows seen as points: id and timestamp of the last point, x in the middle and y of the mean
+    _SCALAR_ROLLUP_POINTS = f"SELECT r.idLast AS {ID_COLUMN_NAME}, r.{TIMESTAMP_COLUMN_NAME} AS {TIMESTAMP_COLUMN_NAME}, n.{SERIES_COLUMN_NAME} AS {SERIES_COLUMN_NAME}, r.{RUN_ID_COLUMN_NAME} AS {RUN_ID_COLUMN_NAME}, (r.xMin + r.xMax) / 2 AS {X_COLUMN_NAME}, r.ySum / r.count AS {Y_COLUMN_NAME}, r.yMin AS yMin, r.yMax AS yMax, r.yLast AS yLast, r.count AS count FROM {SCALAR_ROLLUP_TABLE_NAME} r LEFT JOIN {SCALAR_SERIES_TABLE_NAME} n ON r.{SERIES_ID_COLUMN_NAME} == n.{ID_COLUMN_NAME}"
+    _SCALAR_ROLLUP_SUBQUERY = f"({_SCALAR_ROLLUP_POINTS} WHERE r.tier == ?)"
+    # raw points seen as rollups of one point
+    _SCALAR_RAW_POINTS = f"SELECT s.{ID_COLUMN_NAME} AS {ID_COLUMN_NAME}, s.{TIMESTAMP_COLUMN_NAME} AS {TIMESTAMP_COLUMN_NAME}, n.{SERIES_COLUMN_NAME} AS {SERIES_COLUMN_NAME}, s.{RUN_ID_COLUMN_NAME} AS {RUN_ID_COLUMN_NAME}, s.{X_COLUMN_NAME} AS {X_COLUMN_NAME}, s.{Y_COLUMN_NAME} AS {Y_COLUMN_NAME}, s.{Y_COLUMN_NAME} AS yMin, s.{Y_COLUMN_NAME} AS yMax, s.{Y_COLUMN_NAME} AS yLast, 1 AS count FROM {SCALAR_TABLE_NAME} s LEFT JOIN {SCALAR_SERIES_TABLE_NAME} n ON s.{SERIES_ID_COLUMN_NAME} == n.{ID_COLUMN_NAME}"
+
+    def _choose_scalar_rollup_tiers(self, max_points, cond_str, cond_vars):
+        """find the coarsest tier which still has max_points points for each series in condition. series which have too few points even for the finest rollup tier are left out
+
+        Returns:
+            dict: { series : tier }
+        """
+        sql_query = f"SELECT {SERIES_COLUMN_NAME}, sum(count) FROM (SELECT * FROM {self._SCALAR_ROLLUP_SUBQUERY} {cond_str}) GROUP BY {SERIES_COLUMN_NAME}"
+        result, _ = self._query(
+            sql_query, SCALAR_ROLLUP_TIERS[-1], *cond_vars, fetch=FetchType.ALL
+        )
+        rollup_tiers = {}
+        for series, num_points in result:
+            for tier in SCALAR_ROLLUP_TIERS:
+                if series is not None and num_points // tier >= max_points:
+                    rollup_tiers[series] = tier
+        return rollup_tiers
+
+    def _read_scalar_rollup(self, rollup_tiers, condition, cond_str, cond_vars):
+        """read series in rollup_tiers from their tier, and other series from raw points, then downsample each series to condition.max_points. rows are in the same shape wherever they come from"""
+        columns = ", ".join(
+            (
+                ID_COLUMN_NAME,
+                TIMESTAMP_COLUMN_NAME,
+                SERIES_COLUMN_NAME,
+                X_COLUMN_NAME,
+                Y_COLUMN_NAME,
+            )
+        )
+        if rollup_tiers:
+            values = ", ".join(["(?, ?)"] * len(rollup_tiers))
+            sql_query = f"WITH chosen(series, tier) AS (VALUES {values}) SELECT {columns}, yMin, yMax, yLast, count FROM ({self._SCALAR_ROLLUP_POINTS} JOIN chosen c ON n.{SERIES_COLUMN_NAME} == c.series AND r.tier == c.tier UNION ALL {self._SCALAR_RAW_POINTS} WHERE n.{SERIES_COLUMN_NAME} IS NULL OR n.{SERIES_COLUMN_NAME} NOT IN (SELECT series FROM chosen)) {cond_str}"
+            tiers_vars = [var for item in rollup_tiers.items() for var in item]
+        else:
+            sql_query = f"SELECT {columns}, yMin, yMax, yLast, count FROM ({self._SCALAR_RAW_POINTS}) {cond_str}"
+            tiers_vars = []
+        result, _ = self._query(
+            sql_query, *tiers_vars, *cond_vars, fetch=FetchType.ALL
+        )
+        result = downsample_rows(
+            result,
+            max_points=condition.max_points,
+            method=condition.downsample,
+        )
+        result = [
+            {
+                ID_COLUMN_NAME: _id,
+                TIMESTAMP_COLUMN_NAME: timestamp,
+                SERIES_COLUMN_NAME: series,
+                JSON_COLUMN_NAME: {
+                    X_COLUMN_NAME: x,
+                    Y_COLUMN_NAME: y,
+                    "min": y_min,
+                    "max": y_max,
+                    "last": y_last,
+                    "count": count,
+                },
+            }
+            for _id, timestamp, series, x, y, y_min, y_max, y_last, count in result
+        ]
+        return result
+
+    def read_json_since(
+        self,
+        table_name: str,
+        cursor: int = 0,
+        condition: ProjectDbQueryCondition = None,
+        limit: int = 1000,
+    ):
+        """read rows with id greater than cursor in id order, at most limit rows
+
+        Args:
+            table_name (str): table to read
+            cursor (int, optional): id of the last row already read. Defaults to 0.
+            condition (ProjectDbQueryCondition, optional): other conditions, its id range, order and limit are ignored. Defaults to None.
+            limit (int, optional): max rows to read, should be positive. Defaults to 1000.
+
+        Returns:
+            tuple: (rows, cursor for the next read). no rows and the same cursor if run id of condition does not exist
+        """
+        if limit <= 0:  # a condition without limit would read all rows
+            raise ValueError(f"limit should be positive, got {limit}")
+        condition = condition or ProjectDbQueryCondition()
+        if isinstance(condition.run_id, str):
+            condition.run_id = self.get_id_of_run_id(condition.run_id)
+            if condition.run_id is None:  # would read rows of every run instead
+                return [], cursor
+        condition.id_range = (None, None)
+        condition.after_id = cursor or 0
+        condition.order = {ID_COLUMN_NAME: SortType.ASC}
+        condition.limit = limit
+        rows = self.read_json(table_name=table_name, condition=condition)
+        return rows, rows[-1][ID_COLUMN_NAME] if rows else cursor
+
     def set_status(self, run_id: str, series: str, json_data):
         if not (isinstance(json_data, str) or isinstance(json_data, dict)):
             raise
@@ -462,12 +1135,53 @@ class ProjectDB(ManageableDB):
         )
         result = {}
         for id_of_runid, series_name, value in query_result:
-            run_id = self.get_run_id_of_id(id_of_runid)
+            run_id = self._id2run_id.get(id_of_runid)
             if run_id and run_id not in result:
                 result[run_id] = {}
             result[run_id][series_name] = json.loads(value)
         return result
 
+    def _init_blob_store(self):
+        if self._inited_tables[BLOB_STORE_TABLE_NAME]:
+            return
+        sql_query = f"CREATE TABLE IF NOT EXISTS {BLOB_STORE_TABLE_NAME} ( {HASH_COLUMN_NAME} TEXT PRIMARY KEY, size INTEGER NOT NULL, refCount INTEGER NOT NULL DEFAULT 0, {BLOB_COLUMN_NAME} BLOB NOT NULL );"
+        self._execute(sql_query)
+        self._inited_tables[BLOB_STORE_TABLE_NAME] = True
+
+    def _init_blob_table(self, table_name: str):
+        """create table of blob refs. rows only hold the hash of blob, blobs are kept once in the blob store and counted by triggers"""
+        if self._inited_tables[table_name]:
+            return
+        with self._conn_lock:
+            self._init_blob_store()
+            sql_query = f"PRAGMA table_info({table_name})"
+            columns, _ = self._query(sql_query, fetch=FetchType.ALL)
+            is_legacy = BLOB_COLUMN_NAME in [column[1] for column in columns]
+            if is_legacy:  # blobs used to be stored inline
+                logger.info(
+                    f"migrating blobs of table '{table_name}' of project id '{self.project_id}' into blob store..."
+                )
+                sql_query = f"ALTER TABLE {table_name} RENAME TO {table_name}Legacy"
+                self._execute(sql_query)
+                self._execute(f"DROP INDEX IF EXISTS {table_name}_series_and_runid_index")
+            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {METADATA_COLUMN_NAME} TEXT, {HASH_COLUMN_NAME} TEXT NOT NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
+            self._execute(sql_query)
+            sql_query = f"CREATE INDEX IF NOT EXISTS {table_name}_series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {table_name}_blob_ref AFTER INSERT ON {table_name} BEGIN UPDATE {BLOB_STORE_TABLE_NAME} SET refCount = refCount + 1 WHERE {HASH_COLUMN_NAME} = NEW.{HASH_COLUMN_NAME}; END;"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {table_name}_blob_unref AFTER DELETE ON {table_name} BEGIN UPDATE {BLOB_STORE_TABLE_NAME} SET refCount = refCount - 1 WHERE {HASH_COLUMN_NAME} = OLD.{HASH_COLUMN_NAME}; DELETE FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = OLD.{HASH_COLUMN_NAME} AND refCount <= 0; END;"
+            self._execute(sql_query)
+            if is_legacy:
+                self._execute("BEGIN", fetch=None)
+                sql_query = f"INSERT OR IGNORE INTO {BLOB_STORE_TABLE_NAME}({HASH_COLUMN_NAME}, size, {BLOB_COLUMN_NAME}) SELECT sha256({BLOB_COLUMN_NAME}), length({BLOB_COLUMN_NAME}), {BLOB_COLUMN_NAME} FROM {table_name}Legacy WHERE {BLOB_COLUMN_NAME} IS NOT NULL"
+                self._execute(sql_query)
+                sql_query = f"INSERT INTO {table_name}({ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {HASH_COLUMN_NAME}) SELECT {ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, sha256({BLOB_COLUMN_NAME}) FROM {table_name}Legacy WHERE {BLOB_COLUMN_NAME} IS NOT NULL"
+                self._execute(sql_query)
+                self._execute(f"DROP TABLE {table_name}Legacy")
+                self._execute("COMMIT", fetch=None)
+            self._inited_tables[table_name] = True
+
     def write_blob(
         self,
         table_name: str,
@@ -484,28 +1198,33 @@ class ProjectDB(ManageableDB):
         )
         if run_id:
             run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
-        if isinstance(blob_data, bytes):
-            blob_data = bytearray(blob_data)
         if isinstance(meta_data, dict):
             meta_data = json.dumps(meta_data)
+        blob_hash = _sha256_of(blob_data)
 
-        if not self._inited_tables[table_name]:  # create if not exist
-            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {METADATA_COLUMN_NAME} TEXT, {BLOB_COLUMN_NAME} BLOB NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
-            self._execute(sql_query)
-            sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
-            self._execute(sql_query)
-            self._inited_tables[table_name] = True
-
-        sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
-        _, lastrowid = self._execute(
-            sql_query, timestamp, series, run_id, meta_data, blob_data
-        )
-        self.do_limit_num_row_for(
-            table_name=table_name,
-            run_id=run_id,
-            num_row_limit=num_row_limit,
-            series=series,
-        )
+        with self._conn_lock:
+            self._init_blob_table(table_name)
+            self._execute("BEGIN", fetch=None)
+            try:  # identical blobs are stored only once
+                sql_query = f"INSERT OR IGNORE INTO {BLOB_STORE_TABLE_NAME}({HASH_COLUMN_NAME}, size, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?)"
+                self._execute(sql_query, blob_hash, len(blob_data), blob_data)
+                sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {HASH_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
+                _, lastrowid = self._execute(
+                    sql_query, timestamp, series, run_id, meta_data, blob_hash
+                )
+                self._count_new_rows(table_name, [(run_id, series)])
+                self.do_limit_num_row_for(
+                    table_name=table_name,
+                    run_id=run_id,
+                    num_row_limit=num_row_limit,
+                    series=series,
+                )
+                self._execute("COMMIT", fetch=None)
+            except Exception as e:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                self._num_rows_of.clear()
+                raise e
         return lastrowid
 
     def read_blob(
@@ -514,17 +1233,131 @@ class ProjectDB(ManageableDB):
         condition: ProjectDbQueryCondition = None,
         meta_only=False,
     ):
+        """read rows of blob table
+
+        Returns:
+            list: rows of (id, timestamp, metadata, blob), or (id, timestamp, metadata, hash) if meta_only
+        """
         if not self.table_exist(table_name):
             return []
+        self._init_blob_table(table_name)  # migrate legacy table if needed
         if condition and isinstance(condition.run_id, str):
             condition.run_id = self.get_id_of_run_id(
                 condition.run_id
             )  # convert run id
-        cond_str, cond_vars = condition.dumpt() if condition else ""
-        sql_query = f"SELECT {', '.join((ID_COLUMN_NAME,TIMESTAMP_COLUMN_NAME, METADATA_COLUMN_NAME, *((BLOB_COLUMN_NAME,) if not meta_only else ())))} FROM {table_name} {cond_str}"
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
+        if meta_only:
+            sql_query = f"SELECT {', '.join((ID_COLUMN_NAME,TIMESTAMP_COLUMN_NAME, METADATA_COLUMN_NAME, HASH_COLUMN_NAME))} FROM {table_name} {cond_str}"
+        else:  # blob columns do not collide with columns of blob tables
+            sql_query = f"SELECT {', '.join((ID_COLUMN_NAME,TIMESTAMP_COLUMN_NAME, METADATA_COLUMN_NAME, BLOB_COLUMN_NAME))} FROM {table_name} LEFT JOIN {BLOB_STORE_TABLE_NAME} USING ({HASH_COLUMN_NAME}) {cond_str}"
         result, _ = self._query(sql_query, *cond_vars, fetch=FetchType.ALL)
         return result
 
+    def read_blob_of_hash(self, blob_hash: str):
+        """read a blob from blob store
+
+        Returns:
+            bytes: the blob, None if not found
+        """
+        if not self.table_exist(BLOB_STORE_TABLE_NAME):
+            return None
+        sql_query = f"SELECT {BLOB_COLUMN_NAME} FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ?"
+        result, _ = self._query(sql_query, blob_hash, fetch=FetchType.ONE)
+        return result[0] if result else None
+
+    def _init_thumbnail_table(self):
+        """create table of thumbnails. thumbnails are kept in blob store and removed together with their original blob"""
+        if self._inited_tables[THUMBNAIL_TABLE_NAME]:
+            return
+        with self._conn_lock:
+            self._init_blob_store()
+            sql_query = f"CREATE TABLE IF NOT EXISTS {THUMBNAIL_TABLE_NAME} ( {HASH_COLUMN_NAME} TEXT NOT NULL, size INTEGER NOT NULL, thumbnailHash TEXT NOT NULL, mediaType TEXT, PRIMARY KEY({HASH_COLUMN_NAME}, size) );"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {THUMBNAIL_TABLE_NAME}_blob_ref AFTER INSERT ON {THUMBNAIL_TABLE_NAME} WHEN NEW.thumbnailHash != NEW.{HASH_COLUMN_NAME} BEGIN UPDATE {BLOB_STORE_TABLE_NAME} SET refCount = refCount + 1 WHERE {HASH_COLUMN_NAME} = NEW.thumbnailHash; END;"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {THUMBNAIL_TABLE_NAME}_blob_unref AFTER DELETE ON {THUMBNAIL_TABLE_NAME} WHEN OLD.thumbnailHash != OLD.{HASH_COLUMN_NAME} BEGIN UPDATE {BLOB_STORE_TABLE_NAME} SET refCount = refCount - 1 WHERE {HASH_COLUMN_NAME} = OLD.thumbnailHash; DELETE FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = OLD.thumbnailHash AND refCount <= 0; END;"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {BLOB_STORE_TABLE_NAME}_thumbnail_gc AFTER DELETE ON {BLOB_STORE_TABLE_NAME} BEGIN DELETE FROM {THUMBNAIL_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = OLD.{HASH_COLUMN_NAME}; END;"
+            self._execute(sql_query)
+            self._inited_tables[THUMBNAIL_TABLE_NAME] = True
+
+    def write_thumbnail(
+        self, blob_hash: str, size: int, data: bytes = None, media_type: str = None
+    ):
+        """save a thumbnail of blob, ignored if the blob does not exist any more
+
+        Args:
+            blob_hash (str): hash of original blob
+            size (int): size of thumbnail
+            data (bytes, optional): encoded thumbnail. Defaults to None (the original blob is small enough to be used as thumbnail).
+            media_type (str, optional): media type of thumbnail. Defaults to None.
+        """
+        thumbnail_hash = _sha256_of(data) if data is not None else blob_hash
+        with self._conn_lock:
+            self._init_thumbnail_table()
+            self._execute("BEGIN", fetch=None)
+            try:
+                if data is not None:
+                    sql_query = f"INSERT OR IGNORE INTO {BLOB_STORE_TABLE_NAME}({HASH_COLUMN_NAME}, size, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?)"
+                    self._execute(sql_query, thumbnail_hash, len(data), data)
+                sql_query = f"INSERT OR IGNORE INTO {THUMBNAIL_TABLE_NAME}({HASH_COLUMN_NAME}, size, thumbnailHash, mediaType) SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ?)"
+                self._execute(sql_query, blob_hash, size, thumbnail_hash, media_type, blob_hash)
+                sql_query = f"DELETE FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ? AND refCount <= 0"
+                self._execute(sql_query, thumbnail_hash)  # not referenced if ignored
+                self._execute("COMMIT", fetch=None)
+            except Exception as e:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                raise e
+
+    def get_thumbnail(self, blob_hash: str, size: int):
+        """find thumbnail of blob
+
+        Returns:
+            tuple: (hash of thumbnail, media type), None if there is no such thumbnail. media type is None if thumbnail is the original blob
+        """
+        if not self.table_exist(THUMBNAIL_TABLE_NAME):
+            return None
+        sql_query = f"SELECT thumbnailHash, mediaType FROM {THUMBNAIL_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ? AND size = ?"
+        result, _ = self._query(sql_query, blob_hash, size, fetch=FetchType.ONE)
+        return tuple(result) if result else None
+
+    def get_blob_size(self, blob_hash: str):
+        """size of a blob in blob store in bytes, None if not found"""
+        if not self.table_exist(BLOB_STORE_TABLE_NAME):
+            return None
+        sql_query = f"SELECT size FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ?"
+        result, _ = self._query(sql_query, blob_hash, fetch=FetchType.ONE)
+        return result[0] if result else None
+
+    def read_blob_range(self, blob_hash: str, offset: int, length: int):
+        """read part of a blob in blob store, so that large blobs can be served chunk by chunk
+
+        Args:
+            blob_hash (str): hash of blob
+            offset (int): where to start, in bytes
+            length (int): how many bytes to read
+
+        Returns:
+            bytes: the bytes read, None if blob not found
+        """
+        if not BLOB_INCREMENTAL_IO:  # substr loads the whole blob, callers should read it at once
+            sql_query = f"SELECT substr({BLOB_COLUMN_NAME}, ?, ?) FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ?"
+            result, _ = self._query(
+                sql_query, offset + 1, length, blob_hash, fetch=FetchType.ONE
+            )
+            return result[0] if result else None
+        with self.pool.reader() as reader:  # read only the pages of the range
+            sql_query = f"SELECT rowid FROM {BLOB_STORE_TABLE_NAME} WHERE {HASH_COLUMN_NAME} = ?"
+            result, _ = self._run_on(reader, sql_query, (blob_hash,), FetchType.ONE)
+            if not result:
+                return None
+            with reader.blobopen(
+                BLOB_STORE_TABLE_NAME, BLOB_COLUMN_NAME, result[0], readonly=True
+            ) as blob:
+                blob.seek(min(offset, len(blob)))
+                return blob.read(length)
+
     @classmethod
     def load_db_of_path(cls, path):
         if not os.path.isfile(path):
@@ -536,21 +1369,65 @@ class ProjectDB(ManageableDB):
             return None
         return conn
 
+    @classmethod
+    def get_project_ids(cls):
+        """ids of projects which have a history file in vault. no db file is opened"""
+        _CHECK_GET_PROJECT_FILE_FOLDER()
+        return cls.catalog.project_ids()
+
+    @classmethod
+    def summary_of(cls, project_id):
+        """storage, run ids and name of a project without opening its db, so that listing projects does not evict open dbs. they are read again only if the db file changed
+
+        Returns:
+            dict: {"storage": size in bytes, "runids": [...], "name": name}, None if project id has no history file
+        """
+        return cls.catalog.summary_of(project_id, cls._read_summary_of_path)
+
+    @staticmethod
+    def _read_summary_of_path(path):
+        # a short lived read-only connection, which never checkpoints or migrates
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            table_names = set(
+                name
+                for name, in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table'"
+                )
+            )
+            run_ids, name = [], None
+            if RUN_IDS_TABLE_NAME in table_names:
+                sql_query = f"SELECT {RUN_ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME}, {METADATA_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} ORDER BY {ID_COLUMN_NAME}"
+                run_ids = [
+                    {
+                        RUN_ID_KEY: run_id,
+                        TIMESTAMP_KEY: timestamp,
+                        METADATA_KEY: json.loads(metadata) if metadata else {},
+                    }
+                    for run_id, timestamp, metadata in connection.execute(sql_query)
+                ]
+            if STATUS_TABLE_NAME in table_names:  # name in config of the latest run having one
+                sql_query = f"SELECT {METADATA_COLUMN_NAME} FROM {STATUS_TABLE_NAME} WHERE {SERIES_COLUMN_NAME} = 'config' ORDER BY {RUN_ID_COLUMN_NAME} DESC"
+                for (config,) in connection.execute(sql_query):
+                    config = json.loads(config)
+                    if NAME_KEY in config:
+                        name = config[NAME_KEY]
+                        break
+        finally:
+            connection.close()
+        return {"storage": get_file_size_in_bytes(path), "runids": run_ids, NAME_KEY: name}
+
     @classmethod
     def get_db_list(cls):
-        history_file_loader = ResourceLoader(
-            folder=_CHECK_GET_PROJECT_FILE_FOLDER(),
-            file_types=[DB_PROJECT_FILE_TYPE_NAME],
-            force_rescan=True,
-        )
-        history_file_list = history_file_loader.get_file_list()
-        for path in history_file_list:
-            cls.load_db_of_path(path=path)
+        """open every history file in vault. prefer get_project_ids and of_project_id, which open db files on demand"""
+        for project_id in cls.get_project_ids():
+            if project_id not in manager.current:
+                cls.load_db_of_path(path=cls.catalog.path_of(project_id))
         return manager.current.items()
 
     @classmethod
-    def get_db_of_id(cls, project_id, rescan: bool = True):
+    def get_db_of_id(cls, project_id, rescan: bool = False):
         if rescan:
-            cls.get_db_list()  # scan for possible file changes
+            cls.catalog.refresh(force=True)
         conn = ProjectDB.of_project_id(project_id=project_id)
         return conn
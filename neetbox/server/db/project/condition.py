@@ -4,12 +4,84 @@
 # Github: github.com/visualDust
 # Date:   20240116
 
+import ast
+import functools
 import json
 from typing import Dict, Tuple, Union
 
 from neetbox._protocol import *
 
-from ..abc import SortType
+from ..abc import DownsampleType, SortType
+
+
+def _parse_literal(value):
+    """parse a condition value which may come as a json or python literal string, without eval"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value  # a plain string
+
+
+def _parse_single_or_range(raw_value, value_type, name):
+    value = _parse_literal(raw_value)
+    if type(value) is value_type:
+        return value
+    if type(raw_value) is value_type and not isinstance(value, (list, tuple)):
+        return raw_value  # e.g. a timestamp string which looks like a number
+    if (
+        isinstance(value, (list, tuple))
+        and len(value) == 2
+        and all(type(v) is value_type for v in value)
+    ):
+        return tuple(value)
+    raise ValueError(f"{name} should be a {value_type.__name__} or a range of two, got {value}")
+
+
+def _parse_order(order):
+    order = _parse_literal(order)
+    if not isinstance(order, dict):
+        raise ValueError(f"order should be a dict of column name and sort type, got {order}")
+    parsed = {}
+    for column_name, sort in order.items():
+        if not isinstance(column_name, str) or not column_name.isidentifier():
+            raise ValueError(f"invalid column name {column_name} in order")
+        parsed[column_name] = SortType(sort.upper() if isinstance(sort, str) else sort)
+    return parsed
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(shape) -> str:
+    """build condition sql of a condition shape. conditions of the same shape share the same sql text, so that sqlite can reuse prepared statements"""
+    id_kind, has_after_id, timestamp_kind, has_series, has_run_id, order, has_limit = shape
+    conds = []
+    if id_kind:
+        conds.append(
+            f"{ID_COLUMN_NAME} BETWEEN ? AND ?" if id_kind == "range" else f"{ID_COLUMN_NAME} = ?"
+        )
+    if has_after_id:
+        conds.append(f"{ID_COLUMN_NAME} > ?")
+    if timestamp_kind:
+        conds.append(
+            f"{TIMESTAMP_COLUMN_NAME} BETWEEN ? AND ?"
+            if timestamp_kind == "range"
+            else f"{TIMESTAMP_COLUMN_NAME} >= ?"
+        )
+    if has_series:
+        conds.append(f"{SERIES_COLUMN_NAME} = ?")
+    if has_run_id:
+        conds.append(f"{RUN_ID_COLUMN_NAME} = ?")
+    query_cond_str = f"WHERE {' AND '.join(conds)}" if conds else ""
+    if order:
+        query_cond_str += " ORDER BY " + ", ".join(f"{_col} {_sort}" for _col, _sort in order)
+    if has_limit:
+        query_cond_str += " LIMIT ?"
+    return query_cond_str
 
 
 class ProjectDbQueryCondition:
@@ -21,6 +93,9 @@ class ProjectDbQueryCondition:
         run_id: Union[str, int] = None,
         limit: int = None,
         order: Dict[str, SortType] = {},
+        max_points: int = None,
+        downsample: DownsampleType = DownsampleType.LTTB,
+        after_id: int = None,
     ) -> None:
         self.id_range = id if isinstance(id, tuple) else (id, None)
         self.timestamp_range = timestamp if isinstance(timestamp, tuple) else (timestamp, None)
@@ -28,6 +103,9 @@ class ProjectDbQueryCondition:
         self.run_id = run_id
         self.limit = limit
         self.order = {order[0], order[1]} if isinstance(order, tuple) else order
+        self.max_points = max_points  # downsample each series to at most max_points
+        self.downsample = DownsampleType(downsample or DownsampleType.LTTB)
+        self.after_id = after_id  # only rows with id greater than after_id, used as cursor
 
     @classmethod
     def loads(cls, json_data):
@@ -42,37 +120,21 @@ class ProjectDbQueryCondition:
             "order" : [
                 {"column name" : "ASC/DESC"},
                 ...
-            ]
+            ],
+            "maxPoints" : int, # downsample each series to at most maxPoints
+            "downsample" : "lttb/minmax"
         }
         """
         # try load id range
         id_range = None
         if ID_COLUMN_NAME in json_data:
-            id_range_str = json_data[ID_COLUMN_NAME]
-            id_range = eval(id_range_str)
-            assert (
-                isinstance(id_range, list)
-                and len(id_range) == 2
-                and type(id_range[0]) is int
-                and type(id_range[1]) is int
-                or type(id_range) is int
-            )
-            id_range = tuple(id_range)  # to tuple
+            id_range = _parse_single_or_range(json_data[ID_COLUMN_NAME], int, "id")
         # try load timestamp range
         timestamp_range = None
         if TIMESTAMP_COLUMN_NAME in json_data:
-            timestamp_range_str = json_data[TIMESTAMP_COLUMN_NAME]
-            timestamp_range = eval(timestamp_range_str)
-            assert (
-                isinstance(timestamp_range, list)
-                and len(timestamp_range) == 2
-                and type(timestamp_range[0]) is str
-                and type(timestamp_range[1]) is str
-                or type(timestamp_range) is str
+            timestamp_range = _parse_single_or_range(
+                json_data[TIMESTAMP_COLUMN_NAME], str, "timestamp"
             )
-            # datetime.strptime(timestamp_range[0], DATETIME_FORMAT) # try parse to datetime, makesure its valid
-            # datetime.strptime(timestamp_range[1], DATETIME_FORMAT)
-            timestamp_range = tuple(timestamp_range)
         # try to load series
         series = json_data[SERIES_COLUMN_NAME] if SERIES_COLUMN_NAME in json_data else None
         # run-id cond
@@ -85,8 +147,13 @@ class ProjectDbQueryCondition:
         # try load order
         order = None
         if "order" in json_data:
-            order = json_data["order"]
-            assert isinstance(order, dict)
+            order = _parse_order(json_data["order"])
+        # try load downsampling
+        max_points = None
+        if "maxPoints" in json_data:
+            max_points = json_data["maxPoints"]
+            assert type(max_points) is int and max_points > 0
+        downsample = DownsampleType(json_data.get("downsample", DownsampleType.LTTB))
         return ProjectDbQueryCondition(
             id=id_range,
             timestamp=timestamp_range,
@@ -94,66 +161,48 @@ class ProjectDbQueryCondition:
             run_id=run_id,
             limit=limit,
             order=order,
+            max_points=max_points,
+            downsample=downsample,
         )
 
     def dumpt(self):
+        """condition as sql(starting with WHERE, ORDER BY or LIMIT if any) and its vars
+
+        Returns:
+            Tuple[str, list]: sql of the condition and vars to bind
+        """
         query_cond_vars = []
-        # === id condition ===
-        _id_cond_str = ""
+        id_kind = None
         if self.id_range[0]:
             _id_0, _id_1 = self.id_range
-            if _id_1 is None:
-                _id_cond_str = f"{ID_COLUMN_NAME} = ?"
-                query_cond_vars.append(_id_0)
-            else:
-                _id_cond_str = f"{ID_COLUMN_NAME} BETWEEN ? AND ?"
-                query_cond_vars.append(_id_0)
-                query_cond_vars.append(_id_1)
-        # === timestamp condition ===
-        _timestamp_cond_str = ""
+            id_kind = "eq" if _id_1 is None else "range"
+            query_cond_vars += [_id_0] if _id_1 is None else [_id_0, _id_1]
+        if self.after_id is not None:
+            query_cond_vars.append(self.after_id)
+        timestamp_kind = None
         if self.timestamp_range[0]:
             _ts_0, _ts_1 = self.timestamp_range
-            if _ts_1 is None:
-                _timestamp_cond_str = f"{TIMESTAMP_COLUMN_NAME} >= ?"
-                query_cond_vars.append(_ts_0)
-            else:
-                _timestamp_cond_str = f"{TIMESTAMP_COLUMN_NAME} BETWEEN ? AND ?"
-                query_cond_vars.append(_ts_0)
-                query_cond_vars.append(_ts_1)
-        # === series condition ===
-        _series_cond_str = ""
+            timestamp_kind = "since" if _ts_1 is None else "range"
+            query_cond_vars += [_ts_0] if _ts_1 is None else [_ts_0, _ts_1]
         if self.series:
-            _series_cond_str = f"{SERIES_COLUMN_NAME} = ?"
             query_cond_vars.append(self.series)
-        # === run-id condition ===
-        _run_id_cond_str = ""
         if self.run_id:
-            _run_id_cond_str = f"{RUN_ID_COLUMN_NAME} = ?"
             query_cond_vars.append(self.run_id)
-        # === ORDER BY ===
-        _order_cond = f"ORDER BY " if self.order else ""
-        if self.order:
-            for _col_name, _sort in self.order.items():
-                _order_cond += (
-                    f"{_col_name} {_sort.value if isinstance(_sort,SortType) else _sort}, "
-                )
-            _order_cond = _order_cond[:-2]  # remove last ','
-        # === LIMIT ===
-        _limit_cond_str = f"LIMIT {self.limit}" if self.limit else ""
-        # === concat conditions ===
-        query_condition_strs = []
-        for cond in [_id_cond_str, _timestamp_cond_str, _series_cond_str, _run_id_cond_str]:
-            if cond:
-                query_condition_strs.append(cond)
-        query_condition_strs = " AND ".join(query_condition_strs)
-        # === concat order by and limit ===
-        order_and_limit = []
-        for cond in [_order_cond, _limit_cond_str]:
-            if cond:
-                order_and_limit.append(cond)
-        order_and_limit = " ".join(order_and_limit)
-        # result
-        if query_condition_strs:
-            query_condition_strs = f"WHERE {query_condition_strs}"
-        query_cond_str = f"{query_condition_strs} {order_and_limit}"
-        return query_cond_str, query_cond_vars
+        if self.limit:
+            query_cond_vars.append(self.limit)
+        order = tuple(
+            (_col_name, SortType(_sort).value) for _col_name, _sort in (self.order or {}).items()
+        )
+        for _col_name, _ in order:  # column names are put into sql text
+            if not _col_name.isidentifier():
+                raise ValueError(f"invalid column name {_col_name} in order")
+        shape = (
+            id_kind,
+            self.after_id is not None,
+            timestamp_kind,
+            bool(self.series),
+            bool(self.run_id),
+            order,
+            bool(self.limit),
+        )
+        return _compile(shape), query_cond_vars
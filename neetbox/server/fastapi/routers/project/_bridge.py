@@ -10,6 +10,9 @@ from neetbox._protocol import *
 from neetbox.logging import Logger
 
 from ....db.project import ProjectDB
+from ....db.project._executor import run_read, run_write
+from ._outbox import coalesce_key_of
+from ._subscriptions import subscriptions
 
 logger = Logger("Project Bridge", skip_writers_names=["ws"])
 
@@ -38,7 +41,6 @@ class Bridge:
     status: dict
     cli_ws_dict: dict  # { run_id : ws_client}
     web_ws_list: dict  # since web do not have run id, use list instead of dict
-    historyDB: ProjectDB
 
     def __new__(cls, project_id: str, **kwargs) -> None:
         """Create Bridge of project id, return the old one if already exist
@@ -54,19 +56,31 @@ class Bridge:
             new_bridge.web_ws_list: list = (
                 []
             )  # frontend ws sids. client data should be able to be shown on multiple frontend
-            flag_auto_load_db = kwargs["auto_load_db"] if "auto_load_db" in kwargs else True
-            new_bridge.historyDB = ProjectDB.get_db_of_id(project_id) if flag_auto_load_db else None
             cls._id2bridge[project_id] = new_bridge
             logger.info(f"created new Bridge for project id '{project_id}'")
         return cls._id2bridge[project_id]
 
     def __del__(self):  # on delete
         logger.info(f"bridge project id {self.project_id} handling on delete...")
-        if 0 == len(self.get_run_ids()):  # if there is no active run id
-            self.historyDB.delete()
-            del self.historyDB  # delete history db
+        if 0 == len(self.historyDB.get_run_ids()):  # if there is no active run id
+            self.historyDB.delete()  # delete history db
         logger.info(f"bridge of project id {self.project_id} deleted.")
 
+    @property
+    def historyDB(self) -> ProjectDB:
+        """history db of the project, opened on first access"""
+        return ProjectDB.of_project_id(self.project_id)
+
+    def _on_history_db(self, func, *args, **kwargs):
+        """call func with history db as first arg. the db is not evicted while func is running"""
+        with ProjectDB.lease(self.project_id) as history_db:
+            return func(history_db, *args, **kwargs)
+
+    async def _flush_pending_rows(self):
+        """write rows queued by batched writes through the writer, so that later reads see them"""
+        if ProjectDB.has_pending_rows(self.project_id):
+            await run_write(self.project_id, self._on_history_db, ProjectDB.flush)
+
     @classmethod
     def items(cls):
         return cls._id2bridge.items()
@@ -88,42 +102,52 @@ class Bridge:
 
     @classmethod
     def from_db(cls, db: ProjectDB) -> "Bridge":
-        project_id = db.fetch_db_project_id()
-        bridge = Bridge(project_id, auto_load_db=False)
-        if bridge.historyDB is not None:
-            logger.warn(f"overwriting db of '{project_id}'")
-        bridge.historyDB = db
-        return bridge
+        return Bridge(db.project_id)
 
     @classmethod
     def load_histories(cls):
-        db_list = ProjectDB.get_db_list()
-        logger.log(f"found {len(db_list)} history db.")
-        for _, history_db in db_list:
-            cls.from_db(history_db)
+        """create bridges for projects found in vault. history files are opened lazily when accessed"""
+        new_project_ids = [_id for _id in ProjectDB.get_project_ids() if not cls.has(_id)]
+        if new_project_ids:
+            logger.log(f"found {len(new_project_ids)} history db.")
+        for project_id in new_project_ids:
+            Bridge(project_id)
 
     async def ws_send_to_frontends(self, message: EventMsg):
-        for ws_client in self.web_ws_list:
-            try:
-                await ws_client.ws.send_json(data=message.json)
-            except Exception as e:
-                logger.err(e)
+        # serialize once per codec, then queue into outbox of each frontend without waiting for any
+        # of them. payload received in a binary frame is forwarded in binary frames as it is
+        frames, key = {}, coalesce_key_of(message)
+        for ws_client in subscriptions.route(message, self.web_ws_list):
+            if ws_client.codec not in frames:
+                frames[ws_client.codec] = message.encode(ws_client.codec)
+            ws_client.outbox.put(frames[ws_client.codec], key=key)
         return
 
     async def ws_send_to_client(self, message: EventMsg, run_id: str = None):
         run_id = run_id or message.run_id
-        ws_client = self.cli_ws_dict[run_id]
-        try:
-            await ws_client.ws.send_json(message.json)
-        except Exception as e:
-            logger.err(e)
+        ws_client = self.cli_ws_dict.get(run_id)
+        if ws_client is None:
+            logger.warn(
+                f"client of run id {run_id} is not connected, dropping {message.event_type}"
+            )
+            return
+        ws_client.outbox.put(message.encode(ws_client.codec), key=coalesce_key_of(message))
         return
 
-    def set_status(self, run_id: str, series: str, value: dict):
-        self.historyDB.set_status(run_id=run_id, series=series, json_data=value)
+    async def set_status(self, run_id: str, series: str, value: dict):
+        await run_write(
+            self.project_id,
+            self._on_history_db,
+            ProjectDB.set_status,
+            run_id=run_id,
+            series=series,
+            json_data=value,
+        )
 
-    def get_status(self, run_id: str = None, series: str = None):
-        status = self.historyDB.get_status(run_id=run_id, series=series)
+    async def get_status(self, run_id: str = None, series: str = None):
+        status = await run_read(
+            self._on_history_db, ProjectDB.get_status, run_id=run_id, series=series
+        )
         if run_id:
             status = status.get(run_id, {})
         if series:
@@ -135,32 +159,85 @@ class Bridge:
             return run_id in self.cli_ws_dict
         return len(self.cli_ws_dict.keys()) != 0
 
-    def get_series_of(self, table_name, run_id=None):
-        return self.historyDB.get_series_of_table(table_name=table_name, run_id=run_id)
+    async def get_series_of(self, table_name, run_id=None):
+        await self._flush_pending_rows()
+        return await run_read(
+            self._on_history_db, ProjectDB.get_series_of_table, table_name=table_name, run_id=run_id
+        )
 
-    def get_run_ids(self):
-        info_run_ids = self.historyDB.get_run_ids()
+    async def get_summary(self):
+        """storage, run ids and name of project, read without opening history db"""
+        summary = await run_read(ProjectDB.summary_of, self.project_id)
+        return summary or {"storage": 0, "runids": [], NAME_KEY: None}
+
+    async def get_storage_size(self):
+        """size of history db file in bytes, read off the event loop since the db may be opened"""
+        return await run_read(self._on_history_db, ProjectDB.size.fget)
+
+    async def get_run_ids(self):
+        info_run_ids = await run_read(self._on_history_db, ProjectDB.get_run_ids)
         for info_run_id in info_run_ids:
             info_run_id["online"] = info_run_id[RUN_ID_KEY] in self.cli_ws_dict
         return info_run_ids
 
-    def save_json_to_history(
-        self, table_name, json_data, series=None, run_id=None, timestamp=None, num_row_limit=-1
+    async def fetch_metadata_of_run_id(self, run_id: str, metadata: dict = None):
+        if metadata:  # update
+            return await run_write(
+                self.project_id,
+                self._on_history_db,
+                ProjectDB.fetch_metadata_of_run_id,
+                run_id=run_id,
+                metadata=metadata,
+            )
+        return await run_read(
+            self._on_history_db, ProjectDB.fetch_metadata_of_run_id, run_id=run_id
+        )
+
+    async def delete_run_id(self, run_id: str):
+        await run_write(self.project_id, self._on_history_db, ProjectDB.delete_run_id, run_id)
+
+    async def save_json_to_history(
+        self,
+        table_name,
+        json_data,
+        series=None,
+        run_id=None,
+        timestamp=None,
+        num_row_limit=-1,
+        batched=False,
     ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_json(
+        lastrowid = await run_write(
+            self.project_id,
+            self._on_history_db,
+            ProjectDB.write_json,
             table_name=table_name,
             json_data=json_data,
             series=series,
             run_id=run_id,
             timestamp=timestamp,
             num_row_limit=num_row_limit,
+            batched=batched,
         )
         return lastrowid
 
-    def read_json_from_history(self, table_name, condition):
-        return self.historyDB.read_json(table_name=table_name, condition=condition)
+    async def read_json_from_history(self, table_name, condition):
+        await self._flush_pending_rows()
+        return await run_read(
+            self._on_history_db, ProjectDB.read_json, table_name=table_name, condition=condition
+        )
+
+    async def read_json_since_from_history(self, table_name, cursor=0, condition=None, limit=1000):
+        await self._flush_pending_rows()
+        return await run_read(
+            self._on_history_db,
+            ProjectDB.read_json_since,
+            table_name=table_name,
+            cursor=cursor,
+            condition=condition,
+            limit=limit,
+        )
 
-    def save_blob_to_history(
+    async def save_blob_to_history(
         self,
         table_name,
         meta_data,
@@ -170,7 +247,10 @@ class Bridge:
         timestamp=None,
         num_row_limit=-1,
     ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_blob(
+        lastrowid = await run_write(
+            self.project_id,
+            self._on_history_db,
+            ProjectDB.write_blob,
             table_name=table_name,
             meta_data=meta_data,
             blob_data=blob_data,
@@ -181,5 +261,38 @@ class Bridge:
         )
         return lastrowid
 
-    def read_blob_from_history(self, table_name, condition, meta_only: bool):
-        return self.historyDB.read_blob(table_name, condition=condition, meta_only=meta_only)
+    async def read_blob_from_history(self, table_name, condition, meta_only: bool):
+        return await run_read(
+            self._on_history_db,
+            ProjectDB.read_blob,
+            table_name,
+            condition=condition,
+            meta_only=meta_only,
+        )
+
+    async def read_blob_of_hash_from_history(self, blob_hash: str):
+        return await run_read(self._on_history_db, ProjectDB.read_blob_of_hash, blob_hash)
+
+    async def save_thumbnail_to_history(
+        self, blob_hash: str, size: int, data: bytes, media_type: str
+    ):
+        return await run_write(
+            self.project_id,
+            self._on_history_db,
+            ProjectDB.write_thumbnail,
+            blob_hash,
+            size=size,
+            data=data,
+            media_type=media_type,
+        )
+
+    async def get_thumbnail_from_history(self, blob_hash: str, size: int):
+        return await run_read(self._on_history_db, ProjectDB.get_thumbnail, blob_hash, size=size)
+
+    async def get_blob_size_from_history(self, blob_hash: str):
+        return await run_read(self._on_history_db, ProjectDB.get_blob_size, blob_hash)
+
+    async def read_blob_range_from_history(self, blob_hash: str, offset: int, length: int):
+        return await run_read(
+            self._on_history_db, ProjectDB.read_blob_range, blob_hash, offset=offset, length=length
+        )
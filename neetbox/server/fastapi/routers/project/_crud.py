@@ -4,15 +4,30 @@
 # Github: github.com/visualDust
 # Date:   20240109
 
-from typing import Optional, Union
-
-from fastapi import APIRouter, Body, File, Form, HTTPException, Response, UploadFile
+import hashlib
+from typing import List, Optional, Union
+
+from fastapi import (
+    APIRouter,
+    Body,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 
 from neetbox._protocol import *
 from neetbox.logging import Logger, LogLevel
 
+from ....db import DownsampleType
+from ....db.project._project_db import BLOB_INCREMENTAL_IO
 from ....db.project.condition import ProjectDbQueryCondition
 from ._bridge import Bridge
+from ._thumbnail import pick_thumbnail_size, schedule_thumbnails
 
 logger = Logger("Project APIs", skip_writers_names=["ws"])
 logger.log_level = LogLevel.DEBUG
@@ -22,7 +37,8 @@ router = APIRouter()
 
 @router.get(f"/list")
 async def get_status_of_all_proejcts():
-    return [_project_status_from_bridge(bridge) for _, bridge in Bridge.items()]
+    Bridge.load_histories()  # pick up history files added since last listing
+    return [await _project_summary_from_bridge(bridge) for _, bridge in list(Bridge.items())]
 
 
 @router.get(f"/{{project_id}}")
@@ -30,27 +46,43 @@ async def get_status_of_project_id(project_id: str):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     bridge = Bridge.of_id(project_id)
-    return _project_status_from_bridge(bridge)
+    return await _project_status_from_bridge(bridge)
+
 
+async def _project_summary_from_bridge(bridge: Bridge):
+    """same shape as _project_status_from_bridge, but history db is not opened"""
+    summary = await bridge.get_summary()
+    run_id_info_list = [
+        {**run_id_info, "online": bridge.is_online(run_id_info[RUN_ID_KEY])}
+        for run_id_info in summary["runids"]
+    ]
+    return {
+        PROJECT_ID_KEY: bridge.project_id,
+        "storage": summary["storage"],
+        "online": bridge.is_online(),
+        NAME_KEY: summary[NAME_KEY],
+        "runids": run_id_info_list,
+    }
 
-def _project_status_from_bridge(bridge: Bridge):
-    run_id_info_list = bridge.get_run_ids()
+
+async def _project_status_from_bridge(bridge: Bridge):
+    run_id_info_list = await bridge.get_run_ids()
     name_of_project = None
     for run_id_info in reversed(run_id_info_list):
-        config = bridge.get_status(run_id=run_id_info[RUN_ID_KEY], series="config")
+        config = await bridge.get_status(run_id=run_id_info[RUN_ID_KEY], series="config")
         if NAME_KEY in config:
             name_of_project = config[NAME_KEY]
             break
     return {
         PROJECT_ID_KEY: bridge.project_id,
-        "storage": bridge.historyDB.size,
+        "storage": await bridge.get_storage_size(),
         "online": bridge.is_online(),
         NAME_KEY: name_of_project,
         "runids": run_id_info_list,
     }
 
 
-def get_history_json_of(project_id: str, table_name: str, condition=Union[dict, str]):
+async def get_history_json_of(project_id: str, table_name: str, condition=Union[dict, str]):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     try:
@@ -62,14 +94,14 @@ def get_history_json_of(project_id: str, table_name: str, condition=Union[dict,
         error_message = f"failed to parse condition from {type(condition)}{condition} :{e}"
         logger.debug(error_message, series="400")
         raise HTTPException(status_code=400, detail={ERROR_KEY: error_message})
-    return Bridge.of_id(project_id).read_json_from_history(
+    return await Bridge.of_id(project_id).read_json_from_history(
         table_name=table_name, condition=condition
     )
 
 
 @router.get(f"/{{project_id}}/log")
 async def get_history_log_of(project_id: str, condition: str):
-    return get_history_json_of(
+    return await get_history_json_of(
         project_id=project_id,
         table_name=LOG_TABLE_NAME,
         condition=condition,
@@ -78,7 +110,7 @@ async def get_history_log_of(project_id: str, condition: str):
 
 @router.get(f"/{{project_id}}/hardware")
 async def get_history_hardware_info_of(project_id: str, condition: str):
-    return get_history_json_of(
+    return await get_history_json_of(
         project_id=project_id,
         table_name=EVENT_TYPE_NAME_HARDWARE,
         condition=condition,
@@ -91,7 +123,7 @@ async def get_series_list_of(
 ):  # client side function
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
-    result = Bridge.of_id(project_id).get_series_of(table_name, run_id=run_id)
+    result = await Bridge.of_id(project_id).get_series_of(table_name, run_id=run_id)
     return result
 
 
@@ -100,8 +132,8 @@ async def get_status_of(project_id, run_id):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
     bridge = Bridge.of_id(project_id)
-    result = Bridge.of_id(project_id).get_status(run_id=run_id)
-    result[METADATA_KEY] = bridge.historyDB.fetch_metadata_of_run_id(run_id=run_id)
+    result = await bridge.get_status(run_id=run_id)
+    result[METADATA_KEY] = await bridge.fetch_metadata_of_run_id(run_id=run_id)
     return result
 
 
@@ -109,13 +141,9 @@ async def get_status_of(project_id, run_id):
 async def set_get_metadata_of_run_id(project_id: str, run_id: str, metadata: dict = Body(...)):
     bridge = Bridge.of_id(project_id)
     try:
-        metadata_in_db = bridge.historyDB.fetch_metadata_of_run_id(
-            run_id=run_id
-        )  # get old metadata
+        metadata_in_db = await bridge.fetch_metadata_of_run_id(run_id=run_id)  # get old metadata
         metadata_in_db.update(metadata)
-        # Assuming the method to update metadata in your database might look like this
-        # bridge.historyDB.update_metadata_of_run_id(run_id=run_id, metadata=old_metadata)
-        return bridge.historyDB.fetch_metadata_of_run_id(run_id=run_id, metadata=metadata_in_db)
+        return await bridge.fetch_metadata_of_run_id(run_id=run_id, metadata=metadata_in_db)
     except Exception as e:  # Replace with your specific database exception
         logger.debug(f"failed to update metadata of run_id {run_id}: {e}")
         raise HTTPException(status_code=404, detail={ERROR_KEY: str(e)})
@@ -129,19 +157,16 @@ async def delete_run_id(project_id: str, run_id: str):
             status_code=400,
             detail={ERROR_KEY: "can only delete history run id."},
         )
-    bridge.historyDB.delete_run_id(run_id)
-    if 0 == len(bridge.get_run_ids()):  # check if all the run ids are deleted
+    await bridge.delete_run_id(run_id)
+    if 0 == len(await bridge.get_run_ids()):  # check if all the run ids are deleted
         del Bridge._id2bridge[project_id]  # delete the empty bridge
     return {RESULT_KEY: "success"}
 
 
-@router.post(f"/{{project_id}}/image")
-async def upload_image(project_id: str, image: UploadFile = File(...), metadata: str = Form(...)):
-    if not Bridge.has(project_id):
-        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+async def _save_image(bridge: Bridge, image: UploadFile, metadata: str):
     message = EventMsg.loads(metadata)
     image_bytes = await image.read()
-    message.id = Bridge.of_id(project_id).save_blob_to_history(
+    message.id = await bridge.save_blob_to_history(
         table_name="image",
         run_id=message.run_id,
         series=message.series,
@@ -151,24 +176,133 @@ async def upload_image(project_id: str, image: UploadFile = File(...), metadata:
         num_row_limit=message.history_len,
     )
     message.payload = message.payload or {}
-    await Bridge.of_id(project_id).ws_send_to_frontends(message)
-    return {RESULT_KEY: "ok", ID_KEY: message.id}
+    await bridge.ws_send_to_frontends(message)
+    schedule_thumbnails(bridge, hashlib.sha256(image_bytes).hexdigest(), image_bytes)
+    return message.id
+
+
+@router.post(f"/{{project_id}}/image")
+async def upload_image(project_id: str, image: UploadFile = File(...), metadata: str = Form(...)):
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+    image_id = await _save_image(Bridge.of_id(project_id), image, metadata)
+    return {RESULT_KEY: "ok", ID_KEY: image_id}
+
+
+@router.post(f"/{{project_id}}/images")
+async def upload_images(
+    project_id: str, images: List[UploadFile] = File(...), metadata: List[str] = Form(...)
+):
+    """upload multiple images in one request, metadata[i] is the metadata of images[i]"""
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+    if len(images) != len(metadata):
+        raise HTTPException(
+            status_code=400, detail={ERROR_KEY: "number of images and metadata does not match"}
+        )
+    bridge = Bridge.of_id(project_id)
+    image_ids = [await _save_image(bridge, image, meta) for image, meta in zip(images, metadata)]
+    return {RESULT_KEY: "ok", ID_KEY: image_ids}
+
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"  # stored images never change
+IMAGE_FALLBACK_CACHE_CONTROL = "no-cache"  # original served for a thumbnail being generated
+IMAGE_STREAM_CHUNK_SIZE = 64 * 1024
+IMAGE_STREAM_READ_SIZE = 1024 * 1024  # bytes read from db at once, sent in chunks
+
+
+def _parse_byte_range(range_header: str, size: int):
+    """parse a single 'bytes=start-end' range
+
+    Returns:
+        tuple: (start, end) with end inclusive, None if the header is not a single byte range
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None  # ignore multipart ranges, serve the whole content instead
+    start, _, end = ranges.strip().partition("-")
+    if not start:  # suffix range, the last N bytes
+        if not end.isdigit():
+            return None
+        return max(size - int(end), 0), size - 1
+    if not start.isdigit() or (end and not end.isdigit()):
+        return None
+    return int(start), min(int(end), size - 1) if end else size - 1
 
 
 @router.get(f"/{{project_id}}/image/{{image_id}}")
-async def get_image_of(project_id: str, image_id: int, meta: Optional[bool] = None):
+async def get_image_of(
+    project_id: str,
+    image_id: int,
+    meta: Optional[bool] = None,
+    size: Optional[int] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    range: Optional[str] = Header(default=None),
+):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
-    # Database logic here
-    [(_, _, meta_data, image)] = Bridge.of_id(project_id).read_blob_from_history(
+    bridge = Bridge.of_id(project_id)
+    rows = await bridge.read_blob_from_history(
         table_name="image",
         condition=ProjectDbQueryCondition(id=image_id),
-        meta_only=meta,
+        meta_only=True,
     )
+    if not rows:
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "image not found"})
+    [(_, _, meta_data, image_hash)] = rows
     if meta:
         return Response(meta_data, media_type="application/json")
-    else:
-        return Response(image, media_type="image/png")
+    media_type = "image/png"
+    cache_control = IMAGE_CACHE_CONTROL
+    thumbnail_size = pick_thumbnail_size(size) if size else None
+    if thumbnail_size:  # serve thumbnail if there is one
+        thumbnail = await bridge.get_thumbnail_from_history(image_hash, size=thumbnail_size)
+        if thumbnail:
+            image_hash, media_type = thumbnail[0], thumbnail[1] or media_type
+        elif schedule_thumbnails(bridge, image_hash):
+            # not generated yet, the url should not be cached as the original image
+            cache_control = IMAGE_FALLBACK_CACHE_CONTROL
+    # served from blob store
+    etag = f'"{image_hash}"'  # images are content addressed
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if if_none_match and (
+        if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    ):
+        return Response(status_code=304, headers=headers)
+    size = await bridge.get_blob_size_from_history(image_hash)
+    if size is None:
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "image not found"})
+    status_code, start, end = 200, 0, size - 1
+    byte_range = _parse_byte_range(range, size) if range else None
+    if byte_range:
+        start, end = byte_range
+        if start >= size or start > end:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    # without incremental blob i/o every read loads the whole blob, so read the range at once
+    read_size = IMAGE_STREAM_READ_SIZE if BLOB_INCREMENTAL_IO else end - start + 1
+
+    async def _iter_chunks():
+        offset = start
+        while offset <= end:
+            length = min(read_size, end - offset + 1)
+            data = await bridge.read_blob_range_from_history(
+                image_hash, offset=offset, length=length
+            )
+            if not data:  # blob removed meanwhile
+                return
+            offset += length
+            data = memoryview(data)
+            while data:
+                yield bytes(data[:IMAGE_STREAM_CHUNK_SIZE])
+                data = data[IMAGE_STREAM_CHUNK_SIZE:]
+
+    return StreamingResponse(
+        _iter_chunks(), status_code=status_code, media_type=media_type, headers=headers
+    )
 
 
 @router.get(f"/{{project_id}}/image")
@@ -180,21 +314,33 @@ async def get_history_image_metadata_of(project_id: str, condition: Optional[str
         condition = ProjectDbQueryCondition.loads(condition_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    query_results = Bridge.of_id(project_id).read_blob_from_history(
+    query_results = await Bridge.of_id(project_id).read_blob_from_history(
         table_name="image", condition=condition, meta_only=True
     )
-    result = [{"imageId": id, "metadata": meta_data} for (id, _, meta_data) in query_results]
+    result = [{"imageId": id, "metadata": meta_data} for (id, _, meta_data, _) in query_results]
     return result
 
 
 @router.get(f"/{{project_id}}/scalar")
-async def get_history_scalar_of(project_id: str, condition: str = None):
+async def get_history_scalar_of(
+    project_id: str,
+    condition: str = None,
+    max_points: Optional[int] = None,
+    downsample: Optional[DownsampleType] = None,
+):
     try:
         condition_json = json.loads(condition) if condition else "{}"
         condition = ProjectDbQueryCondition.loads(condition_json)
+        if max_points:  # query params override the condition
+            assert max_points > 0, "max_points should be positive"
+            condition.max_points = max_points
+        if downsample:
+            condition.downsample = downsample
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    return get_history_json_of(project_id=project_id, table_name="scalar", condition=condition)
+    return await get_history_json_of(
+        project_id=project_id, table_name="scalar", condition=condition
+    )
 
 
 @router.get(f"/{{project_id}}/progress")
@@ -204,4 +350,71 @@ async def get_history_progress_of(project_id: str, condition: str = None):
         condition = ProjectDbQueryCondition.loads(condition_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
-    return get_history_json_of(project_id=project_id, table_name="progress", condition=condition)
+    return await get_history_json_of(
+        project_id=project_id, table_name="progress", condition=condition
+    )
+
+
+HISTORY_READ_MAX_LIMIT = 10000  # rows read at most by one history read, or one chunk of a stream
+# history tables of json rows, other tables are not readable by history reads
+HISTORY_JSON_TABLE_NAMES = {
+    LOG_TABLE_NAME,
+    SCALAR_TABLE_NAME,
+    EVENT_TYPE_NAME_HARDWARE,
+    EVENT_TYPE_NAME_PROGRESS,
+}
+
+
+def _check_parse_history_query(project_id: str, table_name: str, condition: Optional[str]):
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+    if table_name not in HISTORY_JSON_TABLE_NAMES:  # table name goes into sql
+        raise HTTPException(
+            status_code=400, detail={ERROR_KEY: f"no json history of table '{table_name}'"}
+        )
+    try:
+        condition_json = json.loads(condition) if condition else {}
+        return ProjectDbQueryCondition.loads(condition_json)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail={ERROR_KEY: str(e)})
+
+
+@router.get(f"/{{project_id}}/history/{{table_name}}")
+async def get_history_since_of(
+    project_id: str,
+    table_name: str,
+    cursor: int = 0,
+    limit: int = Query(1000, gt=0, le=HISTORY_READ_MAX_LIMIT),
+    condition: Optional[str] = None,
+):
+    """read rows with id greater than cursor, returns the rows and the cursor for the next read"""
+    condition = _check_parse_history_query(project_id, table_name, condition)
+    rows, cursor = await Bridge.of_id(project_id).read_json_since_from_history(
+        table_name=table_name, cursor=cursor, condition=condition, limit=limit
+    )
+    return {ROWS_KEY: rows, CURSOR_KEY: cursor}
+
+
+@router.get(f"/{{project_id}}/history/{{table_name}}/stream")
+async def stream_history_since_of(
+    project_id: str,
+    table_name: str,
+    cursor: int = 0,
+    chunk_size: int = Query(1000, gt=0, le=HISTORY_READ_MAX_LIMIT),
+    condition: Optional[str] = None,
+):
+    """stream rows with id greater than cursor as newline delimited json, chunk by chunk"""
+    condition = _check_parse_history_query(project_id, table_name, condition)
+    bridge = Bridge.of_id(project_id)
+
+    async def _iter_rows(cursor):
+        while True:
+            rows, cursor = await bridge.read_json_since_from_history(
+                table_name=table_name, cursor=cursor, condition=condition, limit=chunk_size
+            )
+            if rows:
+                yield "".join(f"{json.dumps(row, default=str)}\n" for row in rows)
+            if len(rows) < chunk_size:
+                return
+
+    return StreamingResponse(_iter_rows(cursor), media_type="application/x-ndjson")
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260203
+
+import asyncio
+import collections
+from typing import Hashable, Union
+
+from neetbox._protocol import *
+from neetbox.logging import Logger
+
+logger = Logger("Websocket Outbox", skip_writers_names=["ws"])
+
+OUTBOX_MAX_PENDING = 256  # messages a websocket may lag behind before old ones are dropped
+# only the latest message of these event types matters, pending ones are replaced by newer ones
+COALESCED_EVENT_TYPES = {EVENT_TYPE_NAME_PROGRESS, EVENT_TYPE_NAME_HARDWARE, EVENT_TYPE_NAME_STATUS}
+
+
+def coalesce_key_of(message: EventMsg) -> Hashable:
+    """key under which pending messages replace each other, None if message should never be replaced"""
+    if message.event_type in COALESCED_EVENT_TYPES:
+        return (message.event_type, message.run_id, message.series)
+    return None
+
+
+class Outbox:
+    """Outbound queue of a websocket, drained by its own sender task so that a slow receiver never
+    blocks whoever puts messages in. Messages are serialized text, so one message serialized once can
+    be put into many outboxes. A pending message is replaced in place by a newer one with the same
+    coalesce key, and once max_pending messages are waiting the oldest ones are dropped, so a slow
+    consumer lags at most max_pending messages behind. Serialized messages in bytes are sent as binary
+    frames.
+    """
+
+    def __init__(self, ws, name: str = None, max_pending: int = OUTBOX_MAX_PENDING) -> None:
+        self.ws = ws
+        self.name = name
+        self.max_pending = max_pending
+        self.num_sent = 0
+        self.num_coalesced = 0
+        self.num_dropped = 0
+        self._pending = collections.deque()  # [key, text], oldest first
+        self._pending_of_key = {}  # { coalesce key : pending entry }
+        self._has_pending = asyncio.Event()
+        self._closed = False
+        self._sender = asyncio.get_running_loop().create_task(self._send_forever())
+
+    def put(self, text: Union[str, bytes], key: Hashable = None) -> bool:
+        """queue serialized message without waiting
+
+        Args:
+            text (Union[str, bytes]): serialized message, bytes for a binary frame
+            key (Hashable, optional): coalesce key, see coalesce_key_of. Defaults to None.
+
+        Returns:
+            bool: False if outbox has been closed
+        """
+        if self._closed:
+            return False
+        if key is not None and key in self._pending_of_key:
+            self._pending_of_key[key][1] = text  # replace pending one, keeping its place
+            self.num_coalesced += 1
+            return True
+        if len(self._pending) >= self.max_pending:
+            self._drop_oldest()
+        entry = [key, text]
+        self._pending.append(entry)
+        if key is not None:
+            self._pending_of_key[key] = entry
+        self._has_pending.set()
+        return True
+
+    def _drop_oldest(self):
+        key, _ = self._pending.popleft()
+        if key is not None:
+            del self._pending_of_key[key]
+        self.num_dropped += 1
+        if self.num_dropped % self.max_pending == 1:
+            logger.warn(f"{self.name} is too slow to receive, dropped {self.num_dropped} messages")
+
+    async def _send_forever(self):
+        try:
+            while True:
+                await self._has_pending.wait()
+                while self._pending:
+                    key, text = self._pending.popleft()
+                    if key is not None:
+                        del self._pending_of_key[key]
+                    if isinstance(text, bytes):
+                        await self.ws.send_bytes(text)
+                    else:
+                        await self.ws.send_text(text)
+                    self.num_sent += 1
+                self._has_pending.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warn(f"stopped sending to {self.name} cause {e}")
+        finally:
+            self._closed = True
+
+    @property
+    def lag(self) -> int:
+        """num messages waiting to be sent"""
+        return len(self._pending)
+
+    def close(self):
+        self._closed = True
+        self._pending.clear()
+        self._pending_of_key.clear()
+        self._sender.cancel()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260205
+
+import fnmatch
+import functools
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from neetbox._protocol import *
+
+ANY_EVENT_TYPE = "*"
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_glob(pattern: str) -> re.Pattern:
+    return re.compile(fnmatch.translate(pattern))
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """what a frontend wants to receive. None matches anything, series is a glob like 'loss/*'"""
+
+    event_type: Optional[str] = None
+    run_id: Optional[str] = None
+    series: Optional[str] = None
+
+    @classmethod
+    def loads(cls, src: dict) -> "Subscription":
+        if not isinstance(src, dict):
+            raise ValueError(f"subscription should be a dict, got {src}")
+        for key in [EVENT_TYPE_KEY, RUN_ID_KEY, SERIES_KEY]:
+            if src.get(key) is not None and not isinstance(src[key], str):
+                raise ValueError(f"{key} of subscription should be a string, got {src[key]}")
+        return Subscription(
+            event_type=src.get(EVENT_TYPE_KEY),
+            run_id=src.get(RUN_ID_KEY),
+            series=src.get(SERIES_KEY),
+        )
+
+    @property
+    def json(self):
+        return {EVENT_TYPE_KEY: self.event_type, RUN_ID_KEY: self.run_id, SERIES_KEY: self.series}
+
+    def matches(self, message: EventMsg) -> bool:
+        if self.run_id is not None and self.run_id != message.run_id:
+            return False
+        if self.series is not None:
+            if message.series is None or not _compile_glob(self.series).match(message.series):
+                return False
+        return True
+
+
+class SubscriptionIndex:
+    """Subscriptions of frontends, indexed by (project id, event type), so routing a message only
+    looks at frontends subscribed to its event type. Frontends which never subscribed receive
+    everything of their project, as before subscriptions existed.
+    """
+
+    def __init__(self) -> None:
+        # { (project id, event type) : { ws client id : [subscription, ...] } }
+        self._index: Dict[Tuple[str, str], Dict[str, List[Subscription]]] = {}
+        # { ws client id : (project id, [subscription, ...]) }
+        self._subscriptions_of: Dict[str, Tuple[str, List[Subscription]]] = {}
+
+    def subscribe(self, project_id: str, client_id: str, subscription: Subscription):
+        _, subscriptions = self._subscriptions_of.setdefault(client_id, (project_id, []))
+        if subscription in subscriptions:
+            return
+        subscriptions.append(subscription)
+        key = (project_id, subscription.event_type or ANY_EVENT_TYPE)
+        self._index.setdefault(key, {}).setdefault(client_id, []).append(subscription)
+
+    def unsubscribe(self, client_id: str, subscription: Subscription = None):
+        """remove a subscription of a frontend. if subscription is None, all of them are removed and the frontend receives everything again"""
+        if client_id not in self._subscriptions_of:
+            return
+        project_id, subscriptions = self._subscriptions_of[client_id]
+        to_remove = list(subscriptions) if subscription is None else [subscription]
+        for _subscription in to_remove:
+            if _subscription not in subscriptions:
+                continue
+            subscriptions.remove(_subscription)
+            key = (project_id, _subscription.event_type or ANY_EVENT_TYPE)
+            subscriptions_of_key = self._index[key][client_id]
+            subscriptions_of_key.remove(_subscription)
+            if not subscriptions_of_key:
+                del self._index[key][client_id]
+                if not self._index[key]:
+                    del self._index[key]
+        if subscription is None:
+            del self._subscriptions_of[client_id]
+
+    def subscriptions_of(self, client_id: str) -> List[Subscription]:
+        return list(self._subscriptions_of.get(client_id, (None, []))[1])
+
+    def route(self, message: EventMsg, frontends: list) -> list:
+        """frontends among the given ones which should receive message"""
+        receivers = [c for c in frontends if c.id not in self._subscriptions_of]
+        matched = set()
+        for event_type in [message.event_type, ANY_EVENT_TYPE]:
+            for client_id, subscriptions in self._index.get(
+                (message.project_id, event_type), {}
+            ).items():
+                if client_id not in matched and any(s.matches(message) for s in subscriptions):
+                    matched.add(client_id)
+        if matched:
+            receivers += [c for c in frontends if c.id in matched]
+        return receivers
+
+
+subscriptions = SubscriptionIndex()
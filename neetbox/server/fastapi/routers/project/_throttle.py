@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260207
+
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple, Union
+
+from neetbox._protocol import *
+from neetbox.config.user import get as get_global_config
+from neetbox.server.fastapi.routers.project._outbox import COALESCED_EVENT_TYPES
+
+INGEST_LIMIT_CONFIG = get_global_config("ingest-limit")
+# events never throttled, they are rare and losing any of them breaks something
+UNTHROTTLED_EVENT_TYPES = {
+    EVENT_TYPE_NAME_HANDSHAKE,
+    EVENT_TYPE_NAME_WAVEHANDS,
+    EVENT_TYPE_NAME_ACTION,
+    EVENT_TYPE_NAME_STATUS,
+    EVENT_TYPE_NAME_HPARAMS,
+    EVENT_TYPE_NAME_SUBSCRIBE,
+    EVENT_TYPE_NAME_UNSUBSCRIBE,
+}
+
+
+class TokenBucket:
+    """allows rate events per second on average, and bursts of at most burst events"""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def give_back(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    @property
+    def is_full(self) -> bool:
+        return self.tokens >= self.burst
+
+
+class Reservoir:
+    """uniform sample of at most size items among all offered ones (algorithm R)"""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.items = []
+        self.num_seen = 0
+
+    def offer(self, item):
+        self.num_seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        i = random.randrange(self.num_seen)
+        if i < self.size:
+            self.items[i] = item
+
+
+class Latest:
+    """keeps the latest offered item only, for series of which only the latest value matters"""
+
+    def __init__(self) -> None:
+        self.items = []
+        self.num_seen = 0
+
+    def offer(self, item):
+        self.num_seen += 1
+        self.items = [item]
+
+    def discard(self):
+        """forget the kept item, a newer one has been handled"""
+        self.items = []
+
+
+class EventThrottle:
+    """Token bucket limits on events from client runs, one bucket per run and one per series of a
+    run. Events beyond the limits are not handled right away: each series keeps a uniform sample of
+    its excess events, which drain() hands back once a window, so a flooding series still shows up
+    as a thinned out stream instead of its latest or earliest events only. Series of which only the
+    latest value matters (progress, hardware) keep their latest excess event instead of a sample,
+    and drop it once a newer event is handled, so a stale one never overwrites the newest value.
+    """
+
+    def __init__(
+        self,
+        run_rate: float = INGEST_LIMIT_CONFIG["run-rate"],
+        run_burst: float = INGEST_LIMIT_CONFIG["run-burst"],
+        series_rate: float = INGEST_LIMIT_CONFIG["series-rate"],
+        series_burst: float = INGEST_LIMIT_CONFIG["series-burst"],
+        num_samples: int = INGEST_LIMIT_CONFIG["samples"],
+        window: float = INGEST_LIMIT_CONFIG["window"],
+    ) -> None:
+        self.run_rate, self.run_burst = run_rate, run_burst
+        self.series_rate, self.series_burst = series_rate, series_burst
+        self.num_samples = num_samples
+        self.window = window
+        # { (project id, run id) : bucket }
+        self._run_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        # { (project id, run id, event type, series) : bucket }
+        self._series_buckets: Dict[Tuple[str, str, str, str], TokenBucket] = {}
+        # { (project id, run id, event type, series) : sample of (order of arrival, excess event) }
+        self._reservoirs: Dict[Tuple[str, str, str, str], Union[Reservoir, Latest]] = {}
+        self._num_offered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.run_rate > 0 or self.series_rate > 0
+
+    def admit(self, message: EventMsg, now: float = None) -> bool:
+        """whether message should be handled now. if not, it may come back later from drain()"""
+        if (
+            message.identity_type != IdentityType.CLI
+            or message.event_type in UNTHROTTLED_EVENT_TYPES
+        ):
+            return True
+        now = time.monotonic() if now is None else now
+        run_key = (message.project_id, message.run_id)
+        series_key = (*run_key, message.event_type, message.series)
+        run_bucket = series_bucket = None
+        if self.run_rate > 0:
+            run_bucket = self._run_buckets.get(run_key)
+            if run_bucket is None:
+                run_bucket = self._run_buckets[run_key] = TokenBucket(
+                    self.run_rate, self.run_burst, now
+                )
+        if self.series_rate > 0:
+            series_bucket = self._series_buckets.get(series_key)
+            if series_bucket is None:
+                series_bucket = self._series_buckets[series_key] = TokenBucket(
+                    self.series_rate, self.series_burst, now
+                )
+        if series_bucket is None or series_bucket.take(now):
+            if run_bucket is None or run_bucket.take(now):
+                reservoir = self._reservoirs.get(series_key)
+                if isinstance(reservoir, Latest):
+                    reservoir.discard()  # older than the one handled now
+                return True
+            if series_bucket is not None:
+                series_bucket.give_back()  # not handled, should not count against series
+        reservoir = self._reservoirs.get(series_key)
+        if reservoir is None:
+            reservoir = self._reservoirs[series_key] = (
+                Latest()
+                if message.event_type in COALESCED_EVENT_TYPES
+                else Reservoir(self.num_samples)
+            )
+        self._num_offered += 1
+        reservoir.offer((self._num_offered, message))
+        return False
+
+    def drain(self, now: float = None) -> Tuple[List[EventMsg], Dict[Tuple[str, str], dict]]:
+        """take sampled excess events, and forget buckets which have been idle long enough to be full
+
+        Returns:
+            Tuple[List[EventMsg], Dict[Tuple[str, str], dict]]: sampled events in order of arrival,
+            and { (project id, run id) : {"throttled": n, "sampled": n, "dropped": n, "series": [...]} }
+            of runs throttled since last drain
+        """
+        now = time.monotonic() if now is None else now
+        samples = []
+        reports = defaultdict(lambda: {"throttled": 0, "sampled": 0, "dropped": 0, SERIES_KEY: []})
+        for series_key, reservoir in self._reservoirs.items():
+            samples += reservoir.items
+            report = reports[series_key[:2]]
+            report["throttled"] += reservoir.num_seen
+            report["sampled"] += len(reservoir.items)
+            report["dropped"] += reservoir.num_seen - len(reservoir.items)
+            _, _, event_type, series = series_key
+            report[SERIES_KEY].append(f"{event_type}:{series}" if series else event_type)
+        self._reservoirs = {}
+        for buckets in [self._run_buckets, self._series_buckets]:
+            for key, bucket in list(buckets.items()):
+                bucket.refill(now)
+                if bucket.is_full:  # a new bucket would be the same
+                    del buckets[key]
+        samples.sort(key=lambda sample: sample[0])
+        return [message for _, message in samples], dict(reports)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20260120
+
+import asyncio
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from neetbox.logging import Logger
+from neetbox.server._thumbnail_worker import THUMBNAIL_MEDIA_TYPE, Image, make_thumbnails
+
+from ._bridge import Bridge
+
+logger = Logger("Thumbnails", skip_writers_names=["ws"])
+
+THUMBNAIL_SIZES = (128, 512)  # longest edge of thumbnails, in pixels
+THUMBNAIL_WORKERS = 2
+
+_process_pool: ProcessPoolExecutor = None
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # spawn instead of fork, forked workers would inherit(and keep) the listening socket of server
+        _process_pool = ProcessPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+    return _process_pool
+
+
+async def generate_thumbnails(bridge: Bridge, image_hash: str, image_bytes: bytes = None):
+    """generate thumbnails of an image in process pool and save them into history"""
+    if Image is None:
+        return
+    try:
+        if image_bytes is None:
+            image_bytes = await bridge.read_blob_of_hash_from_history(image_hash)
+        thumbnails = await asyncio.get_running_loop().run_in_executor(
+            _get_process_pool(), make_thumbnails, image_bytes, THUMBNAIL_SIZES
+        )
+        for size, thumbnail in thumbnails.items():
+            await bridge.save_thumbnail_to_history(
+                image_hash,
+                size=size,
+                data=thumbnail,
+                media_type=THUMBNAIL_MEDIA_TYPE if thumbnail is not None else None,
+            )
+    except Exception as e:
+        logger.warn(f"failed to generate thumbnails of image {image_hash} cause {e}")
+    finally:
+        _scheduled_hashes.discard(image_hash)
+
+
+_running_tasks = set()  # keep references of background tasks
+_scheduled_hashes = set()  # do not generate thumbnails of the same image twice at the same time
+
+
+def schedule_thumbnails(bridge: Bridge, image_hash: str, image_bytes: bytes = None) -> bool:
+    """generate thumbnails in background without blocking the event loop
+
+    Returns:
+        bool: whether thumbnails are being generated, False if pillow is not installed
+    """
+    if Image is None:
+        return False
+    if image_hash in _scheduled_hashes:
+        return True
+    _scheduled_hashes.add(image_hash)
+    task = asyncio.get_running_loop().create_task(
+        generate_thumbnails(bridge, image_hash, image_bytes)
+    )
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return True
+
+
+def pick_thumbnail_size(size: int):
+    """smallest thumbnail size not smaller than the requested size, None if the original image should be used"""
+    for thumbnail_size in THUMBNAIL_SIZES:
+        if thumbnail_size >= size:
+            return thumbnail_size
+    return None
@@ -29,13 +29,14 @@ async def on_event_type_default_json(
 ):
     bridge = Bridge.of_id(message.project_id)
     if save_history:
-        message.id = bridge.save_json_to_history(
+        message.id = await bridge.save_json_to_history(
             table_name=message.event_type,
             json_data=message.payload,
             series=message.series,
             run_id=message.run_id,
             timestamp=message.timestamp,
             num_row_limit=message.history_len,
+            batched=True,  # rows are flushed by the ingest queue of history db
         )
     if forward_to:
         if forward_to == IdentityType.SELF:
@@ -55,13 +56,13 @@ async def on_event_type_default_json(
 @on_event(EVENT_TYPE_NAME_STATUS)
 async def on_event_type_status(message: EventMsg):
     bridge = Bridge.of_id(message.project_id)
-    bridge.set_status(run_id=message.run_id, series=message.series, value=message.payload)
+    await bridge.set_status(run_id=message.run_id, series=message.series, value=message.payload)
 
 
 @on_event(EVENT_TYPE_NAME_HPARAMS)
 async def on_event_type_hyperparams(message: EventMsg):
     bridge = Bridge.of_id(message.project_id)
-    current_hyperparams = bridge.get_status(
+    current_hyperparams = await bridge.get_status(
         run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS
     )  # get hyper params from status
     if message.series:  # if series of hyperparams specified
@@ -69,7 +70,7 @@ async def on_event_type_hyperparams(message: EventMsg):
     else:
         for k, v in message.payload.items():
             current_hyperparams[k] = v
-    bridge.set_status(
+    await bridge.set_status(
         run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS, value=current_hyperparams
     )
 
@@ -4,6 +4,7 @@
 # Github: github.com/visualDust
 # Date:   20240110
 
+import asyncio
 from typing import Dict
 from uuid import uuid4
 
@@ -16,6 +17,9 @@ from vdtoys.mvc import Singleton
 from neetbox._protocol import *
 from neetbox.logging import Logger
 from neetbox.server.fastapi.routers.project._bridge import Bridge
+from neetbox.server.fastapi.routers.project._outbox import Outbox
+from neetbox.server.fastapi.routers.project._subscriptions import Subscription, subscriptions
+from neetbox.server.fastapi.routers.project._throttle import EventThrottle
 
 console = Console()
 logger = Logger("Websocket.Project", skip_writers_names=["ws"])
@@ -28,6 +32,8 @@ class WSClient:
     project_id: str
     identity_type: IdentityType
     run_id: str = None
+    outbox: Outbox = None  # messages to this websocket are sent through outbox once joined
+    codec: str = CODEC_JSON  # codec of frames sent to this websocket, negotiated in handshake
 
 
 class WSConnectionManager(metaclass=Singleton):
@@ -44,6 +50,9 @@ class WSConnectionManager(metaclass=Singleton):
 
         self.id2client = {}
         self.ws2client = {}
+        self.subscriptions = subscriptions  # what each frontend wants to receive
+        self.throttle = EventThrottle()  # limits on events from clients
+        self._throttle_drainer = None  # task handling sampled excess events
         self.event_handlers = EVENT_TYPE_HANDLERS
         self.default_json_handler = on_event_type_default_json
         logger.info(f"loaded event handlers: {list(EVENT_TYPE_HANDLERS.keys())}")
@@ -70,6 +79,10 @@ class WSConnectionManager(metaclass=Singleton):
         ws_client = WSClient(
             id=id, ws=websocket, project_id=message.project_id, identity_type=message.identity_type
         )
+        offered_codecs = (
+            message.payload.get(CODECS_KEY) if isinstance(message.payload, dict) else None
+        )
+        codec = negotiate_codec(offered_codecs)
         if message.identity_type == IdentityType.WEB:
             if not Bridge.has(message.project_id):  # there is no such bridge
                 merge_msg = {
@@ -79,11 +92,12 @@ class WSConnectionManager(metaclass=Singleton):
 
             else:  # new connection from frontend
                 bridge = Bridge.of_id(message.project_id)
+                ws_client.outbox = Outbox(websocket, name=f"frontend(ws client id {id})")
                 bridge.web_ws_list.append(ws_client)
                 self.id2client[id] = ws_client
                 self.ws2client[websocket] = ws_client
                 merge_msg = {
-                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success"},
+                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success", CODEC_KEY: codec},
                     IDENTITY_TYPE_KEY: IdentityType.SERVER,
                 }
         elif message.identity_type == IdentityType.CLI:
@@ -92,11 +106,12 @@ class WSConnectionManager(metaclass=Singleton):
             run_id = message.run_id
             ws_client.run_id = run_id
             if run_id not in bridge.cli_ws_dict:
+                ws_client.outbox = Outbox(websocket, name=f"client(run id {run_id})")
                 bridge.cli_ws_dict[run_id] = ws_client  # assign cli to bridge
                 self.id2client[id] = ws_client
                 self.ws2client[websocket] = ws_client
                 merge_msg = {
-                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success"},
+                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success", CODEC_KEY: codec},
                     IDENTITY_TYPE_KEY: IdentityType.SERVER,
                 }  # handshake 200
             else:  # run id already exist
@@ -111,7 +126,14 @@ class WSConnectionManager(metaclass=Singleton):
             logger.warn(f"unknown type({message.identity_type}) of websocket trying to handshake")
             return  # unknown connection type, dropping...
 
-        await websocket.send_json(data=EventMsg.merge(message, merge_msg).json)
+        reply = EventMsg.merge(message, merge_msg)
+        if (
+            ws_client.outbox
+        ):  # joined, reply through outbox so that it goes before anything forwarded
+            ws_client.outbox.put(reply.dumps())  # always json, the other side learns codec from it
+            ws_client.codec = codec
+        else:
+            await websocket.send_json(data=reply.json)
         logger.ok(f"wsclient(id={id}) handshake succeed.")
         table = Table(title="Connected Websockets", box=box.MINIMAL_DOUBLE_HEAD, show_lines=True)
         table.add_column(PROJECT_ID_KEY, justify="center", style="magenta", no_wrap=True)
@@ -130,6 +152,8 @@ class WSConnectionManager(metaclass=Singleton):
         if websocket not in self.ws2client:
             return  # ignore if not handshaked
         ws_client = self.ws2client[websocket]
+        ws_client.outbox.close()
+        self.subscriptions.unsubscribe(ws_client.id)
         id = ws_client.id
         project_id = ws_client.project_id
         identity_type = ws_client.identity_type
@@ -152,6 +176,17 @@ class WSConnectionManager(metaclass=Singleton):
 
     async def handle_event_msg(self, websocket: WebSocket, message: EventMsg):
         ws_client = self.ws2client[websocket]
+        if message.event_type == EVENT_TYPE_NAME_BATCH:  # unpack batched events
+            for _message in message.payload or []:
+                try:
+                    _message = EventMsg.loads(_message)
+                except Exception as e:
+                    logger.err(
+                        f"Illegal message format in batch from client {ws_client.id}: {_message}, failed to parse cause {e}, dropping..."
+                    )
+                    continue
+                await self.handle_event_msg(websocket, _message)
+            return
         if not message.identity_type:
             message.identity_type = ws_client.identity_type
         if message.identity_type != ws_client.identity_type:
@@ -160,6 +195,18 @@ class WSConnectionManager(metaclass=Singleton):
             )
             return  # security check, identityType should match identityType
 
+        if message.event_type in [EVENT_TYPE_NAME_SUBSCRIBE, EVENT_TYPE_NAME_UNSUBSCRIBE]:
+            return self.handle_subscription(ws_client, message)
+        if self.throttle.enabled:
+            if self._throttle_drainer is None:
+                self._throttle_drainer = asyncio.get_running_loop().create_task(
+                    self._drain_throttled_forever()
+                )
+            if not self.throttle.admit(message):
+                return  # too frequent, may be handled later as a sample
+        await self.dispatch_event_msg(message)
+
+    async def dispatch_event_msg(self, message: EventMsg):
         # handle regular event types
         if message.event_type in self.event_handlers:
             for handler in self.event_handlers[message.event_type]:
@@ -171,5 +218,57 @@ class WSConnectionManager(metaclass=Singleton):
                 save_history=True,
             )
 
+    async def _drain_throttled_forever(self):
+        """handle sampled excess events, and tell throttled clients about it, once a window"""
+        while True:
+            await asyncio.sleep(self.throttle.window)
+            samples, reports = self.throttle.drain()
+            for message in samples:
+                try:
+                    await self.dispatch_event_msg(message)
+                except Exception as e:
+                    logger.err(f"failed to handle sampled {message.event_type} event: {e}")
+            for (project_id, run_id), report in reports.items():
+                logger.debug(f"throttled run {run_id} of project '{project_id}': {report}")
+                bridge = Bridge.of_id(project_id)
+                if bridge and bridge.is_online(run_id):
+                    await bridge.ws_send_to_client(
+                        EventMsg(
+                            project_id=project_id,
+                            run_id=run_id,
+                            event_type=EVENT_TYPE_NAME_THROTTLE,
+                            identity_type=IdentityType.SERVER,
+                            payload=report,
+                            timestamp=get_timestamp(),
+                        )
+                    )
+
+    def handle_subscription(self, ws_client: WSClient, message: EventMsg):
+        """(un)subscribe a frontend, and reply with its current subscriptions"""
+        if ws_client.identity_type != IdentityType.WEB:
+            logger.warn(
+                f"only frontends could subscribe, ignoring {message.event_type} from {ws_client.id}"
+            )
+            return
+        payload = message.payload
+        try:
+            filters = payload if isinstance(payload, list) else [payload] if payload else []
+            filters = [Subscription.loads(_filter) for _filter in filters]
+        except Exception as e:
+            reply = {PAYLOAD_KEY: {ERROR_KEY: 400, REASON_KEY: str(e)}}
+        else:
+            if message.event_type == EVENT_TYPE_NAME_SUBSCRIBE:
+                for _filter in filters:
+                    self.subscriptions.subscribe(ws_client.project_id, ws_client.id, _filter)
+            elif filters:
+                for _filter in filters:
+                    self.subscriptions.unsubscribe(ws_client.id, _filter)
+            else:  # unsubscribe all
+                self.subscriptions.unsubscribe(ws_client.id)
+            current = [s.json for s in self.subscriptions.subscriptions_of(ws_client.id)]
+            reply = {PAYLOAD_KEY: {RESULT_KEY: 200, SUBSCRIPTIONS_KEY: current}}
+        reply[IDENTITY_TYPE_KEY] = IdentityType.SERVER
+        ws_client.outbox.put(EventMsg.merge(message, reply).encode(ws_client.codec))
+
 
 manager = WSConnectionManager()
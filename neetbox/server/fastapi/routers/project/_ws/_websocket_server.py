@@ -22,15 +22,21 @@ async def project_ws_endpoint(websocket: WebSocket):
         return
     try:
         while True:
-            message = await websocket.receive_text()
-            try:  # parse event message
-                message = EventMsg.loads(message)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:  # parse event messages, a binary frame may carry many of them
+                if frame.get("bytes") is not None:
+                    messages = EventMsg.loadb(frame["bytes"])
+                else:
+                    messages = [EventMsg.loads(frame["text"])]
             except Exception as e:
                 logger.err(
-                    f"Illegal message format from client    {ws_client.id}: {message}, failed to parse cause {e}, dropping..."
+                    f"Illegal message format from client    {ws_client.id}: {frame}, failed to parse cause {e}, dropping..."
                 )
                 continue
-            await manager.handle_event_msg(websocket, message)
+            for message in messages:
+                await manager.handle_event_msg(websocket, message)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
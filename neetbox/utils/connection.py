@@ -1,5 +1,7 @@
 import atexit
-from threading import Thread
+import os
+from collections import deque
+from threading import Lock, Thread
 
 import httpx
 import websocket
@@ -11,6 +13,8 @@ httpxClient: httpx.Client = httpx.Client(  # httpx client
     proxy=None
 )
 
+SPILL_EXIT_TIMEOUT = 5  # seconds to replay spilled messages on exit before they are dropped
+
 
 class WebsocketClient:
     instances = {}
@@ -23,7 +27,18 @@ class WebsocketClient:
         on_error,
         on_close,
         offline_message_buffer_size=0,
+        spill_path=None,
+        max_spill_bytes=64 * 1024 * 1024,
     ):
+        """websocket client which keeps messages sent while disconnected and sends them on reconnect
+
+        Args:
+            url (str): websocket server url
+            on_open, on_message, on_error, on_close (Callable): callbacks of websocket app
+            offline_message_buffer_size (int, optional): max messages kept in memory while disconnected. Defaults to 0.
+            spill_path (str, optional): messages pushed out of the memory buffer are appended to this file instead of being dropped. Defaults to None (drop them).
+            max_spill_bytes (int, optional): max size of spill file, messages are dropped once exceeded. Defaults to 64MB.
+        """
         self.wsApp = websocket.WebSocketApp(  # create websocket client
             url=url,
             on_open=on_open,
@@ -31,8 +46,23 @@ class WebsocketClient:
             on_error=on_error,
             on_close=on_close,
         )
-        self.message_query = []  # websocket message query
+        self.message_queue = deque()  # messages waiting to be sent, oldest first
         self.offline_message_buffer_size = offline_message_buffer_size
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self._spill_file = None
+        # whether there are spilled messages to replay, so that sending does not look for the file
+        self._has_spill = bool(spill_path) and (
+            os.path.exists(spill_path) or os.path.exists(self._replaying_path)
+        )
+        self._replayer: Thread = None
+        self._closed = False
+        self._send_lock = Lock()
+        self.codec = CODEC_JSON  # codec of frames sent, switched once server agrees in handshake
+        # counters of offline buffering
+        self.num_spilled = 0
+        self.num_replayed = 0
+        self.num_dropped = 0
         self.creator = get_caller_info_traceback(stack_offset=1)
         WebsocketClient.instances[self.creator.strid] = self
 
@@ -53,25 +83,158 @@ class WebsocketClient:
             else False
         )
 
+    @property
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self.message_queue),
+            "spilled": self.num_spilled,
+            "replayed": self.num_replayed,
+            "dropped": self.num_dropped,
+        }
+
     def send(self, message: EventMsg):
-        self.message_query.append(message)
-        if self.is_connected:  # if ws client exist
-            try:
-                while len(self.message_query):
-                    self.wsApp.send(self.message_query[0].dumps())
-                    self.message_query.pop(0)
-            except Exception as e:
-                pass
+        with self._send_lock:
+            if self.is_connected:  # if ws client exist
+                if self._has_spill:  # spilled messages go first, keep this one until replayed
+                    self._start_replay()
+                else:
+                    try:
+                        self._send_queued()
+                        self._send_frame(message)
+                        return
+                    except Exception as e:
+                        pass  # keep it until next time
+            self._buffer(message)
+
+    def replay_offline(self):
+        """send messages kept while disconnected in background, should be called once reconnected"""
+        with self._send_lock:
+            if self._has_spill:
+                self._start_replay()
+            elif self.message_queue:
+                try:
+                    self._send_queued()
+                except Exception as e:
+                    pass  # keep them until next time
+
+    def _send_queued(self):
+        while self.message_queue:  # older messages first
+            self._send_frame(self.message_queue[0])
+            self.message_queue.popleft()
+
+    def _send_frame(self, message: EventMsg):
+        frame = message.encode(self.codec)
+        if isinstance(frame, bytes):
+            self.wsApp.send(frame, opcode=websocket.ABNF.OPCODE_BINARY)
         else:
-            while len(self.message_query) > self.offline_message_buffer_size:
-                self.message_query.pop(0)
+            self.wsApp.send(frame)
+
+    def _buffer(self, message: EventMsg):
+        if len(self.message_queue) < self.offline_message_buffer_size:
+            self.message_queue.append(message)
+            return
+        if self.message_queue:  # buffer full, push out the oldest one
+            self.message_queue.append(message)
+            message = self.message_queue.popleft()
+        if not self._spill(message):
+            self.num_dropped += 1
+
+    def _spill(self, message: EventMsg) -> bool:
+        if not self.spill_path or self._closed:
+            return False
+        try:
+            if self._spill_file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+            if self._spill_file.tell() >= self.max_spill_bytes:
+                return False
+            self._spill_file.write(f"{message.dumps()}\n")
+            self._has_spill = True
+            self.num_spilled += 1
+            return True
+        except Exception as e:
+            return False
+
+    @property
+    def _replaying_path(self) -> str:
+        return f"{self.spill_path}.replaying"
+
+    def _start_replay(self):
+        if self._replayer is None or not self._replayer.is_alive():
+            self._replayer = Thread(target=self._replay_spilled, daemon=True)
+            self._replayer.start()
+
+    def _replay_spilled(self):
+        """send spilled messages in order, without holding the send lock. messages sent meanwhile
+        wait in memory buffer or spill into a new file, which is replayed next. messages failed to
+        send are kept for next replay"""
+        while True:
+            with self._send_lock:
+                if self._closed:
+                    return
+                if self._spill_file is not None:
+                    self._spill_file.close()
+                    self._spill_file = None
+                if not os.path.exists(self._replaying_path):
+                    if not os.path.exists(self.spill_path):  # all replayed
+                        self._has_spill = False
+                        try:
+                            self._send_queued()
+                        except Exception as e:
+                            pass  # keep them until next time
+                        return
+                    os.replace(self.spill_path, self._replaying_path)
+            with open(self._replaying_path, "r", encoding="utf-8") as f:
+                lines = [line for line in f.read().splitlines() if line]
+            for i, line in enumerate(lines):
+                try:
+                    if self._closed:
+                        return
+                    self.wsApp.send(line)
+                except Exception as e:
+                    with self._send_lock:
+                        if not self._closed:
+                            with open(self._replaying_path, "w", encoding="utf-8") as f:
+                                f.writelines(f"{line}\n" for line in lines[i:])
+                    return
+                self.num_replayed += 1
+            with self._send_lock:
+                if self._closed:
+                    return
+                os.remove(self._replaying_path)
+
+    def wait_replayed(self, timeout: float = None):
+        """wait until replay of spilled messages started so far ends"""
+        replayer = self._replayer
+        if replayer is not None:
+            replayer.join(timeout=timeout)
+
+    def close(self, timeout: float = SPILL_EXIT_TIMEOUT):
+        """close websocket. spilled messages are replayed for at most timeout seconds if connected,
+        and the rest are dropped: spill file is named after the run, nothing replays it afterwards"""
+        with self._send_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            if self._has_spill and self.is_connected:
+                self._start_replay()
+        self.wait_replayed(timeout=timeout)
+        with self._send_lock:
+            self._closed = True  # stops a replay still running
+            if self._has_spill:
+                for path in [self.spill_path, self._replaying_path]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._has_spill = False
+        if self.wsApp:
+            self.wsApp.close()
 
 
 def _clean_websocket_on_exit():
     for client in WebsocketClient.instances.values():
         if hasattr(client, "wsApp") and client.wsApp:
             try:
-                client.wsApp.close()
+                client.close()
             except Exception as e:
                 pass
 
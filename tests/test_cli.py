@@ -0,0 +1,30 @@
+def _run_cli(*args):
+    from click.testing import CliRunner
+
+    from neetbox.cli.parse import main
+
+    return CliRunner().invoke(main, list(args))
+
+
+def test_neet_compact_and_analyze(tmp_path, monkeypatch):
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project._catalog import ProjectCatalog
+
+    monkeypatch.setattr(ProjectDB, "catalog", ProjectCatalog(str(tmp_path), "projectdb"))
+    db = ProjectDB(project_id="cli-db", path=str(tmp_path / "cli-db.projectdb"))
+    for i in range(2000):
+        db.write_json("log", {"message": "x" * 100}, series="info", run_id="run", batched=True)
+    db.checkpoint()
+    db.delete_run_id("run")  # leaves free pages behind
+    assert db.storage_stats()["freelist_count"] > 0
+
+    result = _run_cli("compact")  # all projects in vault
+    assert result.exit_code == 0 and "cli-db" in result.output
+    assert db.storage_stats()["freelist_count"] == 0
+    result = _run_cli("compact", "cli-db", "--full")
+    assert result.exit_code == 0 and "vacuum" in result.output
+    result = _run_cli("analyze", "cli-db")
+    assert result.exit_code == 0 and "cli-db" in result.output
+    result = _run_cli("analyze", "not-a-project")  # skipped with a warning
+    assert result.exit_code == 0 and "cli-db" not in result.output
+    db.close()
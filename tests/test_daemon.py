@@ -19,3 +19,48 @@ def test_neet_action():
     actionManager.eval_call("some_func", params={"a": "3", "b": "4"}, callback=callback_fun)
     print("you should see this line first before callback_fun print")
     time.sleep(0.2)
+
+
+def test_image_upload(monkeypatch):
+    import threading
+
+    import pytest
+
+    pytest.importorskip("PIL")
+    from PIL import Image
+
+    from neetbox._protocol import ID_KEY, METADATA_KEY, RESULT_KEY
+    from neetbox.client import add_image, flush_images
+    from neetbox.client._client import connection
+
+    class Response:
+        def __init__(self, json_data) -> None:
+            self.json_data = json_data
+
+        def json(self):
+            return self.json_data
+
+    requests, can_respond = [], threading.Event()
+
+    def post_check_online(api, data, files):
+        can_respond.wait()  # let images pile up, they are uploaded in batches
+        requests.append(files)
+        first_id = sum(len(uploaded) for uploaded in requests) - len(files)
+        assert len(data[METADATA_KEY]) == len(files)
+        return Response({RESULT_KEY: "ok", ID_KEY: list(range(first_id, first_id + len(files)))})
+
+    monkeypatch.setattr(connection, "post_check_online", post_check_online)
+    futures = [
+        add_image(name="image", image=Image.new("RGB", (8, 8), (i, 0, 0))) for i in range(10)
+    ]
+    can_respond.set()
+    flush_images()
+    assert all(future.done() for future in futures)
+    assert [future.result() for future in futures] == list(range(10))  # in order of adding
+    assert 1 < len(requests) < 10
+
+    monkeypatch.setattr(connection, "post_check_online", lambda *args, **kwargs: None)  # offline
+    future = add_image(name="image", image=Image.new("RGB", (8, 8)))
+    flush_images()
+    with pytest.raises(ConnectionError):
+        future.result()
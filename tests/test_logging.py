@@ -48,3 +48,51 @@ def test_logger_mention():
 
     print_some_str("???")
     print(print_some_str.__name__)
+
+
+def test_async_logging():
+    import threading
+
+    from neetbox.logging import Logger
+
+    logger = Logger("async", skip_writers_names=["stdout", "ws"])
+    written = []
+    logger.private_writers["capture"] = lambda log: written.append(
+        (log.message, log.caller_info.func_name, threading.current_thread().name)
+    )
+
+    def caller():
+        for i in range(100):
+            logger.info(i)
+
+    try:
+        Logger.set_async(max_pending=8)
+        caller()
+        Logger.flush()
+        assert [message for message, _, _ in written] == [f"{i} " for i in range(100)]
+        assert {(func, thread) for _, func, thread in written} == {("caller", "neetbox-log-writer")}
+        Logger.set_async(False)
+        logger.info("sync again")
+        assert written[-1] == ("sync again ", "test_async_logging", threading.current_thread().name)
+
+        # a pending log keeps only where it came from, not the frame and locals of its caller
+        import weakref
+
+        class Caller:
+            def call(self):
+                local = Caller()
+                logger.info("pending")
+                return weakref.ref(local)
+
+        release = threading.Event()
+        logger.private_writers["capture"] = lambda log: release.wait(5) and written.append(
+            (log.caller_info.class_name, log.caller_info.func_name)
+        )
+        Logger.set_async(True)
+        assert Caller().call()() is None  # collected while its log is still pending
+        release.set()
+        Logger.flush()
+        assert written[-1] == ("Caller", "call")
+    finally:
+        Logger.set_async(False)
+        del logger.private_writers["capture"]
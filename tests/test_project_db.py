@@ -0,0 +1,426 @@
+def _new_project_db(tmp_path, project_id):
+    from neetbox.server.db.project import ProjectDB
+
+    return ProjectDB(project_id=project_id, path=str(tmp_path / f"{project_id}.projectdb"))
+
+
+def test_batched_write_json(tmp_path):
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-batched-write-json")
+    ids = [
+        db.write_json(
+            "log", {"message": i}, series="info", run_id="run", timestamp=f"{i}", batched=True
+        )
+        for i in range(100)
+    ]
+    direct_id = db.write_json(
+        "log", {"message": "direct"}, series="info", run_id="run", timestamp="x"
+    )
+    assert ProjectDB.has_pending_rows("test-batched-write-json")
+    assert [row["id"] for row in db.read_json("log", ProjectDbQueryCondition())] == [direct_id]
+    db.flush()  # batched rows are visible once flushed
+    assert not ProjectDB.has_pending_rows("test-batched-write-json")
+    assert ids == list(range(ids[0], ids[0] + 100))
+    assert direct_id == ids[-1] + 1
+    rows = db.read_json("log", ProjectDbQueryCondition())
+    assert [row["id"] for row in rows] == ids + [direct_id]
+    assert rows[0]["metadata"] == {"message": 0}
+    db.close()
+
+
+def test_batched_write_json_row_limit(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-batched-write-json-row-limit")
+    for i in range(50):
+        db.write_json(
+            "progress", {"step": i}, series="p", run_id="run", num_row_limit=3, batched=True
+        )
+    db.flush()
+    rows = db.read_json("progress", ProjectDbQueryCondition())
+    assert [row["metadata"]["step"] for row in rows] == [47, 48, 49]
+    db.close()
+
+
+def test_scalar_table(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-scalar-table")
+    for i in range(10):
+        db.write_json("scalar", {"x": i, "y": i * 2}, series="loss", run_id="run", batched=True)
+    db.flush()
+    db.write_scalar(x=0, y=1, series="acc", run_id="run")
+    assert db.get_series_of_table("scalar", run_id="run") == ["loss", "acc"]
+    rows = db.read_json("scalar", ProjectDbQueryCondition(series="loss", run_id="run", limit=3))
+    assert [row["metadata"] for row in rows] == [{"x": i, "y": i * 2} for i in range(3)]
+    assert set(rows[0].keys()) == {"id", "timestamp", "series", "metadata"}
+    db.close()
+
+
+def test_scalar_downsampling(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-scalar-downsampling")
+    for i in range(1000):
+        db.write_scalar(x=i, y=(i % 100) * (-1) ** i, series="loss", run_id="run", batched=True)
+    db.flush()
+    for method in ["lttb", "minmax"]:
+        condition = ProjectDbQueryCondition.loads({"maxPoints": 100, "downsample": method})
+        rows = db.read_scalar(condition)
+        xs = [row["metadata"]["x"] for row in rows]
+        assert 0 < len(rows) <= 100
+        assert xs == sorted(xs)
+    db.close()
+
+
+def test_scalar_rollups(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-scalar-rollups")
+    for i in range(4096):
+        db.write_scalar(x=i, y=i % 32, series="loss", run_id="run", batched=True)
+    db.flush()
+    rows = db.read_scalar(ProjectDbQueryCondition(series="loss", run_id="run", max_points=100))
+    assert len(rows) == 100
+    assert rows[0]["metadata"]["count"] == 16  # read from the 16x tier
+    assert rows[0]["metadata"]["min"] == 0 and rows[0]["metadata"]["max"] == 15
+    for i in range(50):
+        db.write_scalar(x=i, y=str(i % 8), series="acc", run_id="run", batched=True)
+    db.flush()
+    rows = db.read_scalar(ProjectDbQueryCondition(run_id="run", max_points=100))
+    loss_rows = [row for row in rows if row["series"] == "loss"]
+    acc_rows = [row for row in rows if row["series"] == "acc"]
+    assert len(loss_rows) == 100 and loss_rows[0]["metadata"]["count"] == 16
+    assert len(acc_rows) == 50  # too few points for any tier, read from raw points
+    assert acc_rows[1]["metadata"] == {"x": 1, "y": 1, "min": 1, "max": 1, "last": 1, "count": 1}
+    rows = db.read_scalar(ProjectDbQueryCondition(series="acc", run_id="run", max_points=3))
+    assert len(rows) == 3 and rows[0]["metadata"]["count"] == 16  # string numbers rolled up
+    assert rows[0]["metadata"]["min"] == 0 and rows[0]["metadata"]["max"] == 7
+    db.close()
+
+
+def test_read_json_since(tmp_path):
+    db = _new_project_db(tmp_path, "test-read-json-since")
+    for i in range(25):
+        db.write_json("log", {"message": i}, series="info", run_id="run", batched=True)
+    db.flush()
+    cursor, messages = 0, []
+    while True:
+        rows, cursor = db.read_json_since("log", cursor=cursor, limit=10)
+        if not rows:
+            break
+        messages += [row["metadata"]["message"] for row in rows]
+    assert messages == list(range(25))
+    assert db.read_json_since("log", cursor=cursor) == ([], cursor)
+    db.close()
+
+
+def test_schema_cache(tmp_path):
+    db = _new_project_db(tmp_path, "test-schema-cache")
+    assert not db.table_exist("log")
+    db.write_json("log", {"message": 0}, series="info", run_id="run-a")
+    db.set_status(run_id="run-b", series="hardware", json_data={"gpu": 0})
+    assert db.table_exist("log")
+    assert db.get_run_id_of_id(db.get_id_of_run_id("run-a")) == "run-a"
+    assert db.get_status() == {"run-b": {"hardware": {"gpu": 0}}}
+    db.delete_run_id("run-b")
+    assert db.get_id_of_run_id("run-b") is None
+    db._inited_tables.clear()
+    db._load_schema()  # as if loaded from file
+    assert db.table_exist("log") and db.get_id_of_run_id("run-a") is not None
+    assert db.get_id_of_run_id("run-b") is None
+    db.close()
+
+
+def test_row_limit_of_series(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-row-limit-of-series")
+    for i in range(20):
+        db.write_json("hardware", {"step": i}, series="gpu", run_id="run", num_row_limit=5)
+        if i % 2:
+            db.write_json("hardware", {"step": i}, series="cpu", run_id="run", num_row_limit=5)
+    db.write_json("hardware", {"step": 20}, series="gpu", run_id="run")  # not limited
+    rows = db.read_json("hardware", ProjectDbQueryCondition(series="gpu"))
+    assert [row["metadata"]["step"] for row in rows] == [15, 16, 17, 18, 19, 20]
+    rows = db.read_json("hardware", ProjectDbQueryCondition(series="cpu"))
+    assert [row["metadata"]["step"] for row in rows] == [11, 13, 15, 17, 19]
+    db.write_json("hardware", {"step": 21}, series="gpu", run_id="run", num_row_limit=5)
+    rows = db.read_json("hardware", ProjectDbQueryCondition(series="gpu"))
+    assert [row["metadata"]["step"] for row in rows] == [17, 18, 19, 20, 21]
+    db.close()
+
+
+def test_blob_store(tmp_path):
+    from neetbox.server.db import FetchType
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-blob-store")
+    for i in range(6):
+        db.write_blob(
+            "image",
+            {"i": i},
+            b"same" if i % 2 else f"unique {i}".encode(),
+            series="img",
+            run_id="run",
+        )
+    (num_blobs,), _ = db._query("SELECT count(*) FROM blobStore", fetch=FetchType.ONE)
+    assert num_blobs == 4
+    rows = db.read_blob("image", ProjectDbQueryCondition(id=2))
+    assert rows[0][-1] == b"same"
+    [(_, _, _, blob_hash)] = db.read_blob("image", ProjectDbQueryCondition(id=4), meta_only=True)
+    assert db.read_blob_of_hash(blob_hash) == b"same"
+    db.write_blob("image", {}, b"same", series="img", run_id="run", num_row_limit=1)
+    (num_blobs,), _ = db._query("SELECT count(*) FROM blobStore", fetch=FetchType.ONE)
+    assert num_blobs == 1  # unreferenced blobs are removed
+    db.delete_run_id("run")
+    (num_blobs,), _ = db._query("SELECT count(*) FROM blobStore", fetch=FetchType.ONE)
+    assert num_blobs == 0
+    db.close()
+
+
+def test_blob_range(tmp_path):
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-blob-range")
+    data = bytes(range(256)) * 16
+    image_id = db.write_blob("image", {}, data, series="img", run_id="run")
+    [(_, _, _, blob_hash)] = db.read_blob(
+        "image", ProjectDbQueryCondition(id=image_id), meta_only=True
+    )
+    assert db.get_blob_size(blob_hash) == len(data)
+    assert db.read_blob_range(blob_hash, offset=100, length=50) == data[100:150]
+    assert db.get_blob_size("not a hash") is None
+    db.close()
+
+
+def test_thumbnails(tmp_path):
+    from neetbox.server.db import FetchType
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-thumbnails")
+    image_id = db.write_blob("image", {}, b"large image", series="img", run_id="run")
+    [(_, _, _, blob_hash)] = db.read_blob(
+        "image", ProjectDbQueryCondition(id=image_id), meta_only=True
+    )
+    db.write_thumbnail(blob_hash, size=128, data=b"thumbnail", media_type="image/webp")
+    db.write_thumbnail(blob_hash, size=512)  # original is small enough
+    thumbnail_hash, media_type = db.get_thumbnail(blob_hash, size=128)
+    assert db.read_blob_of_hash(thumbnail_hash) == b"thumbnail" and media_type == "image/webp"
+    assert db.get_thumbnail(blob_hash, size=512) == (blob_hash, None)
+    db.delete_run_id("run")  # thumbnails are removed with the original image
+    (num_blobs,), _ = db._query("SELECT count(*) FROM blobStore", fetch=FetchType.ONE)
+    assert num_blobs == 0 and db.get_thumbnail(blob_hash, size=128) is None
+    db.close()
+
+
+def test_read_connection_pool(tmp_path):
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    db = _new_project_db(tmp_path, "test-read-connection-pool")
+    db.write_json("log", {"message": "hello"}, series="info", run_id="run")
+    with db.pool.reader() as reader:
+        try:
+            reader.execute("DELETE FROM log")
+            assert False, "reader connection should be read only"
+        except sqlite3.OperationalError:
+            pass
+    with db._conn_lock:  # readers are not blocked by a pending write
+        db._execute("BEGIN", fetch=None)
+        db._execute("DELETE FROM log", fetch=None)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [
+                executor.submit(db.read_json, "log", ProjectDbQueryCondition()) for _ in range(16)
+            ]
+            results = [future.result(timeout=5) for future in futures]
+        db._execute("ROLLBACK", fetch=None)
+    assert all(len(rows) == 1 for rows in results)
+    assert db.pool._num_readers_opened <= db.pool.num_readers
+    db.close()
+
+    # once closed, checking out raises instead of waiting for readers forever
+    from neetbox.server.db.project._pool import ConnectionPool
+
+    pool = ConnectionPool(str(tmp_path / "pool.db"), num_readers=1)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pool.reader() as reader:
+            waiting = executor.submit(lambda: pool.reader().__enter__())
+            pool.close()
+            try:
+                waiting.result(timeout=5)
+                assert False, "checkout should fail once pool is closed"
+            except sqlite3.ProgrammingError:
+                pass
+    try:
+        reader.execute("SELECT 1")  # closed when checked in
+        assert False, "reader should be closed"
+    except sqlite3.ProgrammingError:
+        pass
+    try:
+        with pool.reader():
+            assert False, "checkout should fail once pool is closed"
+    except sqlite3.ProgrammingError:
+        pass
+
+
+def test_writer_per_db():
+    import asyncio
+    import threading
+
+    from neetbox.server.db.project import _executor
+
+    can_finish = threading.Event()
+
+    async def _test():
+        slow_write = asyncio.ensure_future(_executor.run_write("db-a", can_finish.wait, 5))
+        # writes of other dbs do not wait for it
+        assert await asyncio.wait_for(_executor.run_write("db-b", lambda: "b"), timeout=1) == "b"
+        _executor.close_writer("db-a")  # still writing, kept
+        assert "db-a" in _executor._write_executors
+        can_finish.set()
+        assert await slow_write
+        for key in ["db-a", "db-b"]:
+            _executor.close_writer(key)
+            assert key not in _executor._write_executors
+
+    asyncio.run(_test())
+
+
+def test_project_catalog(tmp_path):
+    import os
+
+    from neetbox.server.db.project._catalog import ProjectCatalog
+
+    catalog = ProjectCatalog(str(tmp_path), "projectdb")
+    assert catalog.project_ids() == []
+    (tmp_path / "a.projectdb").write_bytes(b"")
+    (tmp_path / "a.projectdb-wal").write_bytes(b"")
+    assert catalog.project_ids() == ["a"] and "a" in catalog
+    os.utime(tmp_path, ns=(0, 0))  # settle folder mtime so that the scan is trusted
+    assert catalog.refresh() and not catalog.refresh()
+    (tmp_path / "b.projectdb").write_bytes(b"")
+    assert sorted(catalog.project_ids()) == ["a", "b"]
+    assert catalog.path_of("b") == str(tmp_path / "b.projectdb")
+
+
+def test_project_summary(tmp_path):
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project._catalog import ProjectCatalog
+
+    db = _new_project_db(tmp_path, "test-project-summary")
+    db.set_status(run_id="run-a", series="config", json_data={"name": "old name"})
+    db.set_status(run_id="run-b", series="config", json_data={"name": "new name"})
+    catalog, num_loads = ProjectCatalog(str(tmp_path), "projectdb"), 0
+
+    def load(path):
+        nonlocal num_loads
+        num_loads += 1
+        return ProjectDB._read_summary_of_path(path)
+
+    summary = catalog.summary_of("test-project-summary", load)
+    assert summary["name"] == "new name" and summary["storage"] > 0
+    assert [run_id_info["runId"] for run_id_info in summary["runids"]] == ["run-a", "run-b"]
+    assert catalog.summary_of("test-project-summary", load) is summary and num_loads == 1
+    db.set_status(run_id="run-c", series="config", json_data={})  # db file changed
+    assert len(catalog.summary_of("test-project-summary", load)["runids"]) == 3 and num_loads == 2
+    assert catalog.summary_of("not a project", load) is None
+    db.close()
+
+
+def test_db_handle_eviction(tmp_path):
+    import time
+
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    handles = ProjectDB.handles
+    max_open, idle_timeout = handles.max_open, handles.idle_timeout
+    try:
+        handles.max_open, handles.idle_timeout = 2, 60
+        dbs = [_new_project_db(tmp_path, "test-db-handle-eviction-0")]
+        dbs[0].write_json("log", {"message": "hello"}, series="info", run_id="run")
+        dbs += [_new_project_db(tmp_path, f"test-db-handle-eviction-{i}") for i in (1, 2)]
+        assert dbs[0].pool.closed and not dbs[1].pool.closed and not dbs[2].pool.closed
+        reopened = ProjectDB.of_project_id("test-db-handle-eviction-0")  # from the same file
+        assert reopened is not dbs[0] and reopened.file_path == dbs[0].file_path
+        assert len(reopened.read_json("log", ProjectDbQueryCondition())) == 1
+        with ProjectDB.lease("test-db-handle-eviction-2") as leased:
+            ProjectDB.evict(now=time.monotonic() + 61)  # everything idle except the leased one
+            assert reopened.pool.closed and not leased.pool.closed
+        leased.close()
+    finally:
+        handles.max_open, handles.idle_timeout = max_open, idle_timeout
+
+
+def test_sqlite_profile(tmp_path):
+    import os
+
+    from neetbox.server.db.project._profile import sqlite_pragmas
+    from neetbox.server.db.project._project_db import DB_PROJECT_CONFIG
+
+    pragmas, writer_pragmas = sqlite_pragmas(
+        {"synchronous": "normal", "cache-size": -2048, "temp-store": "disk", "page-size": 8192}
+    )
+    assert pragmas == ["PRAGMA cache_size = -2048"]  # invalid temp store is ignored
+    assert writer_pragmas == ["PRAGMA page_size = 8192", "PRAGMA synchronous = NORMAL"]
+
+    db = _new_project_db(tmp_path, "test-sqlite-profile")
+    with db.pool.reader() as reader:  # profile in global config applies to readers too
+        cache_size = DB_PROJECT_CONFIG["sqlite"]["cache-size"]
+        assert reader.execute("PRAGMA cache_size").fetchone() == (cache_size,)
+    for i in range(100):
+        db.write_json("log", {"message": i}, series="info", run_id="run", batched=True)
+    assert db.checkpoint()[0] == 0
+    assert os.path.getsize(f"{db.file_path}-wal") == 0
+    db.close()
+
+
+def test_compact(tmp_path):
+    db = _new_project_db(tmp_path, "test-compact")
+    for i in range(2000):
+        db.write_json("log", {"message": "x" * 100}, series="info", run_id="run", batched=True)
+    db.checkpoint()
+    db.delete_run_id("run")
+    stats = db.storage_stats()
+    assert stats["auto_vacuum"] == 2 and stats["freelist_count"] > 0
+    report = db.compact()
+    assert "incrementalVacuum" in report["timings"]
+    assert report["reclaimed"] > 0 and report["sizeAfter"] == db.storage_stats()["size"]
+    assert db.storage_stats()["freelist_count"] == 0
+    assert "vacuum" in db.compact(full=True)["timings"]
+    assert db.analyze()["page_count"] > 0
+    db.close()
+
+
+def test_query_condition():
+    import pytest
+
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+
+    condition = ProjectDbQueryCondition.loads(
+        {
+            "id": "[1, 10]",
+            "timestamp": "2024-01-01T00:00:00.000",
+            "limit": 5,
+            "order": {"id": "desc"},
+        }
+    )
+    assert (
+        condition.id_range == (1, 10) and condition.timestamp_range[0] == "2024-01-01T00:00:00.000"
+    )
+    cond_str, cond_vars = condition.dumpt()
+    assert cond_str == "WHERE id BETWEEN ? AND ? AND timestamp >= ? ORDER BY id DESC LIMIT ?"
+    assert cond_vars == [1, 10, "2024-01-01T00:00:00.000", 5]
+    other = ProjectDbQueryCondition.loads({"id": [3, 4], "limit": 7, "order": {"id": "DESC"}})
+    assert (
+        other.dumpt()[0]
+        is ProjectDbQueryCondition(id=(5, 6), limit=1, order={"id": "DESC"}).dumpt()[0]
+    )
+    for bad in [{"id": "__import__('os').getcwd()"}, {"order": {"id; DROP TABLE log": "ASC"}}]:
+        with pytest.raises(ValueError):
+            ProjectDbQueryCondition.loads(bad)
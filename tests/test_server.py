@@ -0,0 +1,343 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def _project_api(tmp_path, project_id):
+    """client of project http apis, serving a project db in tmp_path"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.fastapi.routers.project import Bridge, crud_router
+
+    db = ProjectDB(project_id=project_id, path=str(tmp_path / f"{project_id}.projectdb"))
+    Bridge(project_id)
+    app = FastAPI()
+    app.include_router(crud_router)
+    try:
+        yield TestClient(app), db
+    finally:
+        Bridge._id2bridge.pop(project_id, None)
+        db.close()
+
+
+def test_ws_outbox():
+    import asyncio
+
+    from neetbox._protocol import EventMsg
+    from neetbox.server.fastapi.routers.project._outbox import Outbox, coalesce_key_of
+
+    class SlowWebSocket:
+        def __init__(self) -> None:
+            self.received = []
+            self.can_receive = asyncio.Event()
+
+        async def send_text(self, text):
+            await self.can_receive.wait()
+            self.received.append(text)
+
+    async def _test():
+        ws = SlowWebSocket()
+        outbox = Outbox(ws, name="test", max_pending=4)
+        for step in range(10):  # coalesced into the pending progress
+            message = EventMsg(project_id="p", run_id="r", event_type="progress", payload=step)
+            outbox.put(message.dumps(), key=coalesce_key_of(message))
+        for i in range(5):  # oldest ones are dropped once 4 are pending
+            outbox.put(f"log {i}")
+        assert outbox.lag == 4 and outbox.num_dropped == 2 and outbox.num_coalesced == 9
+        ws.can_receive.set()
+        await asyncio.sleep(0.01)
+        assert outbox.lag == 0
+        outbox.close()
+        return ws.received
+
+    received = asyncio.run(_test())
+    assert received[-3:] == ["log 2", "log 3", "log 4"]
+
+
+def test_subscription_index():
+    from neetbox._protocol import EventMsg
+    from neetbox.server.fastapi.routers.project._subscriptions import (
+        Subscription,
+        SubscriptionIndex,
+    )
+    from neetbox.server.fastapi.routers.project._ws._manager import WSClient
+
+    index = SubscriptionIndex()
+    frontends = [
+        WSClient(id=f"web{i}", ws=None, project_id="p", identity_type="web") for i in range(3)
+    ]
+    index.subscribe("p", "web1", Subscription(event_type="scalar", run_id="r1", series="loss/*"))
+    index.subscribe("p", "web2", Subscription.loads({"runId": "r2"}))
+
+    def receivers_of(**kwargs):
+        message = EventMsg(project_id="p", **kwargs)
+        return [c.id for c in index.route(message, frontends)]
+
+    assert receivers_of(run_id="r1", event_type="scalar", series="loss/train") == ["web0", "web1"]
+    assert receivers_of(run_id="r1", event_type="scalar", series="acc") == ["web0"]
+    assert receivers_of(run_id="r1", event_type="log", series="loss/train") == ["web0"]
+    assert receivers_of(run_id="r2", event_type="hardware") == ["web0", "web2"]
+    index.unsubscribe("web2", Subscription(run_id="r2"))  # still filtering, with nothing subscribed
+    assert receivers_of(run_id="r2", event_type="hardware") == ["web0"]
+    index.unsubscribe("web2")  # back to receiving everything
+    assert receivers_of(run_id="r2", event_type="hardware") == ["web0", "web2"]
+
+
+def test_binary_framing():
+    import pytest
+
+    pytest.importorskip("msgpack")
+    from neetbox._protocol import CODEC_JSON, CODEC_MSGPACK, EventMsg, negotiate_codec
+
+    assert negotiate_codec(["cbor", CODEC_MSGPACK, CODEC_JSON]) == CODEC_MSGPACK
+    assert negotiate_codec(None) == negotiate_codec(["cbor"]) == CODEC_JSON
+
+    messages = [
+        EventMsg(
+            project_id="p",
+            run_id="r",
+            event_type="scalar",
+            series="loss",
+            payload={"x": 1, "y": 0.5},
+        ),
+        EventMsg(
+            project_id="p", run_id="r", event_type="log", payload={"whom": "a", "message": "b" * 64}
+        ),
+    ]
+    batch = EventMsg(
+        project_id="p", run_id="r", event_type="batch", payload=[m.json for m in messages]
+    )
+    frame = batch.encode(CODEC_MSGPACK)  # a batch is framed as its messages one after another
+    assert len(frame) < len(batch.encode(CODEC_JSON))
+    received = EventMsg.loadb(frame)
+    assert [m.json for m in received] == [m.json for m in messages]
+    # payload is forwarded as received, only the header is packed again
+    received[0].id = 42
+    received[0].raw_payload = received[0].raw_payload.replace(b"\xa1y", b"\xa1z")
+    assert EventMsg.loadb(received[0].dumpb())[0].json == {
+        **messages[0].json,
+        "id": 42,
+        "payload": {"x": 1, "z": 0.5},
+    }
+
+
+def test_event_throttle():
+    from neetbox._protocol import EventMsg, IdentityType
+    from neetbox.server.fastapi.routers.project._throttle import EventThrottle
+
+    throttle = EventThrottle(
+        run_rate=100, run_burst=25, series_rate=10, series_burst=10, num_samples=5
+    )
+
+    def admitted(series, num, now, event_type="scalar"):
+        messages = [
+            EventMsg(
+                project_id="p",
+                run_id="r",
+                event_type=event_type,
+                series=series,
+                payload=i,
+                identity_type=IdentityType.CLI,
+            )
+            for i in range(num)
+        ]
+        return [m.payload for m in messages if throttle.admit(m, now=now)]
+
+    assert admitted("loss", 50, now=0) == list(range(10))  # series burst
+    assert admitted("acc", 50, now=0) == list(range(10))
+    assert admitted("status", 50, now=0, event_type="status") == list(range(50))  # never throttled
+    assert admitted("lr", 50, now=0) == list(range(5))  # run burst used up
+    assert admitted("lr", 50, now=0.5) == list(range(10))  # both refilled, series bucket limits
+    samples, reports = throttle.drain(now=0.5)
+    assert len(samples) == 15 and [m.series for m in samples] == sorted(
+        [m.series for m in samples], key=["loss", "acc", "lr"].index
+    )
+    assert reports == {
+        ("p", "r"): {
+            "throttled": 165,
+            "sampled": 15,
+            "dropped": 150,
+            "series": ["scalar:loss", "scalar:acc", "scalar:lr"],
+        }
+    }
+    assert (
+        throttle.drain(now=10) == ([], {})
+        and not throttle._run_buckets
+        and not throttle._series_buckets
+    )
+
+    # only the latest progress matters, the last excess one comes back, never a stale one
+    assert admitted("", 50, now=20, event_type="progress") == list(range(10))
+    samples, reports = throttle.drain(now=20)
+    assert [m.payload for m in samples] == [49]
+    assert reports[("p", "r")] == {
+        "throttled": 40,
+        "sampled": 1,
+        "dropped": 39,
+        "series": ["progress"],
+    }
+    assert admitted("", 5, now=30, event_type="progress") == list(range(5))  # all refilled
+    assert admitted("", 20, now=30, event_type="progress") == list(range(5))
+    assert admitted("", 1, now=31, event_type="progress") == [0]  # newer than the excess ones
+    assert throttle.drain(now=31)[0] == []
+
+
+def test_history_routes(tmp_path):
+    import json
+
+    with _project_api(tmp_path, "test-history-routes") as (client, db):
+        for i in range(5):
+            db.write_json("log", {"message": i}, series="info", run_id="run")
+        response = client.get("/test-history-routes/history/log", params={"limit": 2})
+        assert response.status_code == 200
+        assert [row["metadata"]["message"] for row in response.json()["rows"]] == [0, 1]
+        response = client.get("/test-history-routes/history/log/stream", params={"chunk_size": 2})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["metadata"]["message"] for row in rows] == list(range(5))
+        for params in [{"limit": 0}, {"limit": -1}, {"limit": 10**6}]:  # would read all rows
+            assert client.get("/test-history-routes/history/log", params=params).status_code == 422
+        for params in [{"chunk_size": 0}, {"chunk_size": -1}]:  # would never end
+            response = client.get("/test-history-routes/history/log/stream", params=params)
+            assert response.status_code == 422
+        for table_name in ["image", "runId", "sqlite_master"]:  # not json history
+            response = client.get(f"/test-history-routes/history/{table_name}")
+            assert response.status_code == 400
+        condition = json.dumps({"runId": "no-such-run"})  # filter should not be dropped
+        params = {"cursor": 3, "condition": condition}
+        response = client.get("/test-history-routes/history/log", params=params)
+        assert response.json() == {"rows": [], "cursor": 3}
+
+
+def test_run_metadata_route(tmp_path):
+    with _project_api(tmp_path, "test-run-metadata-route") as (client, db):
+        db.fetch_id_of_run_id("run")
+        url = "/test-run-metadata-route/run/run"
+        response = client.put(url, json={"name": "first"})
+        assert response.status_code == 200 and response.json() == {"name": "first"}
+        response = client.put(url, json={"note": "kept with name"})
+        assert response.json() == {"name": "first", "note": "kept with name"}
+        assert client.get(url).json()["metadata"] == {"name": "first", "note": "kept with name"}
+        status = client.get("/test-run-metadata-route").json()
+        assert status["storage"] > 0 and status["runids"][0]["metadata"]["name"] == "first"
+
+
+def test_batched_events_round_trip(monkeypatch):
+    import asyncio
+
+    from neetbox._protocol import EVENT_TYPE_NAME_BATCH, EventMsg, IdentityType
+    from neetbox.client._client import connection
+    from neetbox.server.fastapi.routers.project._throttle import EventThrottle
+    from neetbox.server.fastapi.routers.project._ws._manager import WSClient, manager
+
+    class FakeWebSocket:  # client side, frames are kept as they would go over the wire
+        def __init__(self) -> None:
+            self.frames = []
+
+        def send(self, message):
+            self.frames.append(message.dumps())
+
+    client_ws = FakeWebSocket()
+    monkeypatch.setattr(connection, "websocket", client_ws)
+    monkeypatch.setattr(
+        connection,
+        "batch_config",
+        {"enable": True, "size": 8, "interval": 60, "coalesceProgress": True},
+    )
+    monkeypatch.setattr(connection, "_batch_sender", "flushed by hand")  # no sender thread
+    for i in range(20):
+        connection._put_batched(
+            EventMsg(project_id="p", run_id="r", event_type="scalar", payload=i)
+        )
+        connection._put_batched(
+            EventMsg(project_id="p", run_id="r", event_type="progress", payload=i)
+        )
+    connection.flush()
+    assert 1 < len(client_ws.frames) < 21  # scalars are sent in batches, progress is coalesced
+
+    handled = []
+
+    async def dispatch_event_msg(message):
+        handled.append(message)
+
+    monkeypatch.setattr(manager, "throttle", EventThrottle(run_rate=0, series_rate=0))
+    monkeypatch.setattr(manager, "dispatch_event_msg", dispatch_event_msg)
+    server_ws = object()
+    monkeypatch.setitem(
+        manager.ws2client,
+        server_ws,
+        WSClient(id="cli", ws=None, project_id="p", identity_type=IdentityType.CLI),
+    )
+
+    async def _receive():
+        for frame in client_ws.frames:
+            await manager.handle_event_msg(server_ws, EventMsg.loads(frame))
+
+    asyncio.run(_receive())
+    assert EVENT_TYPE_NAME_BATCH not in [m.event_type for m in handled]  # unpacked
+    assert [m.payload for m in handled if m.event_type == "scalar"] == list(range(20))
+    assert [m.payload for m in handled if m.event_type == "progress"] == [19]  # latest one only
+    assert all(m.identity_type == IdentityType.CLI for m in handled)
+
+
+def test_image_route(tmp_path, monkeypatch):
+    from neetbox.server.db.project import _project_db
+    from neetbox.server.fastapi.routers.project import _crud
+
+    with _project_api(tmp_path, "test-image-route") as (client, db):
+        data = bytes(range(256)) * 10000  # read from db in several parts
+        image_id = db.write_blob("image", {}, data, series="img", run_id="run")
+        url = f"/test-image-route/image/{image_id}"
+        response = client.get(url)
+        assert response.status_code == 200 and response.content == data
+        etag = response.headers["ETag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        for incremental_io in [True, False]:  # falls back to reading the range at once
+            monkeypatch.setattr(_crud, "BLOB_INCREMENTAL_IO", incremental_io)
+            monkeypatch.setattr(_project_db, "BLOB_INCREMENTAL_IO", incremental_io)
+            response = client.get(url, headers={"Range": "bytes=1000000-2100000"})
+            assert response.status_code == 206 and response.content == data[1000000:2100001]
+            assert response.headers["Content-Range"] == f"bytes 1000000-2100000/{len(data)}"
+            response = client.get(url, headers={"Range": "bytes=-10"})
+            assert response.status_code == 206 and response.content == data[-10:]
+        response = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+        assert response.status_code == 416
+
+
+def test_thumbnail_route(tmp_path, monkeypatch):
+    import subprocess
+    import sys
+
+    from neetbox.server.db.project.condition import ProjectDbQueryCondition
+    from neetbox.server.fastapi.routers.project import _crud
+
+    scheduled, can_generate = [], True
+
+    def schedule_thumbnails(bridge, image_hash):
+        scheduled.append(image_hash)
+        return can_generate
+
+    monkeypatch.setattr(_crud, "schedule_thumbnails", schedule_thumbnails)
+    with _project_api(tmp_path, "test-thumbnail-route") as (client, db):
+        image_ids = [
+            db.write_blob("image", {}, data, series="img", run_id="run") for data in [b"a", b"b"]
+        ]
+        [(_, _, _, blob_hash)] = db.read_blob(
+            "image", ProjectDbQueryCondition(id=image_ids[0]), meta_only=True
+        )
+        db.write_thumbnail(blob_hash, size=128, data=b"thumbnail", media_type="image/webp")
+        response = client.get(f"/test-thumbnail-route/image/{image_ids[0]}", params={"size": 100})
+        assert response.content == b"thumbnail" and "immutable" in response.headers["Cache-Control"]
+        response = client.get(f"/test-thumbnail-route/image/{image_ids[1]}", params={"size": 100})
+        assert response.content == b"b" and response.headers["Cache-Control"] == "no-cache"
+        assert len(scheduled) == 1  # generated later, the url should not be cached meanwhile
+        can_generate = False  # without pillow, the original is what the url will always serve
+        response = client.get(f"/test-thumbnail-route/image/{image_ids[1]}", params={"size": 100})
+        assert response.content == b"b" and "immutable" in response.headers["Cache-Control"]
+    # thumbnail workers import the module of their task, which should not load the server app
+    code = (
+        "import sys, neetbox.server._thumbnail_worker; "
+        "print('neetbox.server.fastapi' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.stdout.strip() == "False"
@@ -5,3 +5,65 @@
 #     package_name_import = "cv2"
 #     installed = pkg.is_installed(package=package_name_import, try_install_if_not=False)
 #     print(f"is '{package_name}' installed? {installed}")
+
+
+def test_websocket_client_offline_buffer(tmp_path):
+    from neetbox._protocol import EventMsg
+    from neetbox.utils.connection import WebsocketClient
+
+    class _WebsocketClient(WebsocketClient):
+        connected = False
+        is_connected = property(lambda self: self.connected)
+
+    sent = []
+    spill_path = tmp_path / "spill" / "messages.jsonl"
+    client = _WebsocketClient(
+        "ws://127.0.0.1:0",
+        None,
+        None,
+        None,
+        None,
+        offline_message_buffer_size=3,
+        spill_path=str(spill_path),
+    )
+    client.wsApp.send = sent.append
+    for i in range(10):
+        client.send(EventMsg(project_id="p", run_id="r", event_type="log", payload=i))
+    assert client.stats == {"buffered": 3, "spilled": 7, "replayed": 0, "dropped": 0}
+    client.connected = True
+    client.send(EventMsg(project_id="p", run_id="r", event_type="log", payload=10))
+    client.wait_replayed(timeout=5)  # spilled ones are replayed in background
+    assert [EventMsg.loads(message).payload for message in sent] == list(range(11))
+    # 10 waited behind spilled ones, pushing 7 out of the memory buffer into spill file
+    assert client.stats["replayed"] == 8 and not spill_path.exists()
+
+
+def test_websocket_client_spill_on_close(tmp_path):
+    from neetbox._protocol import EventMsg
+    from neetbox.utils.connection import WebsocketClient
+
+    class _WebsocketClient(WebsocketClient):
+        connected = False
+        is_connected = property(lambda self: self.connected)
+
+    def spilled_client(spill_path, sent):
+        client = _WebsocketClient(
+            "ws://127.0.0.1:0", None, None, None, None, spill_path=str(spill_path)
+        )
+        client.wsApp.send = sent.append
+        for i in range(5):
+            client.send(EventMsg(project_id="p", run_id="r", event_type="log", payload=i))
+        assert spill_path.exists()
+        return client
+
+    # spill file is named after the run, nothing would replay it once closed
+    sent, spill_path = [], tmp_path / "offline.jsonl"
+    spilled_client(spill_path, sent).close()
+    assert not sent and not spill_path.exists()
+    # replayed before closing if connected
+    sent, spill_path = [], tmp_path / "online.jsonl"
+    client = spilled_client(spill_path, sent)
+    client.connected = True
+    client.close()
+    assert [EventMsg.loads(message).payload for message in sent] == list(range(5))
+    assert not spill_path.exists()